@@ -0,0 +1,453 @@
+# vim:fileencoding=UTF-8
+#
+# Copyright © 2015, 2016 Stan Livitski
+#
+#  This file is part of EPyColl. EPyColl is
+#  Licensed under the Apache License, Version 2.0 with modifications,
+#  (the "License"); you may not use this file except in compliance
+#  with the License. You may obtain a copy of the License at
+#
+#  https://raw.githubusercontent.com/StanLivitski/EPyColl/master/LICENSE
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+"""
+    Benchmarks of the structures in `mapping` and `sets`.
+
+    Times common operations on the structures of this package and on
+    the built-in structures they are meant to compete with, such as
+    `dict`, `set`, and a `list` kept sorted with `bisect`. Each
+    benchmark runs on the same pseudo-random data for every structure
+    and size, so that results are reproducible. Results are printed
+    as lines of JSON, one per benchmark, structure and size, which
+    can be saved to a file and compared with later runs.
+
+    Usage
+    -----
+    ``python benchmark.py [--sizes 1000,10000] [--cases add,contains]
+    [--repeat 3] [--save FILE] [--compare FILE]``
+
+    Key elements
+    ------------
+    benchmark : Register a function that prepares a benchmark.
+    run : Run registered benchmarks and return their results.
+    compare : Compare results with a saved baseline.
+
+"""
+
+import version
+
+version.requirePythonVersion(3)
+
+import argparse
+import bisect
+import collections
+import json
+import random
+import sys
+import time
+
+import mapping
+import sets
+
+Result = collections.namedtuple('Result', 'case impl size seconds')
+
+_cases = collections.OrderedDict()
+
+def benchmark(case, impl, maxSize = None):
+    """
+    Register a function that prepares a benchmark.
+
+    The registered function receives the size of the benchmark and
+    a list of that many random integers, and returns a function
+    without arguments that runs the timed part of the benchmark.
+    Benchmarks that change a structure return a tuple of two functions
+    instead: one that builds the structure before each run, untimed,
+    and one that receives the structure and runs the timed part.
+
+    Parameters
+    ----------
+    case : str
+        Name of the operation that the benchmark measures.
+    impl : str
+        Name of the structure that the benchmark runs on.
+    maxSize : int, optional
+        The greatest size to run this benchmark at, for structures
+        that would take too long at larger sizes.
+    """
+
+    def register(prepare):
+        _cases.setdefault(case, []).append((impl, maxSize, prepare))
+        return prepare
+    return register
+
+def _insort(list_, items):
+    for item in items:
+        at = bisect.bisect_left(list_, item)
+        if len(list_) <= at or list_[at] != item:
+            list_.insert(at, item)
+
+# construction
+
+@benchmark('construct', 'SortedListSet')
+def _(size, data):
+    return lambda: sets.SortedListSet(data)
+
+@benchmark('construct', 'SortedChunkedSet')
+def _(size, data):
+    return lambda: sets.SortedChunkedSet(data)
+
+@benchmark('construct', 'PersistentSortedSet')
+def _(size, data):
+    return lambda: sets.PersistentSortedSet(data)
+
+@benchmark('construct', 'list+bisect')
+def _(size, data):
+    return lambda: sorted(set(data))
+
+# random and sequential insertion
+
+@benchmark('addRandom', 'SortedListSet', 10 ** 5)
+def _(size, data):
+    def run():
+        s = sets.SortedListSet()
+        for item in data:
+            s.add(item)
+    return run
+
+@benchmark('addRandom', 'SortedChunkedSet')
+def _(size, data):
+    def run():
+        s = sets.SortedChunkedSet()
+        for item in data:
+            s.add(item)
+    return run
+
+@benchmark('addRandom', 'PersistentSortedSet', 10 ** 6)
+def _(size, data):
+    def run():
+        s = sets.PersistentSortedSet()
+        for item in data:
+            s = s.add(item)
+    return run
+
+@benchmark('addRandom', 'list+bisect', 10 ** 5)
+def _(size, data):
+    return lambda: _insort([], data)
+
+@benchmark('addRandom', 'set')
+def _(size, data):
+    def run():
+        s = set()
+        for item in data:
+            s.add(item)
+    return run
+
+@benchmark('addSequential', 'SortedListSet')
+def _(size, data):
+    ordered = sorted(data)
+    def run():
+        s = sets.SortedListSet()
+        for item in ordered:
+            s.add(item)
+    return run
+
+@benchmark('addSequential', 'SortedChunkedSet')
+def _(size, data):
+    ordered = sorted(data)
+    def run():
+        s = sets.SortedChunkedSet()
+        for item in ordered:
+            s.add(item)
+    return run
+
+@benchmark('addSequential', 'list+bisect')
+def _(size, data):
+    ordered = sorted(data)
+    return lambda: _insort([], ordered)
+
+# deletion
+
+@benchmark('discardRandom', 'SortedListSet', 10 ** 5)
+def _(size, data):
+    def run(s):
+        for item in data:
+            s.discard(item)
+    return lambda: sets.SortedListSet(data), run
+
+@benchmark('discardRandom', 'SortedChunkedSet')
+def _(size, data):
+    def run(s):
+        for item in data:
+            s.discard(item)
+    return lambda: sets.SortedChunkedSet(data), run
+
+@benchmark('discardRandom', 'list+bisect', 10 ** 5)
+def _(size, data):
+    def run(list_):
+        for item in data:
+            at = bisect.bisect_left(list_, item)
+            if len(list_) > at and list_[at] == item:
+                del list_[at]
+    return lambda: sorted(set(data)), run
+
+# membership
+
+def _probes(data):
+    return [ item + (i & 1) for i, item in enumerate(data) ]
+
+@benchmark('contains', 'SortedListSet')
+def _(size, data):
+    s = sets.SortedListSet(data)
+    probes = _probes(data)
+    return lambda: sum(1 for item in probes if item in s)
+
+@benchmark('contains', 'SortedListSet.containsMany')
+def _(size, data):
+    s = sets.SortedListSet(data)
+    probes = _probes(data)
+    return lambda: s.containsMany(probes)
+
+@benchmark('contains', 'SortedChunkedSet')
+def _(size, data):
+    s = sets.SortedChunkedSet(data)
+    probes = _probes(data)
+    return lambda: sum(1 for item in probes if item in s)
+
+@benchmark('contains', 'list+bisect')
+def _(size, data):
+    list_ = sorted(set(data))
+    probes = _probes(data)
+    def contains(item):
+        at = bisect.bisect_left(list_, item)
+        return len(list_) > at and list_[at] == item
+    return lambda: sum(1 for item in probes if contains(item))
+
+@benchmark('contains', 'set')
+def _(size, data):
+    s = set(data)
+    probes = _probes(data)
+    return lambda: sum(1 for item in probes if item in s)
+
+# range iteration
+
+def _ranges(data):
+    ordered = sorted(data)
+    step = max(1, len(ordered) // 100)
+    return [ (ordered[i], ordered[min(i + step, len(ordered) - 1)])
+        for i in range(0, len(ordered), step) ]
+
+@benchmark('iterRange', 'SortedListSet')
+def _(size, data):
+    s = sets.SortedListSet(data)
+    ranges = _ranges(data)
+    return lambda: sum(1 for from_, to_ in ranges for item in s.iter(from_, to_))
+
+@benchmark('iterRange', 'SortedChunkedSet')
+def _(size, data):
+    s = sets.SortedChunkedSet(data)
+    ranges = _ranges(data)
+    return lambda: sum(1 for from_, to_ in ranges for item in s.iter(from_, to_))
+
+@benchmark('iterRange', 'PersistentSortedSet')
+def _(size, data):
+    s = sets.PersistentSortedSet(data)
+    ranges = _ranges(data)
+    return lambda: sum(1 for from_, to_ in ranges for item in s.iter(from_, to_))
+
+@benchmark('iterRange', 'list+bisect')
+def _(size, data):
+    list_ = sorted(set(data))
+    ranges = _ranges(data)
+    return lambda: sum(1 for from_, to_ in ranges
+        for item in list_[bisect.bisect_left(list_, from_) : bisect.bisect_left(list_, to_)])
+
+# subset and equality tests
+
+@benchmark('subset', 'SortedListSet')
+def _(size, data):
+    s = sets.SortedListSet(data)
+    small = sets.SortedListSet(data[::2])
+    return lambda: (small <= s, s <= s)
+
+@benchmark('subset', 'SortedListSet.sparse')
+def _(size, data):
+    s = sets.SortedListSet(data)
+    small = sets.SortedListSet(data[::1000])
+    return lambda: small <= s
+
+@benchmark('subset', 'set')
+def _(size, data):
+    s = set(data)
+    small = set(data[::2])
+    return lambda: (small <= s, s <= s)
+
+@benchmark('equal', 'SortedListSet')
+def _(size, data):
+    s = sets.SortedListSet(data)
+    other = sets.SortedListSet(data)
+    return lambda: s == other
+
+@benchmark('equal', 'set')
+def _(size, data):
+    s = set(data)
+    other = set(data)
+    return lambda: s == other
+
+# bijection loads
+
+def _pairs(data):
+    return [ (item, str(item)) for item in set(data) ]
+
+@benchmark('loadBijection', 'OneToOneMap')
+def _(size, data):
+    pairs = _pairs(data)
+    return lambda: mapping.OneToOneMap(pairs)
+
+@benchmark('loadBijection', 'OneToOneMap.setitem')
+def _(size, data):
+    pairs = _pairs(data)
+    def run():
+        m = mapping.OneToOneMap()
+        for key, value in pairs:
+            m[key] = value
+    return run
+
+@benchmark('loadBijection', 'PersistentMap')
+def _(size, data):
+    pairs = _pairs(data)
+    return lambda: mapping.PersistentMap(pairs, True)
+
+@benchmark('loadBijection', 'dict+dict')
+def _(size, data):
+    pairs = _pairs(data)
+    def run():
+        forward = dict(pairs)
+        reverse = { v: k for k, v in pairs }
+    return run
+
+def run(sizes, cases = None, repeat = 3, seed = 1):
+    """
+    Run registered benchmarks and return their results.
+
+    Parameters
+    ----------
+    sizes : Iterable
+        Numbers of elements to run the benchmarks with.
+    cases : collections.Container, optional
+        Names of the operations to benchmark. By default, runs all
+        registered benchmarks.
+    repeat : int, optional
+        The number of times to run each benchmark, of which the fastest
+        time is reported.
+    seed : int, optional
+        Seed of the pseudo-random data for the benchmarks.
+
+    Returns
+    -------
+    Iterable
+        `Result` tuples of benchmark names, sizes and times in seconds,
+        returned as soon as each benchmark completes.
+    """
+
+    for size in sizes:
+        data = random.Random(seed).sample(range(4 * size), size)
+        for case, impls in _cases.items():
+            if cases is not None and case not in cases:
+                continue
+            for impl, maxSize, prepare in impls:
+                if maxSize is not None and size > maxSize:
+                    continue
+                task = prepare(size, data)
+                setup = None
+                if isinstance(task, tuple):
+                    setup, task = task
+                best = None
+                for i in range(repeat):
+                    args = () if setup is None else (setup(),)
+                    start = time.perf_counter()
+                    task(*args)
+                    elapsed = time.perf_counter() - start
+                    if best is None or elapsed < best:
+                        best = elapsed
+                yield Result(case, impl, size, best)
+
+def compare(results, baseline, threshold = .1):
+    """
+    Compare results with a saved baseline.
+
+    Parameters
+    ----------
+    results : Iterable
+        `Result` tuples of the current run.
+    baseline : Iterable
+        `Result` tuples of a saved run.
+    threshold : float, optional
+        The relative change of time that is reported as a regression
+        or an improvement.
+
+    Returns
+    -------
+    list
+        Tuples of each result matched with a baseline result,
+        the ratio of their times, and a verdict: ``'slower'``,
+        ``'faster'`` or ``'same'``.
+    """
+
+    saved = { (r.case, r.impl, r.size): r for r in baseline }
+    report = []
+    for result in results:
+        old = saved.get((result.case, result.impl, result.size))
+        if old is None or not old.seconds:
+            continue
+        ratio = result.seconds / old.seconds
+        verdict = 'slower' if ratio > 1 + threshold \
+            else 'faster' if ratio < 1 - threshold else 'same'
+        report.append((result, ratio, verdict))
+    return report
+
+def _load(path):
+    with open(path) as file:
+        return [ Result(**json.loads(line)) for line in file if line.strip() ]
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = 'Benchmark EPyColl structures against built-in ones.')
+    parser.add_argument('--sizes', default = '1000,10000,100000',
+        help = 'comma-separated numbers of elements, e.g. 1000,10000000')
+    parser.add_argument('--cases', help = 'comma-separated operations to benchmark: '
+        + ', '.join(_cases))
+    parser.add_argument('--repeat', type = int, default = 3,
+        help = 'number of runs of each benchmark to pick the fastest from')
+    parser.add_argument('--seed', type = int, default = 1)
+    parser.add_argument('--save', metavar = 'FILE', help = 'save results to a file')
+    parser.add_argument('--compare', metavar = 'FILE',
+        help = 'compare results with a file saved by an earlier run')
+    parser.add_argument('--threshold', type = float, default = .1,
+        help = 'relative change of time to report when comparing')
+    options = parser.parse_args(args)
+    sizes = [ int(size) for size in options.sizes.split(',') ]
+    cases = None if options.cases is None else set(options.cases.split(','))
+    results = []
+    for result in run(sizes, cases, options.repeat, options.seed):
+        results.append(result)
+        print(json.dumps(result._asdict()))
+        sys.stdout.flush()
+    if options.save is not None:
+        with open(options.save, 'w') as file:
+            for result in results:
+                file.write(json.dumps(result._asdict()) + '\n')
+    if options.compare is not None:
+        report = compare(results, _load(options.compare), options.threshold)
+        for result, ratio, verdict in report:
+            print('%-14s %-28s %10d %8.3fx %s' % (
+                result.case, result.impl, result.size, ratio, verdict),
+                file = sys.stderr)
+        return 1 if any('slower' == verdict for r, x, verdict in report) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
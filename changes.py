@@ -0,0 +1,427 @@
+# vim:fileencoding=UTF-8
+#
+# Copyright © 2015, 2016 Stan Livitski
+#
+#  This file is part of EPyColl. EPyColl is
+#  Licensed under the Apache License, Version 2.0 with modifications,
+#  (the "License"); you may not use this file except in compliance
+#  with the License. You may obtain a copy of the License at
+#
+#  https://raw.githubusercontent.com/StanLivitski/EPyColl/master/LICENSE
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+"""
+    Opt-in feeds of changes made to collections in this package.
+
+    Tools that record elements added to, replaced in and removed from
+    sorted sets, and mappings stored in and deleted from one-to-one
+    maps, so that structures derived from these collections can be
+    updated incrementally rather than rebuilt. Recording is enabled
+    for each collection separately by `watch`, which switches the
+    collection to a subclass of its class that reports its changes.
+    Collections that are not watched run the original code of their
+    classes, so this costs nothing while a collection is not watched.
+
+    Key elements
+    ------------
+    Change : A record of a single change made to a collection.
+    ChangeLog : Bounded log of changes made to a watched collection.
+    watch : Start recording changes made to a collection.
+    unwatch : Stop recording changes made to a collection.
+
+"""
+
+import version
+
+version.requirePythonVersion(3)
+
+import collections
+import itertools
+
+import layers
+import mapping
+import sets
+
+Change = collections.namedtuple('Change', 'version action item previous')
+Change.__doc__ = """
+    A record of a single change made to a collection.
+
+    Attributes
+    -----------------
+    version : int
+        The version of the `ChangeLog` that this change has produced.
+    action : str
+        ``'add'``, ``'discard'`` or ``'replace'`` for an element
+        of a set, ``'set'`` or ``'delete'`` for a mapping.
+    item : object
+        The element added, removed or stored in place of another one,
+        or a tuple of the key and value of a mapping.
+    previous : object
+        The element replaced by `item`, or ``None``.
+"""
+
+class ChangeLog:
+    """
+    Bounded log of changes made to a watched collection.
+
+    Keeps the most recent `Change` records of a collection in a ring
+    buffer, and passes each change to listeners as it happens. Every
+    change increments the `version` of the log. A consumer that keeps
+    a structure derived from the collection remembers the version
+    the structure reflects, and later applies the changes returned by
+    `since` for that version. If the buffer has dropped some of those
+    changes, `since` returns ``None``, and the consumer has to rebuild
+    the structure from the collection.
+
+    Parameters
+    --------------------
+    capacity : int, optional
+        The maximum number of changes to keep. The default is 1024.
+        With zero capacity, changes are only passed to listeners.
+
+    Attributes
+    -----------------
+    capacity : int
+        The maximum number of changes this log keeps.
+    version : int
+        The number of changes recorded by this log.
+
+    Methods
+    ---------------
+    since(version)
+        Return the changes recorded after a version.
+    subscribe(listener)
+        Call a function with each change recorded from now on.
+    unsubscribe(listener)
+        Stop calling a function passed to `subscribe`.
+
+    Examples
+    ----------------
+    >>> log = ChangeLog(2)
+    >>> for word in ('one', 'two', 'three'): log._record('add', word)
+    >>> log.version, log.since(1)
+    (3, [Change(version=2, action='add', item='two', previous=None), Change(version=3, action='add', item='three', previous=None)])
+    >>> log.since(3), log.since(0)
+    ([], None)
+    """
+
+    def __init__(self, capacity = 1024):
+        if 0 > capacity:
+            raise ValueError('capacity must not be negative, got %r' % (capacity,))
+        self.capacity = capacity
+        self.version = 0
+        self._changes = collections.deque(maxlen = capacity)
+        self._listeners = []
+
+    def __repr__(self):
+        return '%s(capacity=%d, version=%d)' % (type(self).__name__, self.capacity, self.version)
+
+    def since(self, version):
+        """
+        Return the changes recorded after a version.
+
+        Parameters
+        ----------
+        version : int
+            The version of this log that a consumer has seen last,
+            or zero to request all changes.
+
+        Returns
+        -------
+        list or None
+            `Change` records in the order they were made, or ``None``
+            if some of the changes have been dropped from this log.
+        """
+        while True:
+            latest = self.version
+            count = latest - version
+            if 0 >= count:
+                return []
+            elif count > len(self._changes):
+                return None
+            # retry if another thread records changes meanwhile
+            try:
+                changes = list(itertools.islice(reversed(self._changes), count))
+            except RuntimeError:
+                continue
+            if changes[0].version == latest:
+                changes.reverse()
+                return changes
+
+    def subscribe(self, listener):
+        """
+        Call a function with each change recorded from now on.
+
+        The function receives a `Change` after the change is made.
+        Errors it raises are propagated to the code that has made
+        the change.
+        """
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        """
+        Stop calling a function passed to `subscribe`.
+
+        Raises
+        ------
+        ValueError
+            If the function is not subscribed to this log.
+        """
+        self._listeners.remove(listener)
+
+    def _record(self, action, item, previous = None):
+        change = Change(self.version + 1, action, item, previous)
+        # readers rely on changes being stored before the version is updated
+        self._changes.append(change)
+        self.version = change.version
+        for listener in self._listeners:
+            listener(change)
+
+def watch(obj, capacity = 1024):
+    """
+    Start recording changes made to a collection.
+
+    Switches the collection to a subclass of its class that records
+    its changes in a new `ChangeLog`. Changes made to a set include
+    ``'add'``, ``'discard'`` and ``'replace'`` of its elements,
+    the last of which is recorded when an element replaces another
+    element with an equal key. Bulk operations record a change for
+    each element they add or remove. Changes made to
+    a `mapping.OneToOneMap` or its `reverse` peer include ``'set'``
+    and ``'delete'`` of mappings, and are recorded as key-value
+    tuples of the map passed to this function. Sets returned by
+    operations on a watched set are not watched.
+
+    Parameters
+    ----------
+    obj : sets.SortedListSet or mapping.OneToOneMap
+        The collection to watch, including objects of subclasses
+        of these classes, except `mapping.CacheMap`.
+    capacity : int, optional
+        The number of changes the log keeps, see `ChangeLog`.
+
+    Returns
+    -------
+    ChangeLog
+        The log of changes made to the collection.
+
+    Notes
+    -----
+    Watched collections are pickled and copied as objects of their
+    original classes, without the log. Collections can be watched
+    and instrumented by `instrumentation.instrument` in any order.
+
+    Raises
+    ------
+    TypeError
+        If the collection is not of a supported type.
+    ValueError
+        If the collection is already watched.
+
+    Examples
+    --------
+    >>> prices = sets.SortedListSet([ ('apple', 3), ('pear', 4) ], key = lambda item: item[0])
+    >>> log = watch(prices)
+    >>> total = sum(price for name, price in prices)
+    >>> seen = log.version
+    >>> prices.add(('plum', 2)); prices.add(('apple', 5)); prices.discard(('pear', 4))
+    >>> for change in log.since(seen):
+    ...     total += (change.item[1] if change.action != 'discard' else -change.item[1]) \\
+    ...         - (change.previous[1] if change.previous else 0)
+    >>> total == sum(price for name, price in prices), [ c.action for c in log.since(seen) ]
+    (True, ['add', 'replace', 'discard'])
+    >>> codes = mapping.OneToOneMap({'a': 1})
+    >>> log = watch(codes, capacity = 2)
+    >>> log.subscribe(print)
+    >>> codes.reverse()[2] = 'b'
+    Change(version=1, action='set', item=('b', 2), previous=None)
+    >>> codes.clear()
+    Change(version=2, action='delete', item=('a', 1), previous=None)
+    Change(version=3, action='delete', item=('b', 2), previous=None)
+    >>> log.since(0) is None
+    True
+    >>> import pickle
+    >>> type(pickle.loads(pickle.dumps(codes))).__name__
+    'OneToOneMap'
+    >>> unwatch(codes); codes['c'] = 3
+    >>> import instrumentation
+    >>> stats = instrumentation.instrument(prices, instrumentation.Stats())
+    >>> watch(prices)
+    Traceback (most recent call last):
+    ...
+    ValueError: InstrumentedWatchedSortedListSet object is already watched
+    >>> unwatch(prices); type(prices).__name__
+    'InstrumentedSortedListSet'
+    """
+
+    if isinstance(obj, sets.SortedListSet):
+        mixin = _WatchedSet
+    elif isinstance(obj, mapping.CacheMap):
+        raise TypeError('cannot watch a %s, which evicts mappings on its own' % type(obj).__name__)
+    elif isinstance(obj, mapping.OneToOneMap):
+        mixin = _WatchedMap
+    else:
+        raise TypeError('cannot watch an object of %s' % type(obj))
+    if _watched(obj):
+        raise ValueError('%s object is already watched' % type(obj).__name__)
+    log = ChangeLog(capacity)
+    mixin._enable(obj, log)
+    return log
+
+def unwatch(obj):
+    """
+    Stop recording changes made to a collection.
+
+    Switches a watched collection back to its original class.
+    Does nothing if the collection is not watched.
+    """
+
+    layer = layers.findLayer(obj, '_unwatched')
+    if layer is not None:
+        layer._disable(obj)
+
+def _watched(obj):
+    """
+    Tell whether an object has been switched to a watched class.
+    """
+    return layers.findLayer(obj, '_unwatched') is not None
+
+_MISSING = object()
+
+class _WatchedSet:
+    """
+    Methods that record changes made to a `sets.SortedListSet`.
+    """
+
+    MUTATORS = ('add', 'discard', '_assign')
+
+    def __new__(cls, *args, **kwargs):
+        # sets derived from a watched set by its operations are not watched
+        return layers.withoutLayer(cls, '_unwatched')(*args, **kwargs)
+
+    @staticmethod
+    def _enable(set_, log):
+        layers.addLayer(set_, _WatchedSet, '_unwatched', 'Watched')
+        set_.__dict__['_changes'] = log
+
+    @staticmethod
+    def _disable(set_):
+        layers.removeLayer(set_, '_unwatched')
+        del set_.__dict__['_changes']
+
+    def __reduce_ex__(self, protocol):
+        return tuple(layers.reduceWithout(self, protocol, '_unwatched', '_changes')[1])
+
+    def _equalKey(self, value):
+        """
+        Return the element of this set with the same key as a value.
+        """
+        key = self._key(value)
+        at = self._find(key)
+        if len(self) > at and self._keyAt(at) == key:
+            return self[at]
+        return _MISSING
+
+    def add(self, value):
+        previous = self._equalKey(value)
+        self._unwatched.add(self, value)
+        if previous is _MISSING:
+            self._changes._record('add', value)
+        elif previous != value:
+            self._changes._record('replace', value, previous)
+
+    def discard(self, value):
+        present = self._equalKey(value)
+        self._unwatched.discard(self, value)
+        if present is not _MISSING and present == value:
+            self._changes._record('discard', present)
+
+    def _assign(self, list_, keys):
+        old, oldKeys = self._sortedLists()
+        # sequences that view the contents of a set may change with it
+        old = list(old)
+        oldKeys = list(map(self._key, old) if oldKeys is None else oldKeys)
+        self._unwatched._assign(self, list_, keys)
+        if keys is None:
+            keys = list(map(self._key, list_))
+        record = self._changes._record
+        i = j = 0
+        while i < len(old) or j < len(list_):
+            if j >= len(list_) or (i < len(old) and oldKeys[i] < keys[j]):
+                record('discard', old[i])
+                i += 1
+            elif i >= len(old) or keys[j] < oldKeys[i]:
+                record('add', list_[j])
+                j += 1
+            else:
+                if old[i] != list_[j]:
+                    record('replace', list_[j], old[i])
+                i += 1
+                j += 1
+
+class _WatchedMap:
+    """
+    Methods that record changes made to a `mapping.OneToOneMap`.
+    """
+
+    MUTATORS = ('__setitem__', '_store', '__delitem__', 'popitem', 'clear')
+
+    @staticmethod
+    def _enable(map_, log):
+        for side, flipped in ((map_, False), (map_._peer, True)):
+            layers.addLayer(side, _WatchedMap, '_unwatched', 'Watched')
+            side.__dict__['_changes'] = log
+            side.__dict__['_flipped'] = flipped
+
+    @staticmethod
+    def _disable(map_):
+        for side in (map_, map_._peer):
+            layers.removeLayer(side, '_unwatched')
+            del side.__dict__['_changes']
+            del side.__dict__['_flipped']
+
+    def __reduce_ex__(self, protocol):
+        return tuple(layers.reduceWithout(self, protocol, '_unwatched', '_changes', '_flipped')[1])
+
+    def _record(self, action, key, value):
+        self._changes._record(action, (value, key) if self._flipped else (key, value))
+
+    def __setitem__(self, key, value):
+        new = self._forward.get(key, _MISSING) != value
+        self._unwatched.__setitem__(self, key, value)
+        if new:
+            self._record('set', key, value)
+
+    def _store(self, forward, reverse):
+        new = [ (key, value) for key, value in forward.items()
+            if self._forward.get(key, _MISSING) != value ]
+        self._unwatched._store(self, forward, reverse)
+        for key, value in new:
+            self._record('set', key, value)
+
+    def __delitem__(self, key):
+        value = self._forward[key]
+        self._unwatched.__delitem__(self, key)
+        self._record('delete', key, value)
+
+    def popitem(self):
+        for key in self._forward:
+            break
+        else:
+            raise KeyError('popitem(): mapping is empty')
+        value = self._forward[key]
+        del self[key]
+        return key, value
+
+    def clear(self):
+        for key in list(self._forward):
+            del self[key]
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,407 @@
+# vim:fileencoding=UTF-8
+#
+# Copyright © 2015, 2016 Stan Livitski
+#
+#  This file is part of EPyColl. EPyColl is
+#  Licensed under the Apache License, Version 2.0 with modifications,
+#  (the "License"); you may not use this file except in compliance
+#  with the License. You may obtain a copy of the License at
+#
+#  https://raw.githubusercontent.com/StanLivitski/EPyColl/master/LICENSE
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+"""
+    Opt-in counters of the work done by collections in this package.
+
+    Tools that count calls of key functions, binary search probes,
+    elements shifted within lists, choices between fast merge paths
+    and generic fallback algorithms, and collision checks made by
+    individual collections. Instrumentation is enabled for each
+    object separately by `instrument`, which switches the object to
+    a subclass of its class that counts these events. Objects that
+    are not instrumented run the original code of their classes,
+    so instrumentation costs nothing while it is disabled.
+
+    Key elements
+    ------------
+    Stats : Counters of the work done by instrumented collections.
+    instrument : Start counting the work done by a collection.
+    uninstrument : Stop counting the work done by a collection.
+    globalStats : Counters shared by all collections instrumented
+    without a dedicated `Stats` object.
+
+"""
+
+import version
+
+version.requirePythonVersion(3)
+
+import collections
+import threading
+
+import layers
+import mapping
+import sets
+
+class Stats:
+    """
+    Counters of the work done by instrumented collections.
+
+    Attributes
+    -----------------
+    keyCalls : int
+        Calls of the key functions of sorted sets.
+    searches : int
+        Binary searches for positions of keys within sorted sets.
+    probes : int
+        Steps of these binary searches, each of which compares a key
+        with a key of an element of the set.
+    shifts : int
+        Elements moved within the lists of `sets.SortedListSet`
+        objects to make room for an added element or close the gap
+        after a removed one.
+    fastPaths : int
+        Set operations and comparisons that merged sorted sets
+        element by element.
+    fallbacks : int
+        Set operations and comparisons that fell back to the generic
+        algorithms of `collections.Set`. Operations that these
+        algorithms run in turn are not counted separately.
+    collisionChecks : int
+        Lookups made by `mapping.OneToOneMap` objects to check that
+        new mappings keep them one-to-one.
+    collisions : int
+        New mappings rejected by these checks.
+
+    Examples
+    ----------------
+    >>> stats = Stats()
+    >>> stats.probes += 3
+    >>> stats
+    Stats(keyCalls=0, searches=0, probes=3, shifts=0, fastPaths=0, fallbacks=0, collisionChecks=0, collisions=0)
+    >>> stats.asDict()['probes']
+    3
+    >>> stats.reset(); stats.probes
+    0
+    """
+
+    FIELDS = ('keyCalls', 'searches', 'probes', 'shifts',
+        'fastPaths', 'fallbacks', 'collisionChecks', 'collisions')
+
+    __slots__ = FIELDS
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Set all counters to zero.
+        """
+
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+
+    def asDict(self):
+        """
+        Return a dictionary of counter names and their values, e.g.
+        for exporting them to a metrics system.
+        """
+
+        return collections.OrderedDict(
+            (field, getattr(self, field)) for field in self.FIELDS)
+
+    def __repr__(self):
+        return 'Stats(%s)' % ', '.join(
+            '%s=%d' % item for item in self.asDict().items())
+
+globalStats = Stats()
+
+def instrument(obj, stats = globalStats):
+    """
+    Start counting the work done by a collection.
+
+    Switches the collection to a subclass of its class that updates
+    counters as it works. A `mapping.OneToOneMap` is instrumented
+    along with its `reverse` peer. Sets returned by operations on an
+    instrumented `sets.SortedListSet` are instrumented as well and
+    update the same counters.
+
+    Parameters
+    ----------
+    obj : sets.SortedListSet or mapping.OneToOneMap
+        The collection to instrument, including objects of subclasses
+        of these classes.
+    stats : Stats, optional
+        Counters to update. By default, updates `globalStats`.
+        Collections that share a `Stats` object add up their counts.
+
+    Returns
+    -------
+    Stats
+        The counters that the collection updates. Instrumenting
+        a collection again makes it update the new counters.
+
+    Notes
+    -----
+    Instrumented collections are pickled and copied as objects of their
+    original classes, without the counters. Collections can be watched
+    by `changes.watch` and instrumented in any order.
+
+    Raises
+    ------
+    TypeError
+        If the collection is not of a supported type.
+
+    Examples
+    --------
+    >>> s = sets.SortedListSet(range(0, 1000, 2), abs)
+    >>> stats = instrument(s, Stats())
+    >>> s.add(401); s.discard(997); s.discard(996)
+    >>> s <= sets.SortedListSet(range(1000), abs), s <= set(range(1000))
+    (True, True)
+    >>> stats
+    Stats(keyCalls=1027, searches=3, probes=27, shifts=300, fastPaths=1, fallbacks=1, collisionChecks=0, collisions=0)
+    >>> uninstrument(s)
+    >>> type(s).__name__, s.add(3), stats.keyCalls
+    ('SortedListSet', None, 1027)
+    >>> codes = mapping.OneToOneMap({'a': 1})
+    >>> stats = instrument(codes.reverse(), Stats())
+    >>> codes['b'] = 1
+    Traceback (most recent call last):
+    ...
+    ValueError: (1, "Value is already mapped to another key, please delete it before mapping to 'b'", 'a')
+    >>> codes.update(c=3, d=4)
+    >>> stats.collisionChecks, stats.collisions
+    (6, 1)
+    >>> import pickle
+    >>> type(pickle.loads(pickle.dumps(codes))).__name__
+    'OneToOneMap'
+    """
+
+    if isinstance(obj, sets.SortedListSet):
+        mixin = _InstrumentedSet
+    elif isinstance(obj, mapping.OneToOneMap):
+        mixin = _InstrumentedMap
+    else:
+        raise TypeError('cannot instrument an object of %s' % type(obj))
+    mixin._enable(obj, stats)
+    return stats
+
+def uninstrument(obj):
+    """
+    Stop counting the work done by a collection.
+
+    Switches an instrumented collection back to its original class.
+    Does nothing if the collection is not instrumented.
+    """
+
+    layer = layers.findLayer(obj, '_original')
+    if layer is not None:
+        layer._disable(obj)
+
+def _instrumented(obj):
+    """
+    Tell whether an object has been switched to an instrumented class.
+    """
+    return layers.findLayer(obj, '_original') is not None
+
+class _CountingKey:
+    """
+    Key function of an instrumented set that counts its calls.
+    Equal to the original function, so that instrumented sets remain
+    compatible with the sets that share their key function.
+    """
+
+    def __init__(self, function, stats):
+        self.function = function
+        self.stats = stats
+
+    def __call__(self, x):
+        self.stats.keyCalls += 1
+        return self.function(x)
+
+    def __eq__(self, other):
+        return self.function == getattr(other, 'function', other)
+
+    def __hash__(self):
+        return hash(self.function)
+
+class _CountingList(list):
+    """
+    List of elements of an instrumented set that counts elements
+    shifted by insertions and deletions.
+    """
+
+    __slots__ = ('stats',)
+
+    def insert(self, at, item):
+        size = len(self)
+        if 0 > at:
+            at = max(at + size, 0)
+        self.stats.shifts += max(size - at, 0)
+        list.insert(self, at, item)
+
+    def __delitem__(self, at):
+        size = len(self)
+        if isinstance(at, slice):
+            start, stop, step = at.indices(size)
+            if 1 == step and start < stop:
+                self.stats.shifts += size - stop
+        else:
+            self.stats.shifts += size - (at % size) - 1 if size else 0
+        list.__delitem__(self, at)
+
+class _InstrumentedSet:
+    """
+    Methods that count the work done by a `sets.SortedListSet`.
+    """
+
+    @staticmethod
+    def _enable(set_, stats):
+        if _instrumented(set_):
+            set_._key.stats = stats
+        else:
+            layers.addLayer(set_, _InstrumentedSet, '_original', 'Instrumented')
+            set_.__dict__['_key'] = _CountingKey(set_._key, stats)
+        set_.__dict__['_stats'] = stats
+        set_._countShifts()
+
+    @staticmethod
+    def _disable(set_):
+        layers.removeLayer(set_, '_original')
+        set_.__dict__['_key'] = set_._key.function
+        list_ = set_.__dict__.get('_list')
+        if isinstance(list_, _CountingList):
+            set_.__dict__['_list'] = list(list_)
+        del set_.__dict__['_stats']
+
+    def __init__(self, iterable = None, key = None, *args, **kwargs):
+        # sets derived from an instrumented set by its operations
+        # receive its key function and update the same counters
+        if not isinstance(key, _CountingKey):
+            key = _CountingKey(key if key is not None else (lambda x: x), globalStats)
+        self.__dict__['_stats'] = key.stats
+        self._original.__init__(self, iterable, key, *args, **kwargs)
+
+    def __reduce_ex__(self, protocol):
+        state, reduced = layers.reduceWithout(self, protocol, '_original', '_stats')
+        state['_key'] = state['_key'].function
+        if isinstance(state.get('_list'), _CountingList):
+            state['_list'] = list(state['_list'])
+        return tuple(reduced)
+
+    def _countShifts(self):
+        list_ = self.__dict__.get('_list')
+        if type(list_) is list:
+            list_ = self.__dict__['_list'] = _CountingList(list_)
+        if isinstance(list_, _CountingList):
+            list_.stats = self._stats
+
+    def _assign(self, list_, keys):
+        self._original._assign(self, list_, keys)
+        self._countShifts()
+
+    def _find(self, key, from_ = 0, to_ = None):
+        if not hasattr(self._original, '_locateKey'):
+            stats = self._stats
+            stats.searches += 1
+            stats.probes += max((len(self) if to_ is None else to_) - from_, 0).bit_length()
+        return self._original._find(self, key, from_, to_)
+
+    def _locateKey(self, key):
+        chunk, at = self._original._locateKey(self, key)
+        stats = self._stats
+        stats.searches += 1
+        stats.probes += len(self._maxes).bit_length()
+        if chunk < len(self._chunks):
+            stats.probes += len(self._chunks[chunk]).bit_length()
+        return chunk, at
+
+    def _countingPaths(name, countFallbacks = True):
+        """
+        Wrap a set operation to count whether it takes the fast path
+        or falls back to the generic algorithm, unless it is called by
+        another such operation.
+        """
+        def method(self, other):
+            if getattr(_operations, 'running', False):
+                return getattr(self._original, name)(self, other)
+            if self._original._compatible(self, other):
+                self._stats.fastPaths += 1
+            elif countFallbacks:
+                self._stats.fallbacks += 1
+            _operations.running = True
+            try:
+                return getattr(self._original, name)(self, other)
+            finally:
+                _operations.running = False
+        method.__name__ = name
+        return method
+
+    __le__ = _countingPaths('__le__')
+    __eq__ = _countingPaths('__eq__')
+    __or__ = _countingPaths('__or__')
+    __and__ = _countingPaths('__and__')
+    __sub__ = _countingPaths('__sub__')
+    __xor__ = _countingPaths('__xor__')
+    __iand__ = _countingPaths('__iand__')
+    __isub__ = _countingPaths('__isub__')
+    __ixor__ = _countingPaths('__ixor__')
+    isdisjoint = _countingPaths('isdisjoint')
+    # adding elements of other collections sorts them instead
+    __ior__ = _countingPaths('__ior__', False)
+    update = _countingPaths('update', False)
+
+    del _countingPaths
+
+# tells whether this thread runs a set operation counted by _InstrumentedSet
+_operations = threading.local()
+
+class _InstrumentedMap:
+    """
+    Methods that count the work done by a `mapping.OneToOneMap`.
+    """
+
+    @staticmethod
+    def _enable(map_, stats):
+        for side in (map_, map_._peer):
+            if not _instrumented(side):
+                layers.addLayer(side, _InstrumentedMap, '_original', 'Instrumented')
+            side.__dict__['_stats'] = stats
+
+    @staticmethod
+    def _disable(map_):
+        for side in (map_, map_._peer):
+            layers.removeLayer(side, '_original')
+            del side.__dict__['_stats']
+
+    def __reduce_ex__(self, protocol):
+        return tuple(layers.reduceWithout(self, protocol, '_original', '_stats')[1])
+
+    def __setitem__(self, key, value):
+        self._stats.collisionChecks += 2
+        try:
+            self._original.__setitem__(self, key, value)
+        except (KeyError, ValueError):
+            self._stats.collisions += 1
+            raise
+
+    def update(self, *args, **kwargs):
+        if args and not isinstance(args[0], collections.Sized):
+            args = (list(args[0]),) + args[1:]
+        count = len(args[0]) if args and isinstance(args[0], collections.Sized) else 0
+        self._stats.collisionChecks += 2 * (count + len(kwargs))
+        try:
+            self._original.update(self, *args, **kwargs)
+        except (KeyError, ValueError):
+            self._stats.collisions += 1
+            raise
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
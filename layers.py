@@ -0,0 +1,189 @@
+# vim:fileencoding=UTF-8
+#
+# Copyright © 2015, 2016 Stan Livitski
+#
+#  This file is part of EPyColl. EPyColl is
+#  Licensed under the Apache License, Version 2.0 with modifications,
+#  (the "License"); you may not use this file except in compliance
+#  with the License. You may obtain a copy of the License at
+#
+#  https://raw.githubusercontent.com/StanLivitski/EPyColl/master/LICENSE
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+"""
+    Opt-in layers of behavior added to individual collections.
+
+    Tools that switch a collection to a subclass of its class generated
+    from a mixin class, which adds behavior such as the counters of
+    `instrumentation` or the change feeds of `changes` to that object
+    alone. Each generated subclass, or layer, keeps the class it is
+    derived from in an attribute named by its mixin, through which the
+    mixin's methods call the methods they override. Layers of different
+    mixins can be stacked in any order, and each of them can be removed
+    while keeping the layers added after it.
+
+    Key elements
+    ------------
+    addLayer : Switch an object to a layer of its class.
+    findLayer : Return the layer with a marker attribute that an object's
+    class is derived from.
+    removeLayer : Switch an object to its class without a layer.
+    withoutLayer : Return a class with a layer removed from it.
+    reduceWithout : Reduce a layered object for pickling as an object of
+    its original class.
+
+"""
+
+import version
+
+version.requirePythonVersion(3)
+
+import types
+
+import locks
+import mapping
+import sets
+
+def addLayer(obj, mixin, marker, prefix):
+    """
+    Switch an object to a layer of its class.
+
+    Parameters
+    ----------
+    obj : object
+        The object to switch.
+    mixin : type
+        The class with methods of the layer. Methods it names in its
+        ``MUTATORS`` attribute run under the write locks of concurrent
+        collections.
+    marker : str
+        The name of the layer's attribute that holds the class derived
+        from by the layer.
+    prefix : str
+        The prefix of the layer's name.
+
+    Examples
+    --------
+    >>> class Counted:
+    ...     def add(self, value):
+    ...         self.count = getattr(self, 'count', 0) + 1
+    ...         self._uncounted.add(self, value)
+    >>> s = sets.SortedListSet('ab')
+    >>> addLayer(s, Counted, '_uncounted', 'Counted')
+    >>> s.add('c'); s.count, type(s).__name__, findLayer(s, '_uncounted').__name__
+    (1, 'CountedSortedListSet', 'CountedSortedListSet')
+    >>> removeLayer(s, '_uncounted'); type(s).__name__, findLayer(s, '_uncounted')
+    ('SortedListSet', None)
+    """
+
+    obj.__class__ = _layer(type(obj), mixin, marker, prefix)
+
+def findLayer(obj, marker):
+    """
+    Return the layer with a marker attribute that an object's class
+    is derived from, or ``None`` if there is no such layer.
+    """
+
+    cls = type(obj)
+    while cls in _layers:
+        if marker in cls.__dict__:
+            return cls
+        cls = _base(cls)
+    return None
+
+def removeLayer(obj, marker):
+    """
+    Switch an object to its class without a layer, keeping other
+    layers. Does nothing if the object's class has no such layer.
+    """
+
+    obj.__class__ = withoutLayer(type(obj), marker)
+
+def withoutLayer(cls, marker):
+    """
+    Return a class with a layer removed from it, which is the same
+    class if it has no layer with the marker attribute.
+    """
+
+    original = cls
+    above = []
+    while cls in _layers and marker not in cls.__dict__:
+        above.append(cls)
+        cls = _base(cls)
+    if cls not in _layers:
+        return original
+    cls = _base(cls)
+    for layer in reversed(above):
+        cls = _layer(cls, *_layers[layer])
+    return cls
+
+def reduceWithout(obj, protocol, marker, *names):
+    """
+    Reduce a layered object for pickling as an object of its original
+    class, without attributes with specified names.
+
+    Returns
+    -------
+    tuple
+        The state dictionary of the object, which the caller may
+        change further, and the list of values to return from
+        ``__reduce_ex__`` as a tuple.
+    """
+
+    reduced = list(_base(findLayer(obj, marker)).__reduce_ex__(obj, protocol))
+    if reduced[1] and reduced[1][0] is type(obj):
+        # pickle rejects __newobj__ of a class other than the object's
+        cls = type(obj)
+        while cls in _layers:
+            cls = _base(cls)
+        reduced[:2] = _newObject, (cls,)
+    state = reduced[2] = dict(reduced[2])
+    for name in names:
+        del state[name]
+    return state, reduced
+
+def _newObject(cls):
+    """
+    Create an object of a class without initializing it, as pickle
+    does, when unpickling a layered object.
+    """
+    return cls.__new__(cls)
+
+def _base(layer):
+    """
+    Return the class that a layer is derived from.
+    """
+    return layer.__dict__[_layers[layer][1]]
+
+def _layer(cls, mixin, marker, prefix):
+    """
+    Return a layer of a class with methods of a mixin class, creating
+    it on first use.
+    """
+    layer = _classes.get((cls, mixin))
+    if layer is None:
+        namespace = { name: member for name, member in vars(mixin).items()
+            if isinstance(member, (staticmethod, types.FunctionType)) }
+        if issubclass(cls, (sets.ConcurrentSortedListSet, mapping.ConcurrentOneToOneMap)):
+            for name in getattr(mixin, 'MUTATORS', ()):
+                namespace[name] = locks.writeLocked(namespace[name])
+        namespace.update(__module__ = mixin.__module__)
+        namespace[marker] = cls
+        layer = _classes[cls, mixin] = type(prefix + cls.__name__, (cls,), namespace)
+        _layers[layer] = mixin, marker, prefix
+    return layer
+
+# layers by the classes they are derived from and their mixins
+_classes = {}
+
+# mixins, marker attributes and prefixes of layers
+_layers = {}
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
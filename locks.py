@@ -0,0 +1,263 @@
+# vim:fileencoding=UTF-8
+#
+# Copyright © 2015, 2016 Stan Livitski
+#
+#  This file is part of EPyColl. EPyColl is
+#  Licensed under the Apache License, Version 2.0 with modifications,
+#  (the "License"); you may not use this file except in compliance
+#  with the License. You may obtain a copy of the License at
+#
+#  https://raw.githubusercontent.com/StanLivitski/EPyColl/master/LICENSE
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+"""
+    Synchronization tools that guard collections shared between threads.
+
+    Locks and helper functions used by the concurrent variants of
+    collections in this package to let many threads read a collection
+    while one thread at a time changes it.
+
+    Key elements
+    ------------
+    ReadWriteLock : A reentrant lock that admits either any number
+    of readers or a single writer.
+    readLocked : Wrap a method to run it under the read lock of its
+    object.
+    writeLocked : Wrap a method to run it under the write lock of its
+    object.
+
+"""
+
+import version
+
+version.requirePythonVersion(3)
+
+import functools
+import threading
+
+class ReadWriteLock:
+    """
+    A reentrant lock that admits either any number of readers or
+    a single writer.
+
+    Readers share the lock with each other, while a writer holds it
+    exclusively. Once a writer starts waiting for the lock, new readers
+    wait behind it, so that a steady stream of readers cannot starve
+    writers. A thread that holds the lock may acquire it again for
+    reading, and a writer may also acquire it again for writing.
+    A reader cannot acquire the lock for writing without releasing it
+    first. A writer can downgrade the lock by acquiring it for reading
+    and then releasing the write lock, which keeps other writers out
+    until the read lock is released.
+
+    Attributes
+    -----------------
+    readLock : object
+        The shared side of this lock, which can be acquired with
+        its ``acquire`` and ``release`` methods or used in a ``with``
+        statement.
+    writeLock : object
+        The exclusive side of this lock, with the same protocol
+        as `readLock`.
+
+    Raises
+    ----------
+    RuntimeError
+        If a thread that holds the lock only for reading attempts
+        to acquire it for writing, or a thread releases a side of
+        the lock that it does not hold.
+
+    Examples
+    ----------------
+    >>> lock = ReadWriteLock()
+    >>> with lock.readLock:
+    ...     with lock.readLock:
+    ...         lock.readers, lock.held
+    (1, True)
+    >>> with lock.writeLock:
+    ...     with lock.readLock:
+    ...         lock.writer is not None, lock.readers
+    (True, 0)
+    >>> with lock.readLock:
+    ...     lock.writeLock.acquire()
+    Traceback (most recent call last):
+    ...
+    RuntimeError: cannot acquire the write lock while holding the read lock
+    >>> lock.readers, lock.writer
+    (0, None)
+    >>> lock.acquireWrite(); lock.acquireRead(); lock.releaseWrite()
+    >>> lock.readers, lock.writer
+    (1, None)
+    >>> lock.releaseRead(); lock.readers, lock.held
+    (0, False)
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writeDepth = 0
+        self._waitingWriters = 0
+        self._local = threading.local()
+        self.readLock = ReadWriteLock.Side(self.acquireRead, self.releaseRead)
+        self.writeLock = ReadWriteLock.Side(self.acquireWrite, self.releaseWrite)
+
+    @property
+    def readers(self):
+        """
+        The number of threads that hold this lock for reading.
+        """
+        return self._readers
+
+    @property
+    def writer(self):
+        """
+        Identifier of the thread that holds this lock for writing,
+        or ``None``.
+        """
+        return self._writer
+
+    @property
+    def held(self):
+        """
+        Whether the current thread holds this lock for reading
+        or writing.
+        """
+        return 0 < getattr(self._local, 'depth', 0) \
+            or self._writer == threading.get_ident()
+
+    def acquireRead(self):
+        """
+        Acquire this lock for reading, blocking while another thread
+        writes or waits to write.
+        """
+
+        local = self._local
+        depth = getattr(local, 'depth', 0)
+        if 0 < depth or self._writer == threading.get_ident():
+            local.depth = depth + 1
+            return
+        with self._condition:
+            while self._writer is not None or self._waitingWriters:
+                self._condition.wait()
+            self._readers += 1
+        local.depth = 1
+        local.shared = True
+
+    def releaseRead(self):
+        """
+        Release this lock after a matching call to `acquireRead`.
+        """
+
+        local = self._local
+        depth = getattr(local, 'depth', 0)
+        if 0 >= depth:
+            raise RuntimeError('cannot release the read lock that is not held')
+        local.depth = depth - 1
+        if 1 == depth and getattr(local, 'shared', False):
+            local.shared = False
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    def acquireWrite(self):
+        """
+        Acquire this lock for writing, blocking while other threads
+        read or write.
+        """
+
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writeDepth += 1
+                return
+            elif getattr(self._local, 'shared', False):
+                raise RuntimeError('cannot acquire the write lock while holding the read lock')
+            self._waitingWriters += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waitingWriters -= 1
+            self._writer = me
+            self._writeDepth = 1
+
+    def releaseWrite(self):
+        """
+        Release this lock after a matching call to `acquireWrite`.
+        """
+
+        with self._condition:
+            if self._writer != threading.get_ident():
+                raise RuntimeError('cannot release the write lock that is not held')
+            self._writeDepth -= 1
+            if not self._writeDepth:
+                self._writer = None
+                local = self._local
+                if 0 < getattr(local, 'depth', 0) and not getattr(local, 'shared', False):
+                    # downgrade the nested reads to a read lock
+                    self._readers += 1
+                    local.shared = True
+                self._condition.notify_all()
+
+    class Side:
+        """
+        One side of a `ReadWriteLock` with the protocol of
+        `threading.Lock`.
+        """
+
+        def __init__(self, acquire, release):
+            self.acquire = acquire
+            self.release = release
+
+        def __enter__(self):
+            self.acquire()
+            return self
+
+        def __exit__(self, *exc):
+            self.release()
+
+def readLocked(method):
+    """
+    Wrap a method to run it under the read lock of its object.
+
+    The object must keep its `ReadWriteLock` in the ``_lock``
+    attribute.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock.readLock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def writeLocked(method):
+    """
+    Wrap a method to run it under the write lock of its object.
+
+    The object must keep its `ReadWriteLock` in the ``_lock``
+    attribute, and may define an ``_invalidate`` method, which is
+    called after the wrapped method to discard any snapshots of
+    the object's contents.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock.writeLock:
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                invalidate = getattr(self, '_invalidate', None)
+                if invalidate is not None:
+                    invalidate()
+    return wrapper
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -30,6 +30,18 @@
     mapping between keys and values.
     IReversibleMap : An interface that describes a reversible
     dictionary.
+    ConcurrentOneToOneMap : Variant of `OneToOneMap` that can be
+    shared between threads.
+    CacheMap : A reversible one-to-one dictionary of bounded size that
+    evicts least recently used or expired mappings.
+    InternMap : A reversible mapping of objects to dense integer codes.
+    ManyToManyMap : A reversible dictionary class that maps keys to
+    sets of values.
+    PersistentMap : An immutable mapping that makes modified versions
+    of itself cheaply.
+    SharedMap : A read-only mapping stored in a block of shared memory.
+    SortedListMap : A dictionary class that keeps its keys sorted
+    and answers range queries.
  
 """
 
@@ -39,6 +51,20 @@ version.requirePythonVersion(3)
 
 import abc
 import collections
+import hashlib
+import itertools
+import locks
+import numbers
+import operator
+import pickle
+import sets
+import struct
+import time
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
 
 class IReversibleMap(collections.Mapping, metaclass=abc.ABCMeta):
     """
@@ -57,6 +83,10 @@ class IReversibleMap(collections.Mapping, metaclass=abc.ABCMeta):
     --------------
     OneToOneMap : An implementation of this class for one-to-one
     mappings.
+    InternMap : An implementation of this class that maps objects
+    to integer codes.
+    ManyToManyMap : An implementation of this class that maps keys
+    to sets of values.
     """
 
     @abc.abstractmethod    
@@ -102,6 +132,12 @@ class OneToOneMap(collections.MutableMapping, IReversibleMap):
     ---------------
     reverse()
         Reverse this mapping to map values to keys.
+    update(mapping, **kwargs)
+        Add a batch of mappings to this container at once.
+    getMany(keys, default)
+        Return values mapped to a batch of keys.
+    reverseGetMany(values, default)
+        Return keys mapped to a batch of values.
 
     Examples
     ----------------
@@ -152,6 +188,17 @@ class OneToOneMap(collections.MutableMapping, IReversibleMap):
     >>> booleans.clear()
     >>> booleans
     OneToOneMap({})
+    >>> OneToOneMap([(0, False), (1, False)])
+    Traceback (most recent call last):
+    ...
+    ValueError: (False, 'Value is already mapped to another key, please delete it before mapping to 1', 0)
+
+    Raises
+    ----------
+    ValueError
+        If the argument maps a value to more than one key.
+    KeyError
+        If the argument maps a key to more than one value.
     """
 
     def reverse(self):
@@ -184,17 +231,10 @@ class OneToOneMap(collections.MutableMapping, IReversibleMap):
             self._forward = {}
             self._reverse = {}
     
-            if mapping is None:
-                items = []
-            elif isinstance(mapping, collections.Mapping):
-                items = mapping.items()
-            else:
-                items = mapping
-    
-            for k, v in items:
-                self[k] = v
+            if mapping is not None:
+                self.update(mapping)
 
-            self._peer = OneToOneMap(_peer=self)
+            self._peer = type(self)(_peer=self)
         else: # _peer is not None:
             self._peer = _peer
             self._forward = _peer._reverse
@@ -224,140 +264,1112 @@ class OneToOneMap(collections.MutableMapping, IReversibleMap):
     def __contains__(self, item):
         return item in self._forward
 
+    def getMany(self, keys, *default):
+        """
+        Return values mapped to a batch of keys.
+        
+        Looks up all keys in a single call, without running
+        this class's methods for each key.
+    
+        Parameters
+        ----------
+        keys : Iterable
+            The keys to look up.
+        default : object, optional
+            The value to return for keys that are not mapped. If omitted,
+            a missing key raises an error.
+    
+        Returns
+        -------
+        list
+            Values mapped to `keys` in the same order.
+    
+        Raises
+        ------
+        KeyError
+            If a key is not mapped and there is no `default`.
+    
+        Examples
+        --------
+        >>> digits = OneToOneMap(enumerate('abc'))
+        >>> digits.getMany((2, 0))
+        ['c', 'a']
+        >>> digits.getMany((2, 5, 0), None)
+        ['c', None, 'a']
+        >>> digits.reverseGetMany('ba')
+        [1, 0]
+        >>> digits.getMany((2, 5))
+        Traceback (most recent call last):
+        ...
+        KeyError: 5
+        """
+    
+        return self._getMany(self._forward, keys, default)
+
+    def reverseGetMany(self, values, *default):
+        """
+        Return keys mapped to a batch of values.
+        
+        Same as ``reverse().getMany(values, default)``, see `getMany`.
+        """
+    
+        return self._getMany(self._reverse, values, default)
+
+    @staticmethod
+    def _getMany(dict_, keys, default):
+        if not default:
+            return list(map(dict_.__getitem__, keys))
+        elif 1 < len(default):
+            raise TypeError('expected at most 2 arguments, got %d' % (1 + len(default)))
+        return list(map(dict_.get, keys, itertools.repeat(default[0])))
+
     def __setitem__(self, key, value):
         if value in self._reverse and self._reverse[value] != key:
             # TODO: add an option of lenient forward mapping
             raise ValueError(
                 value,
-                'Value is already mapped to another key, please delete it before mapping to ' % key,
+                'Value is already mapped to another key, please delete it before mapping to %r' % (key,),
                 self._reverse[value]
             )
         if key in self._forward and self._forward[key] != value:
             # TODO: add an option of lenient reverse mapping
             raise KeyError(
                 key,
-                'Key is already mapped to another value, please delete it before mapping to ' % value,
+                'Key is already mapped to another value, please delete it before mapping to %r' % (value,),
                 self._forward[key]
             )
         self._forward[key] = value
         self._reverse[value] = key
 
+    def update(self, *args, **kwargs):
+        """
+        Add a batch of mappings to this container at once.
+        
+        Validates all new mappings for collisions with each other and
+        with existing mappings before storing any of them, then stores
+        them in both directions in bulk. If any new mapping would break
+        the one-to-one correspondence, this container is left unchanged.
+    
+        Parameters
+        ----------
+        mapping : collections.Mapping or iterable, optional
+            A map or dictionary with new mappings, or a collection of
+            name-value tuples representing such mappings.
+        kwargs : dict
+            New mappings passed as keyword arguments.
+    
+        Raises
+        ------
+        ValueError
+            If a value would be mapped to more than one key.
+        KeyError
+            If a key would be mapped to more than one value.
+    
+        Examples
+        --------
+        >>> letters = OneToOneMap({'a': 1, 'b': 2})
+        >>> letters.update([('c', 3), ('d', 2)], e=5)
+        Traceback (most recent call last):
+        ...
+        ValueError: (2, "Value is already mapped to another key, please delete it before mapping to 'd'", 'b')
+        >>> letters['c']
+        Traceback (most recent call last):
+        ...
+        KeyError: 'c'
+        >>> letters.update([('c', 3), ('d', 4)], e=5)
+        >>> sorted(letters.reverse().items())
+        [(1, 'a'), (2, 'b'), (3, 'c'), (4, 'd'), (5, 'e')]
+        """
+    
+        if 1 < len(args):
+            raise TypeError('update expected at most 1 argument, got %d' % len(args))
+        items = args[0] if args else ()
+        if isinstance(items, collections.Mapping):
+            items = items.items()
+        elif hasattr(items, 'keys'):
+            items = [ (k, items[k]) for k in items.keys() ]
+        elif not isinstance(items, collections.Sized):
+            items = list(items)
+        if kwargs:
+            items = list(itertools.chain(items, kwargs.items()))
+        forward = dict(items)
+        if len(forward) != len(items):
+            for k, v in items:
+                if forward[k] != v:
+                    raise KeyError(
+                        k,
+                        'Key is already mapped to another value, please delete it before mapping to %r' % (forward[k],),
+                        v
+                    )
+        reverse = dict(zip(forward.values(), forward.keys()))
+        if len(forward) != len(reverse):
+            for k, v in forward.items():
+                if reverse[v] != k:
+                    raise ValueError(
+                        v,
+                        'Value is already mapped to another key, please delete it before mapping to %r' % (reverse[v],),
+                        k
+                    )
+        if self._reverse:
+            for v in reverse.keys() & self._reverse.keys():
+                if self._reverse[v] != reverse[v]:
+                    raise ValueError(
+                        v,
+                        'Value is already mapped to another key, please delete it before mapping to %r' % (reverse[v],),
+                        self._reverse[v]
+                    )
+            for k in forward.keys() & self._forward.keys():
+                if self._forward[k] != forward[k]:
+                    raise KeyError(
+                        k,
+                        'Key is already mapped to another value, please delete it before mapping to %r' % (forward[k],),
+                        self._forward[k]
+                    )
+        self._store(forward, reverse)
+
+    def _store(self, forward, reverse):
+        """
+        Store a batch of validated mappings in both directions.
+        """
+        self._forward.update(forward)
+        self._reverse.update(reverse)
+
     def __delitem__(self, key):
         value = self._forward[key]
         del self._reverse[value]
         del self._forward[key]
 
-# TODO: make objects of this class Hashable
-class ImmutableMap(IReversibleMap):
+class ConcurrentOneToOneMap(OneToOneMap):
     """
-    Wrapper around a mapping that makes it immutable.
+    Variant of `OneToOneMap` that can be shared between threads.
     
-    Wraps a mapping object to make it immutable. Since any direct
-    references to the underlying object allow you to change its
-    contents, you should destroy all such references after creating
-    the wrapper to achieve true immutability.
+    Guards every operation on the mapping and its `reverse` peer
+    with a shared `locks.ReadWriteLock`, so that any number of threads
+    can look up keys and values at the same time, while changes are
+    made by one thread at a time and always update both directions
+    of the mapping before any reader can see them. The lock is held
+    only while an operation runs.
     
     Parameters
-    ----------
-    mapping : collections.Mapping
-        the underlying mapping
+    --------------------
+    mapping : collections.Mapping or iterable, optional
+        Initial mappings for this container, see `OneToOneMap`.
+    snapshotIterators : bool, optional
+        Whether iterators over this mapping and its views should read
+        a snapshot of its contents taken when they are created, rather
+        than fail when the mapping changes during iteration. This
+        setting is shared with the `reverse` peer of the mapping.
+        The default is ``False``.
 
     Methods
     ---------------
-    reverse()
-        Reverse this mapping to map values to keys, if the underlying
-        mapping is an `IReversibleMap`.
- 
-    Raises
-    ----------
-    TypeError
-        If an attempt is made to change or delete an item.
+    snapshot()
+        Return an immutable copy of this mapping's current contents.
 
     Examples
-    --------
-    >>> map = ImmutableMap({'access': 'code'})
-    >>> len(map)
-    1
-    >>> map['access']
-    'code'
-    >>> 'code' in map
-    False
-    >>> map['monkey']='wrench'
-    Traceback (most recent call last):
-    ...
-    TypeError: 'ImmutableMap' object does not support item assignment
-    >>> len(map)
-    1
-    >>> del map['access']
+    ----------------
+    >>> import threading
+    >>> codes = ConcurrentOneToOneMap(snapshotIterators=True)
+    >>> writers = [ threading.Thread(target=codes.update,
+    ...     args=([ (n, str(n)) for n in range(k, 1000, 4) ],)) for k in range(4) ]
+    >>> for t in writers: t.start()
+    >>> for t in writers: t.join()
+    >>> len(codes), len(codes.reverse()), codes.reverse()['999']
+    (1000, 1000, 999)
+    >>> keys = iter(codes)
+    >>> codes.clear()
+    >>> sum(1 for k in keys), len(codes.reverse())
+    (1000, 0)
+    >>> codes[1] = 'one'
+    >>> frozen = codes.snapshot()
+    >>> del codes[1]
+    >>> frozen, frozen.reverse()['one']
+    (ImmutableMap({1: 'one'}), 1)
+    """
+
+    def __init__(self, mapping = None, snapshotIterators = False, _peer = None):
+        if _peer is None:
+            self._lock = locks.ReadWriteLock()
+            self._snapshotIterators = snapshotIterators
+        else: # _peer is not None:
+            self._lock = _peer._lock
+            self._snapshotIterators = _peer._snapshotIterators
+        self._frozenCopy = None
+        super(ConcurrentOneToOneMap, self).__init__(mapping, _peer)
+
+    def _invalidate(self):
+        self._frozenCopy = None
+        peer = getattr(self, '_peer', None)
+        if peer is not None:
+            peer._frozenCopy = None
+
+    def snapshot(self):
+        """
+        Return an immutable copy of this mapping's current contents.
+        
+        The copy is created on demand after each change of this mapping
+        or its `reverse` peer, and shared between callers until the next
+        change.
+        
+        Returns
+        -------
+        ImmutableMap
+            An immutable wrapper around a `OneToOneMap` with a copy of
+            this mapping's contents. The wrapper is reversible.
+        """
+    
+        with self._lock.readLock:
+            frozen = self._frozenCopy
+            if frozen is None:
+                copy = OneToOneMap()
+                copy._forward.update(self._forward)
+                copy._reverse.update(self._reverse)
+                frozen = self._frozenCopy = ImmutableMap(copy)
+            return frozen
+
+    def __iter__(self):
+        if self._snapshotIterators:
+            return iter(self.snapshot())
+        with self._lock.readLock:
+            return super(ConcurrentOneToOneMap, self).__iter__()
+
+    def keys(self):
+        if self._snapshotIterators:
+            return self.snapshot().keys()
+        return super(ConcurrentOneToOneMap, self).keys()
+
+    def items(self):
+        if self._snapshotIterators:
+            return self.snapshot().items()
+        return super(ConcurrentOneToOneMap, self).items()
+
+    def values(self):
+        if self._snapshotIterators:
+            return self.snapshot().values()
+        return super(ConcurrentOneToOneMap, self).values()
+
+    def __eq__(self, other):
+        if isinstance(other, ConcurrentOneToOneMap):
+            other = other.snapshot()
+        return dict(self.snapshot().items()) == dict(other.items()) \
+            if isinstance(other, collections.Mapping) else NotImplemented
+
+    def _popitem(self):
+        for key in self._forward:
+            break
+        else:
+            raise KeyError('popitem(): mapping is empty')
+        value = self._forward.pop(key)
+        del self._reverse[value]
+        return key, value
+
+    def _clear(self):
+        self._forward.clear()
+        self._reverse.clear()
+
+    __str__ = locks.readLocked(OneToOneMap.__str__)
+    __len__ = locks.readLocked(OneToOneMap.__len__)
+    __getitem__ = locks.readLocked(OneToOneMap.__getitem__)
+    __contains__ = locks.readLocked(OneToOneMap.__contains__)
+    get = locks.readLocked(OneToOneMap.get)
+    getMany = locks.readLocked(OneToOneMap.getMany)
+    reverseGetMany = locks.readLocked(OneToOneMap.reverseGetMany)
+    __setitem__ = locks.writeLocked(OneToOneMap.__setitem__)
+    __delitem__ = locks.writeLocked(OneToOneMap.__delitem__)
+    update = locks.writeLocked(OneToOneMap.update)
+    pop = locks.writeLocked(OneToOneMap.pop)
+    popitem = locks.writeLocked(_popitem)
+    clear = locks.writeLocked(_clear)
+    setdefault = locks.writeLocked(OneToOneMap.setdefault)
+
+class CacheMap(OneToOneMap):
+    """
+    A reversible one-to-one dictionary of bounded size that evicts
+    least recently used or expired mappings.
+
+    A `OneToOneMap` that holds at most `capacity` mappings. Storing
+    a new mapping in a full container evicts the mapping that was least
+    recently looked up or stored in either direction. Optionally,
+    mappings expire after a fixed time since they were last stored.
+    Eviction and expiry remove both directions of a mapping at once,
+    at a constant cost per mapping removed. The container and its
+    `reverse` peer share their storage, recency order and statistics.
+    
+    Parameters
+    --------------------
+    capacity : int
+        The maximum number of mappings in this container.
+    mapping : collections.Mapping or iterable, optional
+        Initial mappings for this container, see `OneToOneMap`.
+        If there are more of them than `capacity`, the leading
+        mappings are evicted.
+    ttl : float, optional
+        The number of seconds, as measured by `clock`, after which
+        a mapping expires unless stored again. By default, mappings
+        do not expire.
+    clock : callable, optional
+        A function that returns the current time in seconds. The
+        default is `time.monotonic`.
+
+    Attributes
+    -----------------
+    capacity : int
+        The maximum number of mappings in this container.
+    ttl : float or None
+        The lifetime of mappings in this container.
+
+    Methods
+    ---------------
+    stats()
+        Return the counts of hits, misses, evictions and expirations.
+    resetStats()
+        Set the counts returned by `stats` to zero.
+
+    Notes
+    -----
+    Looking up a key with ``[]``, `get`, `getMany` and similar methods
+    makes its mapping the most recently used one and counts as a hit
+    or a miss. Membership tests, iteration and views do not. `popitem`
+    removes the least recently used mapping. Iterators return the keys
+    that were present when they were created.
+
+    Examples
+    ----------------
+    >>> sessions = CacheMap(2)
+    >>> sessions['t1'] = 'alice'; sessions['t2'] = 'bob'
+    >>> sessions.reverse()['alice']
+    't1'
+    >>> sessions['t3'] = 'carol'
+    >>> sorted(sessions.items())
+    [('t1', 'alice'), ('t3', 'carol')]
+    >>> 'bob' in sessions.reverse(), sessions.get('t2')
+    (False, None)
+    >>> sessions['t4'] = 'alice'
     Traceback (most recent call last):
     ...
-    TypeError: 'ImmutableMap' object does not support item deletion
-    >>> len(map)
+    ValueError: ('alice', "Value is already mapped to another key, please delete it before mapping to 't4'", 't1')
+    >>> sessions.stats()
+    Stats(hits=1, misses=1, evictions=1, expirations=0)
+
+    >>> now = [0]
+    >>> tokens = CacheMap(100, {'a': 1}, ttl=10, clock=lambda: now[0])
+    >>> now[0] = 5; tokens['b'] = 2
+    >>> now[0] = 12; tokens, len(tokens.reverse())
+    (CacheMap({'b': 2}), 1)
+    >>> tokens.stats().expirations
     1
-    >>> map.reverse()
-    Traceback (most recent call last):
-    ...
-    TypeError: Mapping of type 'dict' is not reversible
+
+    Raises
+    ----------
+    ValueError
+        If `capacity` is not positive, or the mappings break
+        the one-to-one correspondence as with `OneToOneMap`.
+    KeyError
+        If the mappings break the one-to-one correspondence as with
+        `OneToOneMap`.
     """
 
-    def _readOnlyAttr(self, name, *value):
-        if name in {'_mapping', '_reverse'}:
-            raise AttributeError(name + " is a read-only attribute")
-        elif 0 < len(value):
-            super(ImmutableMap, self).__setattr__(name, *value)
+    Stats = collections.namedtuple('Stats', 'hits misses evictions expirations')
+
+    def __init__(self, capacity, mapping = None, ttl = None, clock = None, _peer = None):
+        if _peer is None:
+            if not 0 < capacity:
+                raise ValueError('capacity must be positive, got %r' % (capacity,))
+            self._capacity = capacity
+            self._ttl = ttl
+            self._clock = time.monotonic if clock is None else clock
+            self._primary = True
+            self._forward = self._order = collections.OrderedDict()
+            self._reverse = self._inverse = {}
+            self._deadlines = None if ttl is None else collections.OrderedDict()
+            self._counters = [ 0, 0, 0, 0 ]
+            if mapping is not None:
+                self.update(mapping)
+            self._peer = type(self)(capacity, ttl = ttl, clock = clock, _peer = self)
         else:
-            super(ImmutableMap, self).__delattr__(name)
+            self._primary = False
+            self._peer = _peer
+            self._forward = _peer._reverse
+            self._reverse = _peer._forward
+            for name in ('_capacity', '_ttl', '_clock',
+                         '_order', '_inverse', '_deadlines', '_counters'):
+                setattr(self, name, getattr(_peer, name))
 
-    __setattr__ = _readOnlyAttr
-    __delattr__ = _readOnlyAttr
+    @property
+    def capacity(self):
+        """
+        The maximum number of mappings in this container.
+        """
+        return self._capacity
 
-    def __init__(self, mapping):
-        if not isinstance(mapping, collections.Mapping):
-            raise TypeError("Wrapped object of a non-mapping type: " + type(mapping).__name__)
-        self.__dict__['_mapping'] = mapping
-        self.__dict__['_reverse'] = None
+    @property
+    def ttl(self):
+        """
+        The number of seconds after which mappings expire, or ``None``.
+        """
+        return self._ttl
 
-    def __iter__(self):
-        return iter(self._mapping)
+    def stats(self):
+        """
+        Return the counts of hits, misses, evictions and expirations.
+        
+        Returns
+        -------
+        CacheMap.Stats
+            A named tuple with the numbers of successful and failed
+            lookups, and of mappings evicted to make room for new ones
+            or removed upon expiry, in both directions of this
+            container since its creation or the last call to
+            `resetStats`.
+        """
+        return CacheMap.Stats(*self._counters)
+
+    def resetStats(self):
+        """
+        Set the counts returned by `stats` to zero.
+        """
+        self._counters[:] = [ 0, 0, 0, 0 ]
+
+    def _expire(self):
+        """
+        Remove the mappings that have expired.
+        """
+        deadlines = self._deadlines
+        if deadlines:
+            now = self._clock()
+            while deadlines:
+                key, deadline = next(iter(deadlines.items()))
+                if deadline > now:
+                    break
+                del deadlines[key]
+                del self._inverse[self._order.pop(key)]
+                self._counters[3] += 1
+
+    def _used(self, key, value, stored):
+        """
+        Make a mapping the most recently used one, and restart its
+        lifetime if it has been stored.
+        """
+        if not self._primary:
+            key = value
+        self._order.move_to_end(key)
+        if stored and self._deadlines is not None:
+            self._deadlines[key] = self._clock() + self._ttl
+            self._deadlines.move_to_end(key)
+
+    def _evict(self):
+        """
+        Remove the least recently used mappings in excess of `capacity`.
+        """
+        order = self._order
+        while len(order) > self._capacity:
+            key, value = order.popitem(last = False)
+            del self._inverse[value]
+            if self._deadlines is not None:
+                del self._deadlines[key]
+            self._counters[2] += 1
+
+    def __str__(self):
+        self._expire()
+        return str(dict(self._forward))
 
     def __len__(self):
-        return len(self._mapping)
+        self._expire()
+        return super(CacheMap, self).__len__()
 
     def __getitem__(self, key):
-        return self._mapping[key]
+        self._expire()
+        try:
+            value = self._forward[key]
+        except KeyError:
+            self._counters[1] += 1
+            raise
+        self._counters[0] += 1
+        self._order.move_to_end(key if self._primary else value)
+        return value
+
+    def __iter__(self):
+        self._expire()
+        return iter(list(self._forward))
 
     def __contains__(self, item):
-        return item in self._mapping
+        self._expire()
+        return item in self._forward
 
-    def __str__(self):
-        return str(self._mapping)
+    def getMany(self, keys, *default):
+        return self._getMany(self, keys, default)
 
-    def __repr__(self):
-        return 'ImmutableMap(%s)' % self._mapping
+    def reverseGetMany(self, values, *default):
+        return self._getMany(self._peer, values, default)
 
-    def keys(self):
-        return self._mapping.keys()
+    def __setitem__(self, key, value):
+        self._expire()
+        super(CacheMap, self).__setitem__(key, value)
+        self._used(key, value, True)
+        self._evict()
+
+    def update(self, *args, **kwargs):
+        self._expire()
+        super(CacheMap, self).update(*args, **kwargs)
+
+    def _store(self, forward, reverse):
+        super(CacheMap, self)._store(forward, reverse)
+        for key, value in forward.items():
+            self._used(key, value, True)
+        self._evict()
+
+    def __delitem__(self, key):
+        self._expire()
+        value = self._forward[key]
+        super(CacheMap, self).__delitem__(key)
+        if self._deadlines is not None:
+            del self._deadlines[key if self._primary else value]
+
+    def popitem(self):
+        """
+        Remove the least recently used mapping and return it
+        as a tuple of its key and value.
+        """
+        self._expire()
+        if not self._order:
+            raise KeyError('popitem(): mapping is empty')
+        key, value = self._order.popitem(last = False)
+        del self._inverse[value]
+        if self._deadlines is not None:
+            del self._deadlines[key]
+        return (key, value) if self._primary else (value, key)
+
+    def clear(self):
+        self._forward.clear()
+        self._reverse.clear()
+        if self._deadlines is not None:
+            self._deadlines.clear()
 
     def items(self):
-        return self._mapping.items()
+        return CacheMap.ItemsView(self)
 
     def values(self):
-        return self._mapping.values()
+        return CacheMap.ValuesView(self)
+
+    class ItemsView(collections.ItemsView):
+
+        def __contains__(self, item):
+            key, value = item
+            mapping = self._mapping
+            return key in mapping and mapping._forward[key] == value
+
+        def __iter__(self):
+            self._mapping._expire()
+            return iter(list(self._mapping._forward.items()))
+
+    class ValuesView(collections.ValuesView):
+
+        def __contains__(self, value):
+            return value in self._mapping._peer
+
+        def __iter__(self):
+            self._mapping._expire()
+            return iter(list(self._mapping._forward.values()))
+
+class InternMap(IReversibleMap):
+    """
+    A reversible mapping of objects to dense integer codes.
+    
+    Assigns consecutive integer codes, starting at zero, to distinct
+    hashable objects in the order they are encoded, and decodes those
+    codes back to the objects. Objects are kept in a list indexed by
+    their codes, so this class takes about half as much memory as
+    a `OneToOneMap` with the same contents, and decoding a code is
+    a list lookup. Codes are never reassigned, so the mapping only grows.
+    The `reverse` method returns a read-only view of the same storage
+    that maps codes to objects.
+    
+    Parameters
+    --------------------
+    iterable : Iterable, optional
+        Objects to encode initially, in the order of their codes.
+        Duplicate objects receive the code of their first occurrence.
+
+    Methods
+    ---------------
+    reverse()
+        Return the mapping of codes to objects.
+    encode(obj)
+        Return the code of an object, assigning a new code if necessary.
+    encodeMany(objects)
+        Return the codes of a batch of objects, assigning new codes
+        as necessary.
+    decodeMany(codes)
+        Return the objects with a batch of codes.
+
+    Examples
+    ----------------
+    >>> words = InternMap(['to', 'be', 'or', 'not'])
+    >>> words['be'], words.encode('to'), words.encode('question')
+    (1, 0, 4)
+    >>> words.encodeMany('to be or not to be that is the question'.split())
+    [0, 1, 2, 3, 0, 1, 5, 6, 7, 4]
+    >>> words.decodeMany((7, 4))
+    ['the', 'question']
+    >>> len(words), 'that' in words, words.reverse()[5]
+    (8, True, 'that')
+    >>> words.reverse().reverse() is words
+    True
+    >>> words['nobler']
+    Traceback (most recent call last):
+    ...
+    KeyError: 'nobler'
+    >>> words.reverse()[-1]
+    Traceback (most recent call last):
+    ...
+    KeyError: -1
+    """
+
+    def __init__(self, iterable = None):
+        self._objects = [] if iterable is None else list(dict.fromkeys(iterable))
+        self._codes = dict(zip(self._objects, range(len(self._objects))))
+        self._peer = InternMap.Decoder(self)
+
+    def __str__(self):
+        return str(self._codes)
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, self._objects)
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __getitem__(self, key):
+        return self._codes[key]
+
+    def __iter__(self):
+        return iter(self._codes)
+
+    def __contains__(self, item):
+        return item in self._codes
 
     def reverse(self):
         """
-        Return the reverse mapping if the wrapped object supports that.
+        Return the mapping of codes to objects.
         
-        This method requires that the wrapped object must also be
-        reversible. 
-    
         Returns
         -------
-        collections.Mapping
-            Immutable wrapper around the reverse mapping. Returned wrapper
-            is always reversible, and its reverse version is this object.
+        InternMap.Decoder
+            A read-only mapping of codes to objects that shares
+            storage with this object.
+        """
     
-        Raises
+        return self._peer
+
+    def encode(self, obj):
+        """
+        Return the code of an object, assigning a new code if necessary.
+        """
+    
+        code = self._codes.get(obj)
+        if code is None:
+            code = len(self._objects)
+            self._codes[obj] = code
+            self._objects.append(obj)
+        return code
+
+    def encodeMany(self, objects):
+        """
+        Return the codes of a batch of objects, assigning new codes
+        as necessary.
+        
+        Parameters
+        ----------
+        objects : Iterable
+            The objects to encode.
+    
+        Returns
+        -------
+        list
+            Codes of `objects` in the same order.
+        """
+    
+        if not isinstance(objects, collections.Sequence):
+            objects = list(objects)
+        codes = list(map(self._codes.get, objects))
+        if None in codes:
+            for i, code in enumerate(codes):
+                if code is None:
+                    codes[i] = self.encode(objects[i])
+        return codes
+
+    def decodeMany(self, codes):
+        """
+        Return the objects with a batch of codes.
+        
+        Parameters
+        ----------
+        codes : Iterable
+            The codes to decode.
+    
+        Returns
+        -------
+        list
+            Objects with `codes` in the same order.
+    
+        Raises
+        ------
+        KeyError
+            If a code has not been assigned.
+        """
+    
+        if not isinstance(codes, collections.Sized):
+            codes = list(codes)
+        try:
+            if len(codes) and 0 > min(codes):
+                raise IndexError
+            return list(map(self._objects.__getitem__, codes))
+        except IndexError:
+            for code in codes:
+                self._peer[code]
+            raise
+
+    class Decoder(IReversibleMap):
+        """
+        Read-only mapping of codes assigned by an `InternMap` to objects.
+        """
+    
+        def __init__(self, peer):
+            self._peer = peer
+    
+        def __str__(self):
+            return str(dict(enumerate(self._peer._objects)))
+    
+        def __repr__(self):
+            return '%s(%s)' % (type(self).__name__, self)
+
+        def __len__(self):
+            return len(self._peer._objects)
+    
+        def __getitem__(self, code):
+            if code not in self:
+                raise KeyError(code)
+            return self._peer._objects[code]
+    
+        def __iter__(self):
+            return iter(range(len(self._peer._objects)))
+    
+        def __contains__(self, item):
+            try:
+                item = operator.index(item)
+            except TypeError:
+                return False
+            return 0 <= item < len(self._peer._objects)
+
+        def reverse(self):
+            return self._peer
+
+class ManyToManyMap(collections.MutableMapping, IReversibleMap):
+    """
+    A dictionary that maps keys to sets of values, with `reverse`
+    method.
+    
+    A dictionary type that associates each key with any number of
+    values, and each value with any number of keys. It maintains
+    an index of associations in both directions, which is updated
+    whenever an association is added or removed, so looking up the
+    keys of a value takes constant time, as does adding or removing
+    an association. Both keys and values must be immutable and
+    implement `collections.Hashable`. Looking up a key returns
+    a read-only set of values associated with it. Keys without
+    associated values are dropped from the mapping.
+    
+    Parameters
+    --------------------
+    mapping : collections.Mapping or iterable, optional
+        A map or dictionary of keys to iterables over their values, or
+        a collection of name-value tuples, each representing a single
+        association. With no arguments, creates an empty container.
+
+    Methods
+    ---------------
+    reverse()
+        Reverse this mapping to map values to sets of keys.
+    add(key, value)
+        Associate a key with a value.
+    discard(key, value)
+        Remove an association between a key and a value, if present.
+    hasPair(key, value)
+        Tell whether a key is associated with a value.
+
+    Examples
+    ----------------
+    >>> tags = ManyToManyMap([('red', 1), ('round', 1), ('red', 2)])
+    >>> sorted(tags['red']), sorted(tags.reverse()[1])
+    ([1, 2], ['red', 'round'])
+    >>> tags.add('round', 3); tags.discard('red', 1)
+    >>> sorted((value, set(keys)) for value, keys in tags.reverse().items())
+    [(1, {'round'}), (2, {'red'}), (3, {'round'})]
+    >>> tags['red'] = (3, 4)
+    >>> sorted(tags.reverse()[3]), sorted(tags.reverse()[4])
+    (['red', 'round'], ['red'])
+    >>> del tags['round']
+    >>> tags
+    ManyToManyMap({'red': {3, 4}})
+    >>> tags.reverse()
+    ManyToManyMap({3: {'red'}, 4: {'red'}})
+    >>> tags.hasPair('red', 4), 'round' in tags, 1 in tags.reverse()
+    (True, False, False)
+    >>> tags.reverse().reverse() is tags
+    True
+    """
+
+    def __init__(self, mapping = None, _peer = None):
+        if _peer is None:
+            self._forward = {}
+            self._reverse = {}
+            if mapping is None:
+                pass
+            elif isinstance(mapping, collections.Mapping):
+                for key, values in mapping.items():
+                    for value in values:
+                        self.add(key, value)
+            else:
+                for key, value in mapping:
+                    self.add(key, value)
+            self._peer = ManyToManyMap(_peer=self)
+        else: # _peer is not None:
+            self._peer = _peer
+            self._forward = _peer._reverse
+            self._reverse = _peer._forward
+
+    def reverse(self):
+        """
+        Reverse this mapping to map values to sets of keys.
+        
+        Returns a container of the same class that shares the index
+        of associations with this object, so that changes made to either
+        of them are reflected in the other.
+    
+        Returns
+        -------
+        ManyToManyMap
+            a mapping container that maps this object's values to
+            sets of their keys
+        """
+    
+        return self._peer
+
+    def __str__(self):
+        return str(self._forward)
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, self)
+
+    def __len__(self):
+        return len(self._forward)
+
+    def __getitem__(self, key):
+        return ManyToManyMap.ValueSet(self._forward[key])
+
+    def __iter__(self):
+        return iter(self._forward)
+
+    def __contains__(self, item):
+        return item in self._forward
+
+    def __setitem__(self, key, values):
+        values = set(values)
+        if key in self._forward:
+            del self[key]
+        for value in values:
+            self.add(key, value)
+
+    def __delitem__(self, key):
+        values = self._forward.pop(key)
+        for value in values:
+            keys = self._reverse[value]
+            keys.remove(key)
+            if not keys:
+                del self._reverse[value]
+
+    def add(self, key, value):
+        """
+        Associate a key with a value.
+        
+        Does nothing if the key is already associated with the value.
+        """
+    
+        values = self._forward.get(key)
+        if values is None:
+            values = self._forward[key] = set()
+        values.add(value)
+        keys = self._reverse.get(value)
+        if keys is None:
+            keys = self._reverse[value] = set()
+        keys.add(key)
+
+    def discard(self, key, value):
+        """
+        Remove an association between a key and a value, if present.
+        
+        Drops the key or value from their respective directions of
+        this mapping if they have no other associations left.
+        """
+    
+        values = self._forward.get(key)
+        if values is None or value not in values:
+            return
+        values.remove(value)
+        if not values:
+            del self._forward[key]
+        keys = self._reverse[value]
+        keys.remove(key)
+        if not keys:
+            del self._reverse[value]
+
+    def hasPair(self, key, value):
+        """
+        Tell whether a key is associated with a value.
+        """
+    
+        values = self._forward.get(key)
+        return values is not None and value in values
+
+    class ValueSet(collections.Set):
+        """
+        Read-only view of the values associated with a key of
+        a `ManyToManyMap`.
+        """
+    
+        def __init__(self, set_):
+            self._set = set_
+
+        @classmethod
+        def _from_iterable(cls, iterable):
+            return set(iterable)
+
+        def __str__(self):
+            return str(self._set)
+
+        def __repr__(self):
+            return repr(self._set)
+
+        def __len__(self):
+            return len(self._set)
+
+        def __iter__(self):
+            return iter(self._set)
+
+        def __contains__(self, item):
+            return item in self._set
+
+# TODO: make objects of this class Hashable
+class ImmutableMap(IReversibleMap):
+    """
+    Wrapper around a mapping that makes it immutable.
+    
+    Wraps a mapping object to make it immutable. Since any direct
+    references to the underlying object allow you to change its
+    contents, you should destroy all such references after creating
+    the wrapper to achieve true immutability.
+    
+    Parameters
+    ----------
+    mapping : collections.Mapping
+        the underlying mapping
+
+    Methods
+    ---------------
+    reverse()
+        Reverse this mapping to map values to keys, if the underlying
+        mapping is an `IReversibleMap`.
+ 
+    Raises
+    ----------
+    TypeError
+        If an attempt is made to change or delete an item.
+
+    Examples
+    --------
+    >>> map = ImmutableMap({'access': 'code'})
+    >>> len(map)
+    1
+    >>> map['access']
+    'code'
+    >>> 'code' in map
+    False
+    >>> map['monkey']='wrench'
+    Traceback (most recent call last):
+    ...
+    TypeError: 'ImmutableMap' object does not support item assignment
+    >>> len(map)
+    1
+    >>> del map['access']
+    Traceback (most recent call last):
+    ...
+    TypeError: 'ImmutableMap' object does not support item deletion
+    >>> len(map)
+    1
+    >>> map.reverse()
+    Traceback (most recent call last):
+    ...
+    TypeError: Mapping of type 'dict' is not reversible
+    """
+
+    def _readOnlyAttr(self, name, *value):
+        if name in {'_mapping', '_reverse'}:
+            raise AttributeError(name + " is a read-only attribute")
+        elif 0 < len(value):
+            super(ImmutableMap, self).__setattr__(name, *value)
+        else:
+            super(ImmutableMap, self).__delattr__(name)
+
+    __setattr__ = _readOnlyAttr
+    __delattr__ = _readOnlyAttr
+
+    def __init__(self, mapping):
+        if not isinstance(mapping, collections.Mapping):
+            raise TypeError("Wrapped object of a non-mapping type: " + type(mapping).__name__)
+        self.__dict__['_mapping'] = mapping
+        self.__dict__['_reverse'] = None
+
+    def __iter__(self):
+        return iter(self._mapping)
+
+    def __len__(self):
+        return len(self._mapping)
+
+    def __getitem__(self, key):
+        return self._mapping[key]
+
+    def __contains__(self, item):
+        return item in self._mapping
+
+    def __str__(self):
+        return str(self._mapping)
+
+    def __repr__(self):
+        return 'ImmutableMap(%s)' % self._mapping
+
+    def keys(self):
+        return self._mapping.keys()
+
+    def items(self):
+        return self._mapping.items()
+
+    def values(self):
+        return self._mapping.values()
+
+    def reverse(self):
+        """
+        Return the reverse mapping if the wrapped object supports that.
+        
+        This method requires that the wrapped object must also be
+        reversible. 
+    
+        Returns
+        -------
+        collections.Mapping
+            Immutable wrapper around the reverse mapping. Returned wrapper
+            is always reversible, and its reverse version is this object.
+    
+        Raises
         ------
         TypeError
             If the wrapped object is not reversible.
@@ -382,6 +1394,1162 @@ class ImmutableMap(IReversibleMap):
             self._reverse.__dict__['_reverse'] = self
         return self._reverse
 
+class PersistentMap(IReversibleMap):
+    """
+    Immutable mapping that makes modified versions of itself cheaply.
+    
+    Stores its items in a hash array mapped trie, so that methods
+    that "change" the mapping return a new version of it in
+    O(log32 n) time, sharing all but a few nodes of the trie with
+    the original. Versions are never changed once created, so they
+    can be handed out to any number of readers without copying, and
+    can be used as dictionary keys if all their values are hashable.
+    A version made from an `IReversibleMap`, or with the `reversible`
+    flag, maintains a second trie that maps values back to keys and
+    keeps the one-to-one correspondence between them.
+    
+    Parameters
+    ----------
+    mapping : collections.Mapping or iterable, optional
+        A map or dictionary to copy, or a collection of name-value
+        tuples. With no arguments, creates an empty mapping.
+    reversible : bool, optional
+        Whether this mapping and its versions should support
+        the `reverse` method. Defaults to ``True`` if `mapping` is
+        an `IReversibleMap` and ``False`` otherwise.
+
+    Methods
+    ---------------
+    set(key, value)
+        Return a version of this mapping with a key mapped to a value.
+    delete(key)
+        Return a version of this mapping without a key.
+    update(mapping, **kwargs)
+        Return a version of this mapping with a batch of items added.
+    reverse()
+        Reverse this mapping to map values to keys, if it was created
+        as reversible.
+ 
+    Raises
+    ----------
+    TypeError
+        If an attempt is made to change or delete an item in place.
+    ValueError
+        If a version of a reversible mapping would map a value to more
+        than one key.
+
+    Examples
+    --------
+    >>> first = PersistentMap({1: 'one', 2: 'two'})
+    >>> second = first.set(3, 'three').delete(1)
+    >>> first
+    PersistentMap({1: 'one', 2: 'two'})
+    >>> second
+    PersistentMap({2: 'two', 3: 'three'})
+    >>> {first: 'first'}[PersistentMap([(2, 'two'), (1, 'one')])]
+    'first'
+    >>> second[4] = 'four'
+    Traceback (most recent call last):
+    ...
+    TypeError: 'PersistentMap' object does not support item assignment
+    >>> first.reverse()
+    Traceback (most recent call last):
+    ...
+    TypeError: This PersistentMap has been created without a reverse mapping
+    >>> codes = PersistentMap(OneToOneMap({'a': 1}))
+    >>> codes.update(b=2).reverse()[2], len(codes)
+    ('b', 1)
+    >>> codes.set('a', 3).reverse()
+    PersistentMap({3: 'a'})
+    >>> codes.set('c', 1)
+    Traceback (most recent call last):
+    ...
+    ValueError: (1, "Value is already mapped to another key, please delete it before mapping to 'c'", 'a')
+    """
+
+    def _readOnlyAttr(self, name, *value):
+        if name in {'_root', '_len', '_peer', '_hash'}:
+            raise AttributeError(name + " is a read-only attribute")
+        elif 0 < len(value):
+            super(PersistentMap, self).__setattr__(name, *value)
+        else:
+            super(PersistentMap, self).__delattr__(name)
+
+    __setattr__ = _readOnlyAttr
+    __delattr__ = _readOnlyAttr
+
+    def __init__(self, mapping = None, reversible = None):
+        if reversible is None:
+            reversible = isinstance(mapping, IReversibleMap)
+        self._install(_TrieNode.EMPTY, 0, _TrieNode.EMPTY if reversible else None)
+        if mapping is not None:
+            self._install(*self._updated(mapping))
+
+    def _install(self, root, len_, reverseRoot):
+        self.__dict__['_root'] = root
+        self.__dict__['_len'] = len_
+        self.__dict__['_hash'] = None
+        if reverseRoot is None:
+            self.__dict__['_peer'] = None
+        else:
+            peer = object.__new__(type(self))
+            peer.__dict__.update(_root=reverseRoot, _len=len_, _peer=self, _hash=None)
+            self.__dict__['_peer'] = peer
+
+    def _derive(self, root, len_, reverseRoot):
+        version = object.__new__(type(self))
+        version._install(root, len_, reverseRoot)
+        return version
+
+    @staticmethod
+    def _itemsOf(items):
+        if isinstance(items, collections.Mapping):
+            return items.items()
+        elif hasattr(items, 'keys'):
+            return [ (k, items[k]) for k in items.keys() ]
+        return items
+
+    def _updated(self, items):
+        items = self._itemsOf(items)
+        # nodes created during this batch are owned by `edit` and
+        # are safe to change in place until the batch completes
+        edit = object()
+        root, len_ = self._root, self._len
+        reverseRoot = None if self._peer is None else self._peer._root
+        for key, value in items:
+            root, old = root.assoc(0, (_TrieNode.hash(key), key, value), edit)
+            if old is None:
+                len_ += 1
+            if reverseRoot is None:
+                continue
+            elif old is not None:
+                if old[2] is value or old[2] == value:
+                    continue
+                reverseRoot = reverseRoot.without(
+                    0, _TrieNode.hash(old[2]), old[2], edit
+                )[0] or _TrieNode.EMPTY
+            reverseRoot, old = reverseRoot.assoc(
+                0, (_TrieNode.hash(value), value, key), edit
+            )
+            if old is not None:
+                raise ValueError(
+                    value,
+                    'Value is already mapped to another key, please delete it before mapping to %r' % (key,),
+                    old[2]
+                )
+        return root, len_, reverseRoot
+
+    def set(self, key, value):
+        """
+        Return a version of this mapping with a key mapped to a value.
+        
+        Replaces the value that the key is mapped to in this
+        mapping, if any.
+
+        Raises
+        ------
+        ValueError
+            If this mapping is reversible and already maps another key
+            to `value`.
+        """
+    
+        return self._derive(*self._updated(((key, value),)))
+
+    def delete(self, key):
+        """
+        Return a version of this mapping without a key.
+
+        Raises
+        ------
+        KeyError
+            If this mapping does not contain the key.
+        """
+    
+        root, old = self._root.without(0, _TrieNode.hash(key), key, None)
+        reverseRoot = None
+        if self._peer is not None:
+            reverseRoot = self._peer._root.without(
+                0, _TrieNode.hash(old[2]), old[2], None
+            )[0] or _TrieNode.EMPTY
+        return self._derive(root or _TrieNode.EMPTY, self._len - 1, reverseRoot)
+
+    def update(self, *args, **kwargs):
+        """
+        Return a version of this mapping with a batch of items added.
+        
+        Later items replace the values of earlier items with the same
+        key. Nodes created for the new version while applying the batch
+        are changed in place rather than copied for each item.
+    
+        Parameters
+        ----------
+        mapping : collections.Mapping or iterable, optional
+            A map or dictionary with new items, or a collection of
+            name-value tuples representing such items.
+        kwargs : dict
+            New items passed as keyword arguments.
+
+        Raises
+        ------
+        ValueError
+            If this mapping is reversible and a value would be mapped
+            to more than one key.
+        """
+    
+        if 1 < len(args):
+            raise TypeError('update expected at most 1 argument, got %d' % len(args))
+        items = args[0] if args else ()
+        if kwargs:
+            items = itertools.chain(self._itemsOf(items), kwargs.items())
+        return self._derive(*self._updated(items))
+
+    def reverse(self):
+        """
+        Return the reverse of this mapping if it has been created
+        as reversible.
+    
+        Returns
+        -------
+        PersistentMap
+            A mapping of this object's values to its keys that shares
+            storage with this object. Returned mapping is always
+            reversible, and its reverse version is this object.
+    
+        Raises
+        ------
+        TypeError
+            If this mapping has been created without a reverse mapping.
+        """
+    
+        if self._peer is None:
+            raise TypeError("This PersistentMap has been created without a reverse mapping")
+        return self._peer
+
+    def __iter__(self):
+        return (leaf[1] for leaf in self._root.leaves())
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, key):
+        return self._root.find(_TrieNode.hash(key), key)
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        return super(PersistentMap, self).__eq__(other)
+
+    def __hash__(self):
+        if self._hash is None:
+            self.__dict__['_hash'] = hash(frozenset(self.items()))
+        return self._hash
+
+    def __str__(self):
+        return '{' + ', '.join('%r: %r' % item for item in self.items()) + '}'
+
+    def __repr__(self):
+        return 'PersistentMap(%s)' % self
+
+    def items(self):
+        return PersistentMap.ItemsView(self)
+
+    def values(self):
+        return PersistentMap.ValuesView(self)
+
+    class ItemsView(collections.ItemsView):
+
+        def __iter__(self):
+            for leaf in self._mapping._root.leaves():
+                yield leaf[1], leaf[2]
+
+    class ValuesView(collections.ValuesView):
+
+        def __iter__(self):
+            for leaf in self._mapping._root.leaves():
+                yield leaf[2]
+
+class _TrieNode:
+    """
+    Node of the hash array mapped trie that stores items of
+    a `PersistentMap`.
+    
+    Each node consumes `BITS` bits of the hash of a key to pick
+    one of its slots. Occupied slots are marked in `bitmap`, and
+    `entries` lists their contents in the order of slots. An entry is
+    either a leaf tuple of a key's hash, the key, and its value, or
+    a child node. Nodes are only changed in place while their `owner`
+    is the edit token of the current batch of changes.
+    """
+
+    __slots__ = ('bitmap', 'entries', 'owner')
+
+    BITS = 5
+    MASK = (1 << BITS) - 1
+
+    def __init__(self, bitmap, entries, owner):
+        self.bitmap = bitmap
+        self.entries = entries
+        self.owner = owner
+
+    @staticmethod
+    def hash(key):
+        return hash(key) & 0xFFFFFFFFFFFFFFFF
+
+    @staticmethod
+    def pair(shift, entry, leaf, edit):
+        """
+        Make a node at depth `shift` holding an entry and a leaf
+        that hash differently.
+        """
+        hash_ = entry[0] if type(entry) is tuple else entry.hash
+        if hash_ == leaf[0]:
+            return _CollisionNode(hash_, [entry, leaf], edit)
+        at = (hash_ >> shift) & _TrieNode.MASK
+        leafAt = (leaf[0] >> shift) & _TrieNode.MASK
+        if at == leafAt:
+            return _TrieNode(1 << at,
+                [_TrieNode.pair(shift + _TrieNode.BITS, entry, leaf, edit)], edit)
+        return _TrieNode((1 << at) | (1 << leafAt),
+            [entry, leaf] if at < leafAt else [leaf, entry], edit)
+
+    def find(self, hash_, key):
+        node, shift = self, 0
+        while type(node) is _TrieNode:
+            bit = 1 << ((hash_ >> shift) & _TrieNode.MASK)
+            if not node.bitmap & bit:
+                raise KeyError(key)
+            node = node.entries[bin(node.bitmap & (bit - 1)).count('1')]
+            if type(node) is tuple:
+                if node[0] == hash_ and (node[1] is key or node[1] == key):
+                    return node[2]
+                raise KeyError(key)
+            shift += _TrieNode.BITS
+        return node.find(hash_, key)
+
+    def leaves(self):
+        stack = [ iter(self.entries) ]
+        while stack:
+            for entry in stack[-1]:
+                if type(entry) is tuple:
+                    yield entry
+                elif type(entry) is _TrieNode:
+                    stack.append(iter(entry.entries))
+                    break
+                else:
+                    yield from entry.leaves
+            else:
+                stack.pop()
+
+    def assoc(self, shift, leaf, edit):
+        """
+        Return a node with a leaf added or replaced at depth `shift`,
+        and the replaced leaf, if any.
+        """
+        bit = 1 << ((leaf[0] >> shift) & _TrieNode.MASK)
+        at = bin(self.bitmap & (bit - 1)).count('1')
+        if not self.bitmap & bit:
+            return self._inserted(edit, bit, at, leaf), None
+        entry = self.entries[at]
+        if type(entry) is tuple:
+            if entry[0] != leaf[0] or not (entry[1] is leaf[1] or entry[1] == leaf[1]):
+                entry = _TrieNode.pair(shift + _TrieNode.BITS, entry, leaf, edit)
+                return self._replaced(edit, at, entry), None
+            elif entry[2] is leaf[2]:
+                return self, entry
+            return self._replaced(edit, at, (entry[0], entry[1], leaf[2])), entry
+        child, old = entry.assoc(shift + _TrieNode.BITS, leaf, edit)
+        if child is entry:
+            return self, old
+        return self._replaced(edit, at, child), old
+
+    def without(self, shift, hash_, key, edit):
+        """
+        Return a node, lone leaf or collision node, or ``None``, that
+        replaces this node at depth `shift` after removing a key, and
+        the removed leaf.
+        """
+        bit = 1 << ((hash_ >> shift) & _TrieNode.MASK)
+        if not self.bitmap & bit:
+            raise KeyError(key)
+        at = bin(self.bitmap & (bit - 1)).count('1')
+        entry = self.entries[at]
+        if type(entry) is tuple:
+            if entry[0] != hash_ or not (entry[1] is key or entry[1] == key):
+                raise KeyError(key)
+            old, child = entry, None
+        else:
+            child, old = entry.without(shift + _TrieNode.BITS, hash_, key, edit)
+        if child is not None:
+            if 0 < shift and 1 == len(self.entries) and type(child) is not _TrieNode:
+                return child, old
+            return self._replaced(edit, at, child), old
+        elif 1 == len(self.entries):
+            return None, old
+        elif 0 < shift and 2 == len(self.entries):
+            other = self.entries[1 - at]
+            if type(other) is not _TrieNode:
+                return other, old
+        return self._removed(edit, bit, at), old
+
+    def _replaced(self, edit, at, entry):
+        if edit is not None and self.owner is edit:
+            self.entries[at] = entry
+            return self
+        entries = self.entries.copy()
+        entries[at] = entry
+        return _TrieNode(self.bitmap, entries, edit)
+
+    def _inserted(self, edit, bit, at, entry):
+        if edit is not None and self.owner is edit:
+            self.bitmap |= bit
+            self.entries.insert(at, entry)
+            return self
+        entries = self.entries.copy()
+        entries.insert(at, entry)
+        return _TrieNode(self.bitmap | bit, entries, edit)
+
+    def _removed(self, edit, bit, at):
+        if edit is not None and self.owner is edit:
+            self.bitmap &= ~bit
+            del self.entries[at]
+            return self
+        entries = self.entries.copy()
+        del entries[at]
+        return _TrieNode(self.bitmap & ~bit, entries, edit)
+
+_TrieNode.EMPTY = _TrieNode(0, [], None)
+
+class _CollisionNode:
+    """
+    Node of a `PersistentMap` trie that lists leaves of keys
+    with identical hashes.
+    """
+
+    __slots__ = ('hash', 'leaves', 'owner')
+
+    def __init__(self, hash_, leaves, owner):
+        self.hash = hash_
+        self.leaves = leaves
+        self.owner = owner
+
+    def _index(self, key):
+        for at, leaf in enumerate(self.leaves):
+            if leaf[1] is key or leaf[1] == key:
+                return at
+        return None
+
+    def find(self, hash_, key):
+        at = None if hash_ != self.hash else self._index(key)
+        if at is None:
+            raise KeyError(key)
+        return self.leaves[at][2]
+
+    def assoc(self, shift, leaf, edit):
+        if leaf[0] != self.hash:
+            return _TrieNode.pair(shift, self, leaf, edit), None
+        at = self._index(leaf[1])
+        old = None if at is None else self.leaves[at]
+        if old is not None and old[2] is leaf[2]:
+            return self, old
+        leaves = self.leaves if edit is not None and self.owner is edit \
+            else self.leaves.copy()
+        if old is None:
+            leaves.append(leaf)
+        else:
+            leaves[at] = (old[0], old[1], leaf[2])
+        if leaves is self.leaves:
+            return self, old
+        return _CollisionNode(self.hash, leaves, edit), old
+
+    def without(self, shift, hash_, key, edit):
+        at = None if hash_ != self.hash else self._index(key)
+        if at is None:
+            raise KeyError(key)
+        if 2 == len(self.leaves):
+            return self.leaves[1 - at], self.leaves[at]
+        leaves = self.leaves.copy()
+        del leaves[at]
+        return _CollisionNode(self.hash, leaves, edit), self.leaves[at]
+
+class SharedMap(IReversibleMap):
+    """
+    Read-only mapping stored in a block of shared memory.
+    
+    A mapping that processes can share without copying. The `export`
+    method stores the items of a mapping in a named
+    `multiprocessing.shared_memory.SharedMemory` block, along with
+    open-addressing hash tables that locate them by their keys and,
+    if the mapping is reversible, by their values. Other processes
+    then attach to the block by its name, and look up items in it
+    in constant time, reading only the items they look up. Instances
+    of this class are pickled as the block's name, so that passing
+    them to the workers of a process pool attaches the workers to
+    the same block.
+    
+    Keys and values are stored pickled, so they must be picklable.
+    Keys are located by hashes of their canonical encodings, which
+    are the same in all processes, and matched by equality, so that
+    e.g. ``1``, ``1.0`` and ``True`` are the same key, as they are
+    in a `dict`. Such encodings exist for ``None``, numbers, strings,
+    bytes, and tuples and frozensets of these objects, and `export`
+    rejects keys of other types. Values of reversible mappings are
+    keys of their reverse mappings, and must be of the same types.
+    
+    Parameters
+    --------------------
+    name : str
+        Name of a shared memory block created by `export`.
+    reverse : bool, optional
+        Whether to return the reverse of the mapping stored in
+        the block. The default is ``False``.
+
+    Attributes
+    -----------------
+    name : str
+        Name of the shared memory block with this mapping.
+
+    Methods
+    ---------------
+    export(mapping, name, reversible)
+        Store a mapping in a new block of shared memory.
+    reverse()
+        Reverse this mapping to map values to keys, if it has been
+        exported as reversible.
+    close()
+        Detach this mapping and its reverse from the block.
+    unlink()
+        Request the block to be destroyed.
+
+    Raises
+    ----------
+    ValueError
+        If the shared memory block has not been created by `export`.
+    NotImplementedError
+        If shared memory is not supported by this version of Python.
+
+    Examples
+    ----------------
+    >>> shared = SharedMap.export(OneToOneMap({'ace': 1, 'deuce': 2}))
+    >>> worker = SharedMap(shared.name)
+    >>> len(worker), worker['deuce'], worker.reverse()[1], 'king' in worker
+    (2, 2, 'ace', False)
+    >>> import pickle
+    >>> pickle.loads(pickle.dumps(worker.reverse())) == {1: 'ace', 2: 'deuce'}
+    True
+    >>> worker.close(); shared.unlink()
+    >>> shared = SharedMap.export({1: 'one', frozenset('ab'): 'ab', (0.0, None): 'origin'})
+    >>> shared[True], shared[frozenset('ba')], shared[(-0.0, None)], [] in shared
+    ('one', 'ab', 'origin', False)
+    >>> shared.unlink()
+    >>> SharedMap.export({object(): 1})
+    Traceback (most recent call last):
+    ...
+    TypeError: object keys have no stable encoding and cannot be shared
+    """
+
+    _MAGIC = int.from_bytes(b'EPyCShm1', 'little')
+    _PROTOCOL = 4
+    _INDEX = 4
+    _HEADER = struct.Struct('=4Q')
+    _PAIR = struct.Struct('=2Q')
+    _exported = set()
+
+    def __init__(self, name, reverse = False, _peer = None):
+        if _peer is None:
+            if shared_memory is None:
+                raise NotImplementedError('shared memory requires Python 3.8 or newer')
+            self._attach(SharedMap._open(name))
+            self._peer = None if self._reverseTable is None \
+                else SharedMap(name, _peer=self)
+            if reverse:
+                try:
+                    peer = self.reverse()
+                except BaseException:
+                    self.close()
+                    raise
+                self._flip()
+                peer._flip()
+        else: # _peer is not None:
+            self._peer = _peer
+            self._block = _peer._block
+            self._count = _peer._count
+            self._capacity = _peer._capacity
+            self._side = 1 - _peer._side
+            self._table, self._data = _peer._reverseTable, _peer._data
+            self._reverseTable = _peer._table
+
+    @staticmethod
+    def _open(name):
+        try:
+            return shared_memory.SharedMemory(name, track = False)
+        except TypeError:
+            pass
+        block = shared_memory.SharedMemory(name)
+        if block.name not in SharedMap._exported:
+            # only the process that created the block should destroy it,
+            # child processes share the resource tracker of their parent
+            try:
+                from multiprocessing import parent_process, resource_tracker
+                if parent_process() is None:
+                    resource_tracker.unregister(block._name, 'shared_memory')
+            except (ImportError, AttributeError):
+                pass
+        return block
+
+    def _attach(self, block):
+        if len(block.buf) < SharedMap._HEADER.size or \
+                SharedMap._MAGIC != SharedMap._HEADER.unpack_from(block.buf)[0]:
+            block.close()
+            raise ValueError('block %r does not contain a shared map' % (block.name,))
+        magic, count, capacity, reversible = SharedMap._HEADER.unpack_from(block.buf)
+        self._block = block
+        self._count = count
+        self._capacity = capacity
+        self._side = 0
+        self._table = SharedMap._INDEX + 2 * count + 1
+        self._reverseTable = self._table + 2 * capacity if reversible else None
+        self._data = 8 * (self._table + 2 * capacity * (2 if reversible else 1))
+
+    def _flip(self):
+        self._side = 1 - self._side
+        self._table, self._reverseTable = self._reverseTable, self._table
+
+    @staticmethod
+    def _pickle(obj):
+        return pickle.dumps(obj, SharedMap._PROTOCOL)
+
+    @staticmethod
+    def _canonical(obj):
+        """
+        Encode a key so that equal keys have equal encodings
+        in all processes.
+        """
+        if obj is None:
+            return b'N'
+        elif isinstance(obj, numbers.Number):
+            # hashes of numbers are not randomized, and equal numbers
+            # of different types have equal hashes
+            return b'n' + hash(obj).to_bytes(8, 'little', signed = True)
+        elif isinstance(obj, str):
+            return b's' + obj.encode('utf-8', 'surrogatepass')
+        elif isinstance(obj, bytes):
+            return b'b' + obj
+        elif isinstance(obj, (tuple, frozenset)):
+            parts = [ SharedMap._canonical(item) for item in obj ]
+            if isinstance(obj, frozenset):
+                # iteration order of sets differs between processes
+                parts.sort()
+            return (b't' if isinstance(obj, tuple) else b'f') + b''.join(
+                len(part).to_bytes(8, 'little') + part for part in parts)
+        raise TypeError('%s keys have no stable encoding and cannot be shared'
+            % type(obj).__name__)
+
+    @staticmethod
+    def _digest(obj):
+        return int.from_bytes(hashlib.blake2b(
+            SharedMap._canonical(obj), digest_size = 8).digest(), 'little')
+
+    @classmethod
+    def export(cls, mapping, name = None, reversible = None):
+        """
+        Store a mapping in a new block of shared memory.
+        
+        The calling process owns the new block, and should `unlink`
+        it once other processes no longer need to attach to it.
+    
+        Parameters
+        ----------
+        mapping : collections.Mapping
+            The mapping to store, such as a `OneToOneMap` or an
+            `ImmutableMap`.
+        name : str, optional
+            Name of the new block. By default, a unique name is
+            generated.
+        reversible : bool, optional
+            Whether to store a hash table of values that supports the
+            `reverse` method. Defaults to ``True`` if `mapping` is
+            an `IReversibleMap` and ``False`` otherwise.
+    
+        Returns
+        -------
+        SharedMap
+            The stored mapping attached to the new block.
+
+        Raises
+        ------
+        TypeError
+            If a key, or a value of a reversible mapping, is not of
+            a type that can be shared, see `SharedMap`.
+        ValueError
+            If `reversible` is set and the mapping maps a value to more
+            than one key.
+        """
+    
+        if shared_memory is None:
+            raise NotImplementedError('shared memory requires Python 3.8 or newer')
+        if reversible is None:
+            reversible = isinstance(mapping, IReversibleMap)
+        items = list(mapping.items())
+        hashes = [ tuple(map(cls._digest, item[:2 if reversible else 1])) for item in items ]
+        items = [ (cls._pickle(k), cls._pickle(v)) for k, v in items ]
+        count = len(items)
+        capacity = 8
+        while capacity < 2 * count:
+            capacity <<= 1
+        table = cls._INDEX + 2 * count + 1
+        data = 8 * (table + 2 * capacity * (2 if reversible else 1))
+        size = sum(len(k) + len(v) for k, v in items)
+        block = shared_memory.SharedMemory(name, True, data + size)
+        words = block.buf[:data].cast('Q')
+        try:
+            words[1], words[2], words[3] = count, capacity, int(reversible)
+            tables = (table, table + 2 * capacity) if reversible else (table,)
+            at = cls._INDEX
+            offset = 0
+            for i, item in enumerate(items):
+                for side, raw in enumerate(item):
+                    words[at] = offset
+                    at += 1
+                    block.buf[data + offset : data + offset + len(raw)] = raw
+                    offset += len(raw)
+                    if side < len(tables):
+                        cls._insert(words, tables[side], capacity, hashes[i][side],
+                            raw, i, side, block.buf, data)
+            words[at] = offset
+            words[0] = cls._MAGIC
+        except BaseException:
+            words.release()
+            block.close()
+            block.unlink()
+            raise
+        words.release()
+        cls._exported.add(block.name)
+        shared = cls.__new__(cls)
+        shared._attach(block)
+        shared._peer = cls(block.name, _peer=shared) if reversible else None
+        return shared
+
+    @classmethod
+    def _insert(cls, words, table, capacity, hash_, raw, index, side, buf, data):
+        """
+        Add the key or value of an item with specified hash and pickled
+        representation to a hash table during export.
+        """
+        mask = capacity - 1
+        slot = hash_ & mask
+        while words[table + 2 * slot + 1]:
+            if words[table + 2 * slot] == hash_:
+                at = cls._INDEX + 2 * (words[table + 2 * slot + 1] - 1) + side
+                obj = pickle.loads(raw)
+                if pickle.loads(buf[data + words[at] : data + words[at + 1]]) == obj:
+                    raise ValueError(
+                        obj,
+                        'Value is mapped to more than one key, cannot export the mapping as reversible'
+                    )
+            slot = (slot + 1) & mask
+        words[table + 2 * slot] = hash_
+        words[table + 2 * slot + 1] = index + 1
+
+    @property
+    def name(self):
+        return self._block.name
+
+    def reverse(self):
+        """
+        Reverse this mapping to map values to keys, if it has been
+        exported as reversible.
+    
+        Returns
+        -------
+        SharedMap
+            A mapping of this object's values to its keys that shares
+            the block with this object. Its reverse version is this object.
+
+        Raises
+        ------
+        TypeError
+            If this mapping has been exported without a reverse mapping.
+        """
+    
+        if self._peer is None:
+            raise TypeError('shared map %r has been exported without a reverse mapping' % (self.name,))
+        return self._peer
+
+    def close(self):
+        """
+        Detach this mapping and its reverse from the block.
+        
+        Neither of them can be used after they have been closed.
+        The block itself remains available to other processes.
+        """
+    
+        self._block.close()
+
+    def unlink(self):
+        """
+        Request the block to be destroyed once all processes detach
+        from it.
+        """
+    
+        self._block.unlink()
+
+    def __reduce__(self):
+        return SharedMap, (self.name, 1 == self._side)
+
+    def __str__(self):
+        return '{' + ', '.join('%r: %r' % item for item in self.items()) + '}'
+
+    def __repr__(self):
+        return 'SharedMap(%r)' % (self.name,)
+
+    def __len__(self):
+        return self._count
+
+    def _bounds(self, index, side):
+        start, end = SharedMap._PAIR.unpack_from(self._block.buf,
+            8 * (SharedMap._INDEX + 2 * index + side))
+        return self._data + start, self._data + end
+
+    def __getitem__(self, key):
+        try:
+            hash_ = SharedMap._digest(key)
+        except TypeError:
+            raise KeyError(key) from None
+        table, buf, unpack = self._table, self._block.buf, SharedMap._PAIR.unpack_from
+        mask = self._capacity - 1
+        slot = hash_ & mask
+        while True:
+            slotHash, index = unpack(buf, 8 * (table + 2 * slot))
+            if not index:
+                raise KeyError(key)
+            elif slotHash == hash_:
+                start, end = self._bounds(index - 1, self._side)
+                if pickle.loads(buf[start:end]) == key:
+                    start, end = self._bounds(index - 1, 1 - self._side)
+                    return pickle.loads(buf[start:end])
+            slot = (slot + 1) & mask
+
+    def __iter__(self):
+        buf = self._block.buf
+        for index in range(len(self)):
+            start, end = self._bounds(index, self._side)
+            yield pickle.loads(buf[start:end])
+
+    def items(self):
+        return SharedMap.ItemsView(self)
+
+    class ItemsView(collections.ItemsView):
+
+        def __iter__(self):
+            mapping = self._mapping
+            buf = mapping._block.buf
+            for index in range(len(mapping)):
+                start, end = mapping._bounds(index, mapping._side)
+                key = pickle.loads(buf[start:end])
+                start, end = mapping._bounds(index, 1 - mapping._side)
+                yield key, pickle.loads(buf[start:end])
+
+class SortedListMap(collections.MutableMapping):
+    """
+    A dictionary that keeps its keys sorted and answers range queries.
+    
+    A `collections.MutableMapping` that returns its keys in the
+    ascending sort order when iterated. The sort order can be defined
+    using a key function, as with `sets.SortedListSet`. Keys are stored
+    in a sorted list that is searched in logarithmic time, with
+    values in a parallel list, so each key is stored once. Keys must be
+    comparable with each other, but don't have to be hashable. Adding
+    or deleting keys at random has linear complexity, as it does
+    in `sets.SortedListSet`.
+    
+    Parameters
+    --------------------
+    mapping : collections.Mapping or iterable, optional
+        A map or dictionary with initial mappings for this container,
+        or a collection of name-value tuples representing such
+        mappings. With no arguments, creates an empty container.
+    key : object, optional
+        A callable object used to extract a comparison key from each
+        key of this mapping, see `sets.SortedListSet`. Keys with equal
+        comparison keys are treated as the same key, and the key most
+        recently stored replaces the other.
+    cacheKeys : bool, optional
+        Store the comparison key of each key of this mapping, see
+        `sets.SortedListSet`.
+
+    Methods
+    ---------------
+    irange(from, to, reverse)
+        Return an iterator over keys within a range limited by
+        argument values.
+    floorKey(key)
+        Return the greatest key of this mapping less than or equal to
+        the argument.
+    ceilingKey(key)
+        Return the least key of this mapping greater than or equal to
+        the argument.
+    peekItem(index)
+        Return the key-value tuple at specified position in the sort order.
+    popitem(last)
+        Remove and return the first or last key-value tuple in the
+        sort order.
+
+    Raises
+    ----------
+    TypeError
+        If the key argument is not callable.
+
+    See Also
+    --------------
+    sets.SortedListSet : The set that keeps keys of this mapping.
+
+    Examples
+    ----------------
+    >>> m = SortedListMap({'b': 2, 'D': 4, 'a': 1}, key=str.lower)
+    >>> m
+    SortedListMap({'a': 1, 'b': 2, 'D': 4})
+    >>> m['c'] = 3
+    >>> m['d'] = 5
+    >>> m['d'], 'D' in m, len(m)
+    (5, False, 4)
+    >>> list(m.irange('b', 'd')), list(m.irange('b', reverse=True))
+    (['b', 'c'], ['d', 'c', 'b'])
+    >>> m.floorKey('bb'), m.ceilingKey('bb')
+    ('b', 'c')
+    >>> m.peekItem(), m.peekItem(1)
+    (('d', 5), ('b', 2))
+    >>> m.popitem(last=False), m.popitem()
+    (('a', 1), ('d', 5))
+    >>> del m['b']
+    >>> list(m.items()), list(m.values())
+    ([('c', 3)], [3])
+    >>> m.floorKey('B')
+    Traceback (most recent call last):
+    ...
+    KeyError: 'B'
+    """
+
+    def __init__(self, mapping = None, key = None, cacheKeys = False):
+        self._sortKey = key
+        self._cacheKeys = cacheKeys
+        self._keySet = sets.SortedListSet(None, key, cacheKeys)
+        self._values = []
+        if mapping is None:
+            return
+        elif isinstance(mapping, collections.Mapping):
+            items = mapping.items()
+        else:
+            items = mapping
+        self._load(items)
+
+    def __str__(self):
+        return '{' + ', '.join([ '%r: %r' % item for item in self.items() ]) + '}'
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, self)
+
+    def __len__(self):
+        return len(self._keySet)
+
+    def __getitem__(self, key):
+        at = self._locate(key)
+        if at is None:
+            raise KeyError(key)
+        return self._values[at]
+
+    def __setitem__(self, key, value):
+        self._put(key, value)
+
+    def __delitem__(self, key):
+        at = self._locate(key)
+        if at is None:
+            raise KeyError(key)
+        self._removeAt(at)
+
+    def __iter__(self):
+        return iter(self._keySet)
+
+    def __reversed__(self):
+        return reversed(self._keySet)
+
+    def __contains__(self, item):
+        return item in self._keySet
+
+    def items(self):
+        return self.ItemsView(self)
+
+    def values(self):
+        return self.ValuesView(self)
+
+    def irange(self, from_ = None, to_ = None, reverse = False):
+        """
+        Return an iterator over keys within a range limited by
+        argument values.
+        
+        Parameters
+        ----------
+        from_ : object, optional
+            A key that begins or precedes requested range, see
+            `sets.SortedListSet.iter`.
+        to_ : object, optional
+            A key that follows requested range, see
+            `sets.SortedListSet.iter`.
+        reverse : bool, optional
+            Whether to return the keys in descending order.
+    
+        Returns
+        -------
+        sets.SortedListSet.Iterator
+            Iterator over keys within the range valid until the next
+            change to the keys of this mapping.
+        """
+    
+        return self._keySet.iter(from_, to_, reverse)
+
+    def floorKey(self, key):
+        """
+        Return the greatest key of this mapping less than or equal to
+        the argument.
+        
+        Raises
+        ------
+        KeyError
+            If all keys of this mapping are greater than the argument.
+        """
+    
+        at = self._keySet.bisectRight(key)
+        if 0 == at:
+            raise KeyError(key)
+        return self._keySet[at - 1]
+
+    def ceilingKey(self, key):
+        """
+        Return the least key of this mapping greater than or equal to
+        the argument.
+        
+        Raises
+        ------
+        KeyError
+            If all keys of this mapping are less than the argument.
+        """
+    
+        at = self._keySet.bisectLeft(key)
+        if len(self._keySet) <= at:
+            raise KeyError(key)
+        return self._keySet[at]
+
+    def peekItem(self, index = -1):
+        """
+        Return the key-value tuple at specified position in the sort order.
+        
+        Parameters
+        ----------
+        index : int, optional
+            Position of the item, negative values count from the end.
+            Defaults to the last item.
+    
+        Raises
+        ------
+        IndexError
+            If there is no item at specified position.
+        """
+    
+        return self._keySet[index], self._values[index]
+
+    def popitem(self, last = True):
+        """
+        Remove and return the first or last key-value tuple in the
+        sort order.
+        
+        Parameters
+        ----------
+        last : bool, optional
+            Whether to remove the last item rather than the first.
+            Defaults to ``True``.
+    
+        Raises
+        ------
+        KeyError
+            If this mapping is empty.
+        """
+    
+        if not self._keySet:
+            raise KeyError('popitem(): mapping is empty')
+        at = len(self._keySet) - 1 if last else 0
+        item = self._keySet[at], self._values[at]
+        self._removeAt(at)
+        return item
+
+    def _load(self, items):
+        """
+        Replace contents of this mapping with keys and values from
+        a collection of name-value tuples.
+        """
+        items = list(items)
+        key = self._sortKey
+        keys = [ k for k, v in items ] if key is None else [ key(k) for k, v in items ]
+        if not all(map(operator.le, keys, itertools.islice(keys, 1, None))):
+            order = sorted(range(len(keys)), key = keys.__getitem__)
+            items = [ items[i] for i in order ]
+            keys = [ keys[i] for i in order ]
+        unique = list(map(operator.ne, keys, itertools.islice(keys, 1, None)))
+        unique.append(True)
+        items = list(itertools.compress(items, unique))
+        self._keySet = sets.SortedListSet.fromSorted(
+            [ k for k, v in items ], key, self._cacheKeys, False
+        )
+        self._values = [ v for k, v in items ]
+
+    def _locate(self, key):
+        """
+        Return the position of a key in the sort order, or ``None``
+        if the key is missing.
+        """
+        keySet = self._keySet
+        at = keySet.bisectLeft(key)
+        return at if len(keySet) > at and keySet[at] == key else None
+
+    def _put(self, key, value):
+        """
+        Add a key to this mapping, or replace an existing key with equal
+        comparison key, and store its value.
+        """
+        keySet = self._keySet
+        at = keySet.bisectLeft(key)
+        size = len(keySet)
+        keySet.add(key)
+        if len(keySet) > size:
+            self._values.insert(at, value)
+        else:
+            self._values[at] = value
+
+    def _removeAt(self, at):
+        """
+        Remove a key at specified position along with its value.
+        """
+        keySet = self._keySet
+        keySet.discard(keySet[at])
+        del self._values[at]
+
+    class ItemsView(collections.ItemsView):
+    
+        def __contains__(self, item):
+            key, value = item
+            at = self._mapping._locate(key)
+            return at is not None and self._mapping._values[at] == value
+
+        def __iter__(self):
+            values = self._mapping._values
+            for at, key in enumerate(self._mapping._keySet):
+                yield key, values[at]
+
+    class ValuesView(collections.ValuesView):
+    
+        def __iter__(self):
+            values = self._mapping._values
+            for at, key in enumerate(self._mapping._keySet):
+                yield values[at]
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
@@ -27,6 +27,21 @@
     ------------
     SortedListSet : Implementation of `collections.Set` backed by
     a sorted list.
+    SortedChunkedSet : Implementation of `collections.Set` backed by
+    a list of bounded-size sorted chunks.
+    ConcurrentSortedListSet : Variant of `SortedListSet` that can be
+    shared between threads.
+    SortedArraySet : Implementation of `collections.Set` for numbers
+    backed by a sorted array.
+    PersistentSortedSet : Immutable sorted set that makes modified
+    versions of itself cheaply.
+    MappedSortedSet : Read-only sorted set stored in a file that is
+    mapped to memory.
+    IndexedCollection : Set of elements that maintains several sort
+    orders and hash tables over them at once.
+    IntervalSet : Set of points stored as disjoint half-open ranges.
+    mergeSorted : Merge sorted iterables into a single sorted stream
+    of elements with unique keys.
 
 """
 
@@ -34,8 +49,29 @@ import version
 
 version.requirePythonVersion(3)
 
+import array
+import bisect
 import collections
+import concurrent.futures
+import heapq
+import itertools
+import locks
 import math
+import mmap
+import numbers
+import operator
+import os
+import struct
+import sys
+import types
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# marks a key that has not been computed yet
+_UNKNOWN = object()
 
 class SortedListSet(collections.MutableSet):
     """
@@ -60,6 +96,13 @@ class SortedListSet(collections.MutableSet):
         element. The default value is None (compare the elements directly).
     iterable : Iterable, optional
         A collection to take initial elements of this set from.
+    cacheKeys : bool, optional
+        Store the comparison key of each element in a list parallel
+        to the list of elements. The key function is then called at
+        most once per element added to the set or looked up, and
+        lookups run the binary search in `bisect` over stored keys.
+        This trades memory for speed when the key function is
+        expensive, e.g. builds tuples. The default is ``False``.
 
     Attributes
     -----------------
@@ -71,8 +114,46 @@ class SortedListSet(collections.MutableSet):
 
     Methods
     ---------------
-    iter(from, to)
+    fromSorted(iterable, key, cacheKeys, verify)
+        Create a set from elements that come in their sort order.
+    buildParallel(iterable, key, cacheKeys, executor, partitions)
+        Create a set from a large collection of elements, sorting
+        its parts in parallel.
+    iter(from, to, reverse)
         Return an iterator over a subset limited by argument values.
+    update(iterable)
+        Add all elements of an iterable to this set at once.
+    index(x)
+        Return the position of an element in this set's sort order.
+    bisectLeft(x, isKey)
+        Return the position of an element or key in this set's sort order,
+        or the position of the first element that follows it.
+    bisectRight(x, isKey)
+        Return the position past an element or key in this set's
+        sort order.
+    countRange(from, to)
+        Return the number of elements within the range limited by
+        argument values.
+    containsMany(items)
+        Test a batch of values for membership in this set.
+
+    Notes
+    -----
+    Set operations ``|``, ``&``, ``-``, ``^``, their in-place variants,
+    `isdisjoint` and comparisons between sets that have the same
+    key function merge the sorted lists of both operands in a single
+    pass. When one operand is much smaller than the other, elements
+    of the smaller operand are located in the larger one with
+    a galloping search. Operations that combine sets with different
+    key functions or other collections fall back to the generic
+    algorithms of `collections.Set`. Elements that have equal keys,
+    but are not equal, are considered distinct by these operations,
+    and the right operand's element prevails when both end up in
+    a result.
+
+    Elements of this set can be retrieved by their positions in the
+    sort order using the ``[]`` operator with an integer index or
+    a slice. Retrieving a slice returns a list of elements.
 
     Raises
     ----------
@@ -127,6 +208,25 @@ class SortedListSet(collections.MutableSet):
     True
     >>> s <= SortedListSet('abCdEfqrZ', str.lower)
     True
+    >>> s2 = SortedListSet('ABrACadEbra', key=str.lower, cacheKeys=True)
+    >>> s2
+    SortedListSet({'a', 'b', 'C', 'd', 'E', 'r'})
+    >>> s2.add('q'); s2.discard('C'); s2.discard('c')
+    >>> s2
+    SortedListSet({'a', 'b', 'd', 'E', 'q', 'r'})
+    >>> 'E' in s2, 'e' in s2
+    (True, False)
+    >>> s2 <= SortedListSet('abdEqrs', str.lower, True)
+    True
+    >>> s2 | SortedListSet('cEf', str.lower)
+    SortedListSet({'a', 'b', 'c', 'd', 'E', 'f', 'q', 'r'})
+    >>> s2 & SortedListSet('bcE', str.lower), s2 - SortedListSet('bcE', str.lower)
+    (SortedListSet({'b', 'E'}), SortedListSet({'a', 'd', 'q', 'r'}))
+    >>> s2 ^= SortedListSet('Abc', str.lower)
+    >>> s2
+    SortedListSet({'A', 'c', 'd', 'E', 'q', 'r'})
+    >>> s2.isdisjoint(SortedListSet('aBxy', str.lower))
+    True
     """
 
     def _readOnlyAttr(self, name, *value):
@@ -140,38 +240,263 @@ class SortedListSet(collections.MutableSet):
     __setattr__ = _readOnlyAttr
     __delattr__ = _readOnlyAttr
 
-    def __init__(self, iterable = None, key = None):
+    def __init__(self, iterable = None, key = None, cacheKeys = False):
         self.__dict__['_key'] = key if key is not None else (lambda x: x)
         if '__call__' not in dir(self._key):
             raise TypeError(
                 'key argument is of a non-callable %s'
                 % type(key)
             )
-        self.__dict__['_list'] = [ None ] * len(iterable) if isinstance(iterable, collections.Sized) else []
+        if iterable is None:
+            self._assign([], [] if cacheKeys else None)
+        else:
+            list_, keys = self._prepare(iterable)
+            self._assign(list_, keys if cacheKeys else None)
+        self.modCount = 0
+
+    def _prepare(self, iterable):
+        """
+        Return a tuple of a sorted list of unique elements from an
+        iterable and a list of their keys. Of the elements with equal
+        keys, the last one returned by the iterable is retained. Sorting
+        is skipped if the elements come in their sort order.
+        """
         if isinstance(iterable, collections.Sized):
+            list_ = [ None ] * len(iterable)
             i = 0
             for item in iterable:
-                self._list[i] = item
+                list_[i] = item
                 i += 1
-            if len(self._list) > i:
+            if len(list_) > i:
                 raise ValueError(
                     'argument collection reported incorrect size %d, actual element count was %d'
-                    % ( len(self._list), i )
+                    % ( len(list_), i )
                 )
-        elif iterable is not None:
-            for item in iterable:
-                self._list.append(item)
-        self._list.sort(key = self._key)
-        if self._list:
-            last = self._list[0]
-            i = 1
-            while i < len(self._list):
-                if self._key(last) == self._key(self._list[i]):
-                    i -= 1
-                    del self._list[i]
-                last = self._list[i]
-                i += 1
-        self.modCount = 0
+        else:
+            list_ = list(iterable)
+        return _sortUnique(list_, list(map(self._key, list_)))
+
+    @classmethod
+    def fromSorted(cls, iterable, key = None, cacheKeys = False, verify = True, **options):
+        """
+        Create a set from elements that come in their sort order.
+
+        Consumes an iterable, such as a database cursor or a stream
+        of records from a sorted file, in a single pass without copying
+        it into a list first or sorting it. Of the consecutive elements
+        with equal keys, the last one is retained.
+
+        Parameters
+        ----------
+        iterable : Iterable
+            Elements of the new set in the ascending order of their keys.
+        key : object, optional
+            The key function of the new set, as with the constructor.
+        cacheKeys : bool, optional
+            Whether the new set stores the keys of its elements, as
+            with the constructor.
+        verify : bool, optional
+            Check that the keys of elements come in the ascending order.
+            The default is ``True``. Passing ``False`` saves a key
+            comparison per element, but the set becomes inconsistent
+            if elements come out of order.
+        options : dict
+            Other arguments to the constructor of a subclass.
+
+        Returns
+        -------
+        SortedListSet
+            A new set of the class this method is called on.
+
+        Raises
+        ------
+        ValueError
+            If `verify` is set and an element's key is less than
+            the key of the element that precedes it.
+
+        Examples
+        --------
+        >>> SortedListSet.fromSorted(['a', 'b', 'B', 'c'], str.lower)
+        SortedListSet({'a', 'B', 'c'})
+        >>> SortedListSet.fromSorted(iter([1, 3, 2]))
+        Traceback (most recent call last):
+        ...
+        ValueError: element 2 is out of order after 3
+        >>> SortedChunkedSet.fromSorted(range(0, 10, 3), load = 2)
+        SortedChunkedSet({0, 3, 6, 9})
+        """
+
+        result = cls(None, key, cacheKeys, **options)
+        key = result._key
+        list_ = []
+        keys = [] if cacheKeys else None
+        last = None
+        for item in iterable:
+            itemKey = key(item)
+            if list_:
+                if itemKey == last:
+                    list_[-1] = item
+                    continue
+                elif verify and itemKey < last:
+                    raise ValueError('element %r is out of order after %r' % (item, list_[-1]))
+            list_.append(item)
+            if cacheKeys:
+                keys.append(itemKey)
+            last = itemKey
+        result._assign(list_, keys)
+        return result
+
+    @classmethod
+    def buildParallel(cls, iterable, key = None, cacheKeys = False,
+                      executor = None, partitions = None, **options):
+        """
+        Create a set from a large collection of elements, sorting its
+        parts in parallel.
+
+        Splits the elements into contiguous partitions and submits
+        them to an executor, which computes the keys of elements,
+        sorts them and drops elements with duplicate keys in each
+        partition. The sorted partitions are then merged into the new
+        set. The result is the same as that of the constructor called
+        with the same arguments: of the elements with equal keys,
+        the last one in the iterable is retained.
+
+        Parameters
+        ----------
+        iterable : Iterable
+            Elements of the new set.
+        key : object, optional
+            The key function of the new set, as with the constructor.
+            With the default executor, it must be a function that can
+            be pickled, such as a module-level function.
+        cacheKeys : bool, optional
+            Whether the new set stores the keys of its elements, as
+            with the constructor.
+        executor : concurrent.futures.Executor, optional
+            The executor to run partitions on. Use
+            a `concurrent.futures.ThreadPoolExecutor` if the key
+            function releases the global interpreter lock, or cannot
+            be pickled. By default, a new
+            `concurrent.futures.ProcessPoolExecutor` is started and
+            shut down before this method returns.
+        partitions : int, optional
+            The number of partitions. Defaults to the number of
+            processors.
+        options : dict
+            Other arguments to the constructor of a subclass.
+
+        Returns
+        -------
+        SortedListSet
+            A new set of the class this method is called on.
+
+        Raises
+        ------
+        ValueError
+            If the number of partitions is less than one.
+
+        Examples
+        --------
+        >>> import concurrent.futures
+        >>> words = 'the quick brown fox jumps over The Lazy dog'.split()
+        >>> with concurrent.futures.ThreadPoolExecutor(2) as pool:
+        ...     s = SortedListSet.buildParallel(words, str.lower, executor = pool, partitions = 3)
+        >>> s, s == SortedListSet(words, str.lower)
+        (SortedListSet({'brown', 'dog', 'fox', 'jumps', 'Lazy', 'over', 'quick', 'The'}), True)
+        >>> SortedListSet.buildParallel(words, partitions = 0)
+        Traceback (most recent call last):
+        ...
+        ValueError: number of partitions must be positive, got 0
+        """
+
+        if partitions is None:
+            partitions = os.cpu_count() or 1
+        elif 1 > partitions:
+            raise ValueError('number of partitions must be positive, got %r' % (partitions,))
+        result = cls(None, key, cacheKeys, **options)
+        if not isinstance(iterable, collections.Sequence):
+            iterable = list(iterable)
+        size = len(iterable)
+        bounds = [ size * i // partitions for i in range(partitions + 1) ]
+        parts = [ iterable[lower: upper] for lower, upper in zip(bounds, bounds[1:]) if lower < upper ]
+        if 1 >= len(parts):
+            list_, keys = result._prepare(iterable)
+        elif executor is None:
+            with concurrent.futures.ProcessPoolExecutor(len(parts)) as executor:
+                list_, keys = _mergePartitions(executor.map(_sortPartition, parts, itertools.repeat(key)), key)
+        else:
+            list_, keys = _mergePartitions(executor.map(_sortPartition, parts, itertools.repeat(key)), key)
+        if not cacheKeys:
+            keys = None
+        elif keys is None:
+            keys = list(list_)
+        result._assign(list_, keys)
+        return result
+
+    def update(self, iterable):
+        """
+        Add all elements of an iterable to this set at once.
+        
+        Sorts the elements of an iterable, or verifies that they are
+        already sorted, drops elements with duplicate keys and merges
+        the rest into this set in a single pass. Batches that are small
+        compared to this set are added element by element instead,
+        which is faster than merging them. Elements added replace
+        the existing elements with equal keys, and of the elements with
+        equal keys within the iterable, the last one is added. This set
+        is left unchanged if an error occurs. Using this method is the
+        same as applying the ``|=`` operator.
+    
+        Parameters
+        ----------
+        iterable : Iterable
+            A collection of elements to add to this set.
+    
+        Raises
+        ------
+        ValueError
+            If the iterable argument reports a size that differs from its
+            actual number of elements.
+        TypeError
+            If the keys of new elements are not comparable with each other
+            or with the keys of existing elements.
+    
+        Examples
+        --------
+        >>> s=SortedListSet(key=str.lower)
+        >>> s.update('DEBArcADEro')
+        >>> s
+        SortedListSet({'A', 'B', 'c', 'D', 'E', 'o', 'r'})
+        >>> s.update(iter('aFg'))
+        >>> s
+        SortedListSet({'a', 'B', 'c', 'D', 'E', 'F', 'g', 'o', 'r'})
+        """
+    
+        if self._compatible(iterable):
+            list_, keys = iterable._sortedLists()
+        else:
+            list_, keys = self._prepare(iterable)
+        if not list_:
+            return
+        if self._addsSeparately(len(list_)):
+            # locate all elements first, so that keys incomparable with
+            # the keys of this set's elements leave this set unchanged
+            for key in map(self._key, list_) if keys is None else keys:
+                self._find(key)
+            for item in list_:
+                self.add(item)
+            return
+        self._assignChanged(*self._merge(
+            self._sortedLists(), ( list_, keys ),
+            True, True, True
+        ))
+
+    def _addsSeparately(self, count):
+        """
+        Tell whether adding a batch of elements of specified size to
+        this set one by one is faster than merging the batch into it.
+        """
+        return 16 > count
 
     def __str__(self):
         return '{' + ', '.join([ repr(e) for e in self ]) + '}' if self else '()'
@@ -184,12 +509,39 @@ class SortedListSet(collections.MutableSet):
         Return the position of specified element in the underlying list,
         or the position it should be inserted at to maintain the list's order.
         """
+        return self._find(self._key(x), from_, to_)
+
+    def _find(self, key, from_ = 0, to_ = None):
+        """
+        Return the position of an element with specified key in the
+        underlying list, or the position it should be inserted at to
+        maintain the list's order.
+        """
+        if self._keys is None:
+            return self._bisect(self._list, key, from_, to_)
+        elif to_ is None:
+            return bisect.bisect_left(self._keys, key, from_)
+        else:
+            return bisect.bisect_left(self._keys, key, from_, to_)
+
+    def _keyAt(self, at):
+        """
+        Return the key of an element at specified position in the
+        underlying list.
+        """
+        return self._key(self._list[at]) if self._keys is None else self._keys[at]
+
+    def _bisect(self, list_, key, from_ = 0, to_ = None):
+        """
+        Return the position of an element with specified key in a sorted
+        list, or the position it should be inserted at to maintain the
+        list's order.
+        """
         if to_ is None:
-            to_ = len(self._list)
-        key = self._key(x)
+            to_ = len(list_)
         while from_ < to_:
             at = (from_ + to_) >> 1
-            pivot = self._key(self._list[at])
+            pivot = self._key(list_[at])
             if pivot == key:
                 from_ = at
                 break
@@ -199,15 +551,283 @@ class SortedListSet(collections.MutableSet):
                 from_ = at + 1
         return from_
 
+    def _gallop(self, list_, keys, key, from_ = 0):
+        """
+        Return the position of an element with specified key in a sorted
+        list, or the position it should be inserted at to maintain the
+        list's order, probing the list at exponentially growing distances
+        from a starting position before running a binary search. Pass
+        a list of keys of the list's elements, if available, to avoid
+        calling the key function.
+        """
+        size = len(list_)
+        to_ = from_
+        step = 1
+        while to_ < size:
+            pivot = self._key(list_[to_]) if keys is None else keys[to_]
+            if pivot == key:
+                return to_
+            elif pivot > key:
+                break
+            from_ = to_ + 1
+            to_ += step
+            step <<= 1
+        if to_ > size:
+            to_ = size
+        if keys is None:
+            return self._bisect(list_, key, from_, to_)
+        else:
+            return bisect.bisect_left(keys, key, from_, to_)
+
+    def _values(self):
+        """
+        Return an iterable over all elements of this set in their
+        sort order.
+        """
+        return self._list
+
+    def _sortedLists(self):
+        """
+        Return a tuple of a list of elements of this set in their sort
+        order and a list of their keys, or ``None`` in place of the
+        latter if this set does not store the keys of its elements.
+        Subclasses may return other sequences that support indexing
+        and slicing instead of lists, see `_listed`. Callers must not
+        modify returned sequences.
+        """
+        return self._list, self._keys
+
+    @staticmethod
+    def _listed(list_, keys, probes):
+        """
+        Return a tuple of sequences returned by `_sortedLists` as lists,
+        unless they are lists already or the specified number of searches
+        would read only a small part of them.
+        """
+        if isinstance(list_, list) or probes * 64 <= len(list_):
+            return list_, keys
+        return list(list_), None if keys is None else list(keys)
+
+    def _assignChanged(self, list_, keys):
+        """
+        Replace contents of this set with the results of `_merge` and
+        update `modCount`, unless the results are the same elements
+        that this set contains.
+        """
+        if len(list_) == len(self) and all(map(operator.is_, list_, self._values())):
+            return
+        self.modCount += 1
+        self._assign(list_, keys)
+
+    def _assign(self, list_, keys):
+        """
+        Replace contents of this set with a sorted list of unique elements
+        and a list of their keys, which must be ``None`` if and only if
+        this set does not store the keys of its elements. This method
+        does not update `modCount`.
+        """
+        self.__dict__['_list'] = list_
+        self._keys = keys
+
+    def _new(self, iterable = None):
+        """
+        Create a set of this set's type and configuration, including
+        the key function, with elements from an iterable.
+        """
+        return type(self)(iterable, self._key, self._keys is not None)
+
+    def _from_iterable(self, iterable):
+        return self._new(iterable)
+
+    def _compatible(self, other):
+        """
+        Tell whether this set can be merged with another object
+        element-by-element, i.e. the other object is a `SortedListSet`
+        with the same key function.
+        """
+        return isinstance(other, SortedListSet) and self._key == other._key
+
+    def _combine(self, other, keepMine, keepOthers, keepCommon):
+        """
+        Merge elements of this set with elements of a compatible set
+        as `_merge` does.
+        """
+        return self._merge(
+            self._sortedLists(), other._sortedLists(),
+            keepMine, keepOthers, keepCommon
+        )
+
+    def _merge(self, mine, others, keepMine, keepOthers, keepCommon):
+        """
+        Merge elements of this set with sorted unique elements of
+        a compatible collection.
+        
+        Parameters
+        ----------
+        mine : tuple
+            A list of elements of this set and a list of their keys,
+            or ``None`` instead of the latter, as returned by `_sortedLists`.
+        others : tuple
+            A list of other elements and their keys in the same format.
+        keepMine : bool
+            Whether to keep elements of this set missing from the others.
+        keepOthers : bool
+            Whether to keep other elements missing from this set.
+        keepCommon : bool
+            Whether to keep elements present in both collections.
+    
+        Returns
+        -------
+        tuple
+            A list of resulting elements in their sort order and a list
+            of their keys, or ``None`` in place of the latter if this set
+            does not store the keys of its elements.
+        """
+        items, keys = mine
+        otherItems, otherKeys = others
+        cache = keys is not None
+        if len(items) > len(otherItems):
+            small, smallKeys, large, largeKeys = otherItems, otherKeys, items, keys
+            keepSmall, keepLarge = keepOthers, keepMine
+            smallWins, largeWins = keepOthers, keepMine and not keepOthers
+        else:
+            small, smallKeys, large, largeKeys = items, keys, otherItems, otherKeys
+            keepSmall, keepLarge = keepMine, keepOthers
+            smallWins, largeWins = keepMine and not keepOthers, keepOthers
+        large, largeKeys = self._listed(large, largeKeys, len(small))
+        if smallKeys is None:
+            smallKeys = [ self._key(item) for item in small ]
+        result = []
+        resultKeys = [] if cache else None
+        size = len(large)
+        at = 0
+        for key, item in zip(smallKeys, small):
+            pos = self._gallop(large, largeKeys, key, at)
+            if keepLarge and pos > at:
+                result.extend(large[at: pos])
+                if cache:
+                    resultKeys.extend(
+                        map(self._key, large[at: pos]) if largeKeys is None
+                        else largeKeys[at: pos]
+                    )
+            if size > pos and key == (self._key(large[pos]) if largeKeys is None else largeKeys[pos]):
+                match = large[pos]
+                at = pos + 1
+                if item == match:
+                    if not keepCommon:
+                        continue
+                elif smallWins:
+                    match = item
+                elif not largeWins:
+                    continue
+                result.append(match)
+                if cache:
+                    resultKeys.append(key)
+            else:
+                at = pos
+                if keepSmall:
+                    result.append(item)
+                    if cache:
+                        resultKeys.append(key)
+        if keepLarge and size > at:
+            result.extend(large[at:])
+            if cache:
+                resultKeys.extend(
+                    map(self._key, large[at:]) if largeKeys is None
+                    else largeKeys[at:]
+                )
+        return result, resultKeys
+
+    def _fromSorted(self, list_, keys):
+        """
+        Create a set of this set's type and configuration from
+        the results of `_combine`.
+        """
+        result = self._new()
+        result._assign(list_, keys)
+        return result
+
+    def __or__(self, other):
+        if not self._compatible(other):
+            return collections.MutableSet.__or__(self, other)
+        return self._fromSorted(*self._combine(other, True, True, True))
+
+    def __and__(self, other):
+        if not self._compatible(other):
+            return collections.MutableSet.__and__(self, other)
+        return self._fromSorted(*self._combine(other, False, False, True))
+
+    def __sub__(self, other):
+        if not self._compatible(other):
+            return collections.MutableSet.__sub__(self, other)
+        return self._fromSorted(*self._combine(other, True, False, False))
+
+    def __xor__(self, other):
+        if not self._compatible(other):
+            return collections.MutableSet.__xor__(self, other)
+        return self._fromSorted(*self._combine(other, True, True, False))
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __iand__(self, other):
+        if not self._compatible(other):
+            return collections.MutableSet.__iand__(self, other)
+        self._assignChanged(*self._combine(other, False, False, True))
+        return self
+
+    def __isub__(self, other):
+        if not self._compatible(other):
+            return collections.MutableSet.__isub__(self, other)
+        self._assignChanged(*self._combine(other, True, False, False))
+        return self
+
+    def __ixor__(self, other):
+        if not self._compatible(other):
+            return collections.MutableSet.__ixor__(self, other)
+        self._assignChanged(*self._combine(other, True, True, False))
+        return self
+
+    def isdisjoint(self, other):
+        if not self._compatible(other):
+            return collections.MutableSet.isdisjoint(self, other)
+        small, large = self._sortedLists(), other._sortedLists()
+        if len(small[0]) > len(large[0]):
+            small, large = large, small
+        small, smallKeys = small
+        large, largeKeys = self._listed(*large, probes = len(small))
+        size = len(large)
+        at = 0
+        for key, item in zip(map(self._key, small) if smallKeys is None else smallKeys, small):
+            at = self._gallop(large, largeKeys, key, at)
+            if at >= size:
+                break
+            elif large[at] == item:
+                return False
+        return True
+
+    def _keyed(self):
+        """
+        Return an iterable over tuples of stored keys and elements of
+        this set in their sort order, or ``None`` if this set does not
+        store the keys of its elements.
+        """
+        return None if self._keys is None else zip(self._keys, self._list)
+
     def __contains__(self, x):
         at = self._pos(x)
         return len(self._list) > at and self._list[at] == x
 
     def add(self, value):
-        at = self._pos(value)
+        key = self._key(value)
+        at = self._find(key)
         if len(self._list) <= at:
+            self.modCount += 1
             self._list.append(value)
-        elif self._key(value) == self._key(self._list[at]):
+            if self._keys is not None:
+                self._keys.append(key)
+        elif key == self._keyAt(at):
             if self._list[at] == value:
                 return # set is not modified
             self.modCount += 1
@@ -215,53 +835,76 @@ class SortedListSet(collections.MutableSet):
         else:
             self.modCount += 1
             self._list.insert(at, value)
+            if self._keys is not None:
+                self._keys.insert(at, key)
 
     def discard(self, value):
         at = self._pos(value)
         if len(self._list) > at and self._list[at] == value:
             self.modCount += 1
             del self._list[at]
+            if self._keys is not None:
+                del self._keys[at]
 
     _log2base = math.log(2)
 
     def __le__(self, other):
-        if not isinstance(other, SortedListSet):
+        if not self._compatible(other):
+            # No linear scan possible, fall back to the library
             return collections.MutableSet.__le__(self, other)
-        len_ = len(self._list)
-        olen = len(other._list)
+        len_ = len(self)
+        olen = len(other)
         if len_ > olen:
             return False
-        elif 100 < olen and 2 * len_ * math.log(olen) / self._log2base < olen or self._key != other._key:
-            # No  linear scan possible, or no performance gain, fall back to the library
-            return collections.MutableSet.__le__(self, other)
-        i = 0
-        for item in self._list:
-            if item == other._list[i]:
-                i += 1
-                continue
-            else:
-                mykey = self._key(item)
-                otherkey = self._key(other._list[i])
-                if mykey <= otherkey:
+        elif 100 < olen and 2 * len_ * math.log(olen) / self._log2base < olen:
+            # No performance gain from a linear scan, gallop through the other set
+            items, keys = self._sortedLists()
+            otherItems, otherKeys = self._listed(*other._sortedLists(), probes = len_)
+            at = 0
+            for i, item in enumerate(items):
+                at = self._gallop(
+                    otherItems, otherKeys,
+                    self._key(item) if keys is None else keys[i], at
+                )
+                if at >= olen or otherItems[at] != item:
                     return False
-                i += 1
-                while i < len(other._list):
-                    if mykey > self._key(other._list[i]):
-                        i += 1 
-                    else:
+                at += 1
+            return True
+        mine = self._keyed()
+        others = other._keyed()
+        if mine is not None and others is not None:
+            for mykey, item in mine:
+                for otherkey, otherItem in others:
+                    if mykey == otherkey:
+                        if item != otherItem:
+                            return False
                         break
-                if i >= len(other._list):
+                    elif mykey < otherkey:
+                        return False
+                else:
+                    return False
+            return True
+        others = iter(other._values())
+        for item in self._values():
+            mykey = _UNKNOWN
+            for otherItem in others:
+                if item == otherItem:
+                    break
+                if mykey is _UNKNOWN:
+                    mykey = self._key(item)
+                if mykey <= self._key(otherItem):
                     return False
+            else:
+                return False
         return True
 
     def __eq__(self, other):
-        if not isinstance(other, SortedListSet) or self._key != other._key:
-            return collections.MutableSet.__le__(self, other)
-        len_ = len(self._list)
-        if len_ != len(other._list):
+        if not self._compatible(other):
+            return collections.MutableSet.__eq__(self, other)
+        if len(self) != len(other):
             return False
-        for i in range(0, len_):
-            if self._list[i] != other._list[i]:
+        for item, otherItem in zip(self._values(), other._values()):
+            if item != otherItem:
                 return False
         return True
 
@@ -271,12 +914,181 @@ class SortedListSet(collections.MutableSet):
     def __len__(self):
         return len(self._list)
 
-    def iter(self, from_ = None, to_ = None):
+    def __getitem__(self, index):
+        return self._list[index]
+
+    def index(self, x):
+        """
+        Return the position of an element in this set's sort order.
+        
+        Parameters
+        ----------
+        x : object
+            The element to locate.
+    
+        Returns
+        -------
+        int
+            The number of elements that precede `x` in this set.
+    
+        Raises
+        ------
+        ValueError
+            If `x` is not an element of this set.
+    
+        Examples
+        --------
+        >>> s=SortedListSet('DEBArcADEro', key=str.lower)
+        >>> s.index('c'), s[2]
+        (2, 'c')
+        >>> s[-1], s[1:4], s[::3]
+        ('r', ['B', 'c', 'D'], ['A', 'D', 'r'])
+        >>> s.index('C')
+        Traceback (most recent call last):
+        ...
+        ValueError: 'C' is not in the set
+        """
+    
+        at = self._pos(x)
+        if len(self) > at and self[at] == x:
+            return at
+        raise ValueError('%r is not in the set' % (x,))
+
+    def bisectLeft(self, x, isKey = False):
+        """
+        Return the position of an element or key in this set's sort order,
+        or the position of the first element that follows it.
+        
+        Parameters
+        ----------
+        x : object
+            An element, or a key if `isKey` is set, to locate.
+        isKey : bool, optional
+            Whether `x` is a key rather than an element.
+    
+        Returns
+        -------
+        int
+            The number of elements with keys less than the key of `x`.
+    
+        Examples
+        --------
+        >>> s=SortedListSet((1, 3, 5, 7), key=lambda x: -x)
+        >>> s.bisectLeft(5), s.bisectRight(5), s.bisectLeft(4), s.bisectRight(4)
+        (1, 2, 2, 2)
+        >>> s.bisectLeft(-3, True), s.bisectRight(-3, True)
+        (2, 3)
+        """
+    
+        return self._find(x if isKey else self._key(x))
+
+    def bisectRight(self, x, isKey = False):
+        """
+        Return the position past an element or key in this set's
+        sort order.
+        
+        Parameters
+        ----------
+        x : object
+            An element, or a key if `isKey` is set, to locate.
+        isKey : bool, optional
+            Whether `x` is a key rather than an element.
+    
+        Returns
+        -------
+        int
+            The number of elements with keys less than or equal to
+            the key of `x`.
+        """
+    
+        key = x if isKey else self._key(x)
+        at = self._find(key)
+        if len(self) > at and self._keyAt(at) == key:
+            at += 1
+        return at
+
+    def containsMany(self, items):
+        """
+        Test a batch of values for membership in this set.
+        
+        Sorts the batch by keys and looks up its values in the order
+        of their keys, starting each search where the previous one
+        ended. This takes fewer steps than looking up each value
+        separately, and calls the key function once per value.
+    
+        Parameters
+        ----------
+        items : Iterable
+            The values to look for.
+    
+        Returns
+        -------
+        list
+            Booleans that tell which of the values are present in this
+            set, in the order of `items`.
+    
+        Examples
+        --------
+        >>> s=SortedListSet('DEBArcADEro', key=str.lower)
+        >>> s.containsMany('aABcz')
+        [False, True, True, True, False]
+        """
+    
+        if not isinstance(items, collections.Sequence):
+            items = list(items)
+        keys = list(map(self._key, items))
+        result = [ False ] * len(items)
+        list_, listKeys = self._sortedLists()
+        size = len(list_)
+        at = 0
+        for i in sorted(range(len(keys)), key = keys.__getitem__):
+            at = self._gallop(list_, listKeys, keys[i], at)
+            result[i] = size > at and list_[at] == items[i]
+        return result
+
+    def countRange(self, from_ = None, to_ = None):
+        """
+        Return the number of elements within the range limited by
+        argument values.
+        
+        Counts elements that `iter` would return for the same range
+        without iterating over them.
+        
+        Parameters
+        ----------
+        from_ : object, optional
+            A value that begins or precedes requested range, see `iter`.
+        to_ : object, optional
+            A value that follows requested range, see `iter`.
+    
+        Returns
+        -------
+        int
+            The number of elements within the range.
+    
+        Examples
+        --------
+        >>> s=SortedListSet(range(0, 100, 5))
+        >>> s.countRange(10, 30), s.countRange(11, 30), s.countRange(to_ = 50)
+        (4, 3, 10)
+        >>> s.countRange(30, 10)
+        0
+        """
+    
+        fromIndex = 0 if from_ is None else self._pos(from_)
+        toIndex = len(self) if to_ is None else self._pos(to_)
+        return toIndex - fromIndex if toIndex > fromIndex else 0
+
+    def iter(self, from_ = None, to_ = None, reverse = False):
         """
         Return an iterator over a subset limited by argument values.
         
         Limits this set to values that fall within specified
         boundaries and returns an iterator over matching elements.
+        The iterator reads elements from this set as it goes, without
+        copying the range, reports the number of elements it has yet to
+        return via `len`, and can be reversed with `reversed` to return
+        those elements in the opposite order.
         
         Parameters
         ----------
@@ -290,10 +1102,13 @@ class SortedListSet(collections.MutableSet):
             in the set, this value will be omitted by the iterator.
             Default is None, which means past end of the set's value
             range.
+        reverse : bool, optional
+            Whether to return the elements in descending order.
+            Default is ``False``.
     
         Returns
         -------
-        SortedListSetIterator
+        SortedListSet.Iterator
             Iterator over a subset limited by argument values valid
             until the next modification of this set.
     
@@ -313,23 +1128,3213 @@ class SortedListSet(collections.MutableSet):
         ['E', 'o', 'r']
         >>> [ i for i in s.iter(from_ = 's') ]
         []
+        >>> [ i for i in s.iter('b', 'r', True) ]
+        ['o', 'E', 'D', 'c', 'B']
+        >>> i = s.iter('b', 'r')
+        >>> len(i), next(i), len(i)
+        (5, 'B', 4)
+        >>> [ i for i in reversed(i) ]
+        ['o', 'E', 'D', 'c']
+        >>> s.add('F')
+        >>> next(i)
+        Traceback (most recent call last):
+        ...
+        RuntimeError: set {'A', 'B', 'c', 'D', 'E', 'F', 'o', 'r'} has been modified during the iteration
         """
     
         fromIndex = 0 if from_ is None else self._pos(from_)
-        toIndex = len(self._list) if to_ is None else self._pos(to_)
-        return self.Iterator(self, fromIndex, toIndex)
+        toIndex = len(self) if to_ is None else self._pos(to_)
+        return self.Iterator(self, fromIndex, toIndex, reverse)
+
+    def __reversed__(self):
+        return self.iter(reverse = True)
 
     class Iterator(collections.Iterator):
+        """
+        Iterator over a range of positions in a set that reads elements
+        from the set as it advances.
+        """
     
-        def __init__(self, set_, from_, to_):
+        def __init__(self, set_, from_, to_, reverse = False):
             self._modCount = set_.modCount
             self._set = set_
-            self._iter = iter(set_._list[from_: to_])
+            self._from = from_
+            self._to = to_
+            self._reverse = reverse
     
         def __next__(self):
             if self._modCount != self._set.modCount:
                 raise RuntimeError('set %s has been modified during the iteration' % self._set)
-            return self._iter.__next__()
+            if self._from >= self._to:
+                raise StopIteration
+            if self._reverse:
+                self._to -= 1
+                return self._set._list[self._to]
+            else:
+                self._from += 1
+                return self._set._list[self._from - 1]
+
+        def __len__(self):
+            return self._to - self._from if self._to > self._from else 0
+
+        def __reversed__(self):
+            reverse = type(self)(self._set, self._from, self._to, not self._reverse)
+            reverse._modCount = self._modCount
+            return reverse
+
+class SortedChunkedSet(SortedListSet):
+    """
+    Implementation of `collections.Set` backed by a list of bounded-size
+    sorted chunks.
+    
+    A `SortedListSet` that splits its contents among multiple sorted
+    lists, or chunks, each holding no more than twice the `load`
+    number of elements. An index of chunk maxima locates the chunk
+    that may contain an element, and an index of chunk sizes maps
+    element positions to chunks. Adding or deleting elements at random
+    shifts at most one chunk and updates the indexes in logarithmic
+    time, so instances of this class scale to millions of elements
+    where a `SortedListSet` would slow down. Lookups remain
+    logarithmic. The index of chunk maxima is searched with `bisect`,
+    so the keys of elements must support the `<` operator.
+    
+    Parameters
+    --------------------
+    iterable : Iterable, optional
+        A collection to take initial elements of this set from.
+    key : object, optional
+        A callable object used to extract a comparison key from each
+        set element, see `SortedListSet`.
+    cacheKeys : bool, optional
+        Store the comparison key of each element in a chunk parallel
+        to the element's chunk, see `SortedListSet`.
+    load : int, optional
+        The preferred size of a chunk. Chunks that grow over twice that
+        size are split in halves, chunks that shrink below a half of
+        that size are merged with their neighbors. The default is
+        `DEFAULT_LOAD`.
+
+    Attributes
+    -----------------
+    modCount : int
+        The number of times this set has been changed since creation,
+        see `SortedListSet`.
+    DEFAULT_LOAD : int
+        The default value of the `load` argument.
+
+    Raises
+    ----------
+    ValueError
+        If the iterable argument reports a size that differs from its
+        actual number of elements, or the load argument is less than 2.
+    TypeError
+        If the key argument is not callable.
+
+    See Also
+    --------------
+    SortedListSet : The single list implementation that this class
+    extends.
+
+    Examples
+    ----------------
+    >>> s=SortedChunkedSet(load=2)
+    >>> str(s)
+    '()'
+    >>> s |= (0, 15, 1, -3, 8, 4, 23)
+    >>> s
+    SortedChunkedSet({-3, 0, 1, 4, 8, 15, 23})
+    >>> len(s)
+    7
+    >>> s.remove(1)
+    >>> s.discard(8)
+    >>> s.discard(9)
+    >>> print(s)
+    {-3, 0, 4, 15, 23}
+    >>> 4 in s, 8 in s
+    (True, False)
+    >>> [ i for i in s.iter(0, 20) ]
+    [0, 4, 15]
+    >>> s=SortedChunkedSet('ABrACadEbra', key=str.lower, load=2)
+    >>> s
+    SortedChunkedSet({'a', 'b', 'C', 'd', 'E', 'r'})
+    >>> 'e' in s
+    False
+    >>> s == SortedListSet('aBCdEr', key=str.lower)
+    False
+    >>> s <= SortedListSet('abCdEfqrZ', str.lower)
+    True
+    >>> s2 = SortedChunkedSet('ABrACadEbra', str.lower, True, load=2)
+    >>> s2.add('q'); s2.discard('C'); s2.discard('c')
+    >>> s2
+    SortedChunkedSet({'a', 'b', 'd', 'E', 'q', 'r'})
+    >>> s2 <= s, s2 <= SortedChunkedSet('abdEqrs', str.lower, True)
+    (False, True)
+    """
+
+    DEFAULT_LOAD = 1000
+
+    def __init__(self, iterable = None, key = None, cacheKeys = False, load = None):
+        if load is None:
+            load = self.DEFAULT_LOAD
+        elif 2 > load:
+            raise ValueError('chunk load must be at least 2, got %d' % load)
+        self._load = load
+        super(SortedChunkedSet, self).__init__(iterable, key, cacheKeys)
+
+    def _build(self, list_, keys = None):
+        """
+        Split a sorted list of unique elements, and optionally a list
+        of their keys, into the chunks of this set and rebuild the indexes.
+        """
+        load = self._load
+        self._chunks = [ list_[i: i + load] for i in range(0, len(list_), load) ]
+        if keys is None:
+            self._keyChunks = None
+            self._maxes = [ self._key(chunk[-1]) for chunk in self._chunks ]
+        else:
+            self._keyChunks = [ keys[i: i + load] for i in range(0, len(keys), load) ]
+            self._maxes = [ chunk[-1] for chunk in self._keyChunks ]
+        self._reindex()
+
+    def _reindex(self):
+        """
+        Rebuild the index of chunk sizes after chunks have been
+        split, merged, added or removed.
+        """
+        tree = [ 0 ]
+        tree.extend(len(chunk) for chunk in self._chunks)
+        size = len(tree)
+        for i in range(1, size):
+            j = i + (i & -i)
+            if j < size:
+                tree[j] += tree[i]
+        self._tree = tree
+        self._len = sum(len(chunk) for chunk in self._chunks)
+
+    def _resize(self, chunk, delta):
+        """
+        Update the index of chunk sizes when an element is added to
+        or removed from a chunk.
+        """
+        tree = self._tree
+        size = len(tree)
+        i = chunk + 1
+        while i < size:
+            tree[i] += delta
+            i += i & -i
+        self._len += delta
+
+    def _offset(self, chunk):
+        """
+        Return the position of the first element of a chunk within
+        this set.
+        """
+        tree = self._tree
+        offset = 0
+        i = chunk
+        while i > 0:
+            offset += tree[i]
+            i -= i & -i
+        return offset
+
+    def _loc(self, pos):
+        """
+        Convert the position of an element within this set into
+        a tuple of its chunk's index and its position in that chunk.
+        Positions past the end of the set are converted to
+        ``(len(self._chunks), 0)``.
+        """
+        tree = self._tree
+        size = len(tree)
+        chunk = 0
+        step = 1 << (size - 1).bit_length() >> 1
+        while step:
+            i = chunk + step
+            if i < size and tree[i] <= pos:
+                chunk = i
+                pos -= tree[i]
+            step >>= 1
+        return (chunk, pos) if chunk < len(self._chunks) else (chunk, 0)
+
+    def _locate(self, x):
+        """
+        Return a tuple of indexes of the chunk that contains specified
+        element and of the element's position in that chunk. If the
+        element is missing, return the position it should be inserted
+        at to maintain the set's order, with the chunk index of
+        ``len(self._chunks)`` for elements that follow all others.
+        """
+        return self._locateKey(self._key(x))
+
+    def _locateKey(self, key):
+        """
+        Return a tuple of indexes of the chunk that contains an element
+        with specified key and of that element's position in the chunk,
+        as `_locate` does.
+        """
+        chunk = bisect.bisect_left(self._maxes, key)
+        if chunk == len(self._maxes):
+            return chunk, 0
+        elif self._keyChunks is None:
+            return chunk, self._bisect(self._chunks[chunk], key)
+        else:
+            return chunk, bisect.bisect_left(self._keyChunks[chunk], key)
+
+    def _chunkKeyAt(self, chunk, at):
+        """
+        Return the key of an element at specified position in a chunk.
+        """
+        if self._keyChunks is None:
+            return self._key(self._chunks[chunk][at])
+        else:
+            return self._keyChunks[chunk][at]
+
+    def _pos(self, x, from_ = 0, to_ = None):
+        """
+        Return the position of specified element within this set,
+        or the position it should be inserted at to maintain the set's order.
+        """
+        return self._find(self._key(x), from_, to_)
+
+    def _find(self, key, from_ = 0, to_ = None):
+        """
+        Return the position of an element with specified key within this
+        set, or the position it should be inserted at to maintain the set's
+        order.
+        """
+        chunk, at = self._locateKey(key)
+        pos = self._offset(chunk) + at
+        if pos < from_:
+            return from_
+        elif to_ is not None and pos > to_:
+            return to_
+        return pos
+
+    def _keyAt(self, pos):
+        return self._chunkKeyAt(*self._loc(pos))
+
+    def _values(self):
+        return itertools.chain.from_iterable(self._chunks)
+
+    def _sortedLists(self):
+        elements = _ChunkedList(self._chunks)
+        return (
+            elements,
+            None if self._keyChunks is None
+            else _ChunkedList(self._keyChunks, elements.ends)
+        )
+
+    def _assign(self, list_, keys):
+        self._build(list_, keys)
+
+    def _addsSeparately(self, count):
+        # merging rebuilds all chunks, while adding shifts only one
+        return count * 64 < self._len
+
+    def _new(self, iterable = None):
+        return type(self)(iterable, self._key, self._keyChunks is not None, self._load)
+
+    def _keyed(self):
+        if self._keyChunks is None:
+            return None
+        return zip(
+            itertools.chain.from_iterable(self._keyChunks),
+            itertools.chain.from_iterable(self._chunks)
+        )
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, index):
+        size = self._len
+        if isinstance(index, slice):
+            start, stop, step = index.indices(size)
+            if 1 != step:
+                return [ self[i] for i in range(start, stop, step) ]
+            result = []
+            chunk, at = self._loc(start)
+            count = stop - start
+            while 0 < count:
+                list_ = self._chunks[chunk]
+                result.extend(list_[at: at + count])
+                count -= len(list_) - at
+                chunk += 1
+                at = 0
+            return result
+        if 0 > index:
+            index += size
+        if 0 > index or size <= index:
+            raise IndexError('set index out of range')
+        chunk, at = self._loc(index)
+        return self._chunks[chunk][at]
+
+    def __contains__(self, x):
+        chunk, at = self._locate(x)
+        return chunk < len(self._chunks) and self._chunks[chunk][at] == x
+
+    def add(self, value):
+        key = self._key(value)
+        maxes = self._maxes
+        keyChunks = self._keyChunks
+        if not maxes:
+            self.modCount += 1
+            self._chunks.append([ value ])
+            if keyChunks is not None:
+                keyChunks.append([ key ])
+            maxes.append(key)
+            self._reindex()
+            return
+        chunk, at = self._locateKey(key)
+        if chunk == len(maxes):
+            chunk -= 1
+            list_ = self._chunks[chunk]
+            list_.append(value)
+            if keyChunks is not None:
+                keyChunks[chunk].append(key)
+            maxes[chunk] = key
+        else:
+            list_ = self._chunks[chunk]
+            if key == self._chunkKeyAt(chunk, at):
+                if list_[at] == value:
+                    return # set is not modified
+                self.modCount += 1
+                list_[at] = value
+                return
+            list_.insert(at, value)
+            if keyChunks is not None:
+                keyChunks[chunk].insert(at, key)
+        self.modCount += 1
+        self._resize(chunk, 1)
+        if len(list_) > 2 * self._load:
+            self._split(chunk)
+
+    def discard(self, value):
+        chunk, at = self._locate(value)
+        if chunk >= len(self._chunks):
+            return
+        list_ = self._chunks[chunk]
+        if list_[at] != value:
+            return
+        self.modCount += 1
+        del list_[at]
+        if self._keyChunks is not None:
+            del self._keyChunks[chunk][at]
+        if not list_:
+            del self._chunks[chunk]
+            if self._keyChunks is not None:
+                del self._keyChunks[chunk]
+            del self._maxes[chunk]
+            self._reindex()
+            return
+        if len(list_) == at:
+            self._maxes[chunk] = self._chunkKeyAt(chunk, at - 1)
+        self._resize(chunk, -1)
+        if len(list_) < self._load >> 1 and 1 < len(self._chunks):
+            self._mergeChunk(chunk)
+
+    def containsMany(self, items):
+        if not isinstance(items, collections.Sequence):
+            items = list(items)
+        keys = list(map(self._key, items))
+        result = [ False ] * len(items)
+        maxes = self._maxes
+        size = len(maxes)
+        chunk = 0
+        at = 0
+        for i in sorted(range(len(keys)), key = keys.__getitem__):
+            key = keys[i]
+            next_ = bisect.bisect_left(maxes, key, chunk)
+            if next_ >= size:
+                break
+            elif next_ != chunk:
+                chunk = next_
+                at = 0
+            list_ = self._chunks[chunk]
+            at = self._gallop(
+                list_, None if self._keyChunks is None else self._keyChunks[chunk],
+                key, at
+            )
+            result[i] = list_[at] == items[i]
+        return result
+
+    def _split(self, chunk):
+        """
+        Split an oversized chunk in halves.
+        """
+        list_ = self._chunks[chunk]
+        half = len(list_) >> 1
+        self._maxes.insert(chunk, self._chunkKeyAt(chunk, half - 1))
+        self._chunks[chunk: chunk + 1] = [ list_[:half], list_[half:] ]
+        if self._keyChunks is not None:
+            keys = self._keyChunks[chunk]
+            self._keyChunks[chunk: chunk + 1] = [ keys[:half], keys[half:] ]
+        self._reindex()
+
+    def _mergeChunk(self, chunk):
+        """
+        Merge an undersized chunk with its neighbor, or move elements
+        between them if the merged chunk would be oversized.
+        """
+        if 0 == chunk:
+            chunk = 1
+        prev = chunk - 1
+        chunks = self._chunks
+        size = len(chunks[prev]) + len(chunks[chunk])
+        if size > 2 * self._load:
+            # the number of chunks stays the same, so the index of chunk
+            # sizes is updated rather than rebuilt
+            half = size >> 1
+            self._resize(prev, half - len(chunks[prev]))
+            self._resize(chunk, size - half - len(chunks[chunk]))
+            list_ = chunks[prev] + chunks[chunk]
+            chunks[prev], chunks[chunk] = list_[:half], list_[half:]
+            if self._keyChunks is not None:
+                keys = self._keyChunks[prev] + self._keyChunks[chunk]
+                self._keyChunks[prev], self._keyChunks[chunk] = keys[:half], keys[half:]
+            self._maxes[prev] = self._chunkKeyAt(prev, half - 1)
+            return
+        chunks[prev].extend(chunks[chunk])
+        del chunks[chunk]
+        if self._keyChunks is not None:
+            self._keyChunks[prev].extend(self._keyChunks[chunk])
+            del self._keyChunks[chunk]
+        self._maxes[prev] = self._maxes[chunk]
+        del self._maxes[chunk]
+        self._reindex()
+
+    class Iterator(SortedListSet.Iterator):
+    
+        def __init__(self, set_, from_, to_, reverse = False):
+            super(SortedChunkedSet.Iterator, self).__init__(set_, from_, to_, reverse)
+            if from_ < to_:
+                self._chunk, self._at = set_._loc(to_ - 1 if reverse else from_)
+    
+        def __next__(self):
+            set_ = self._set
+            if self._modCount != set_.modCount:
+                raise RuntimeError('set %s has been modified during the iteration' % set_)
+            if self._from >= self._to:
+                raise StopIteration
+            if self._reverse:
+                if 0 > self._at:
+                    self._chunk -= 1
+                    self._at = len(set_._chunks[self._chunk]) - 1
+                item = set_._chunks[self._chunk][self._at]
+                self._at -= 1
+                self._to -= 1
+            else:
+                list_ = set_._chunks[self._chunk]
+                if self._at >= len(list_):
+                    self._chunk += 1
+                    self._at = 0
+                    list_ = set_._chunks[self._chunk]
+                item = list_[self._at]
+                self._at += 1
+                self._from += 1
+            return item
+
+class ConcurrentSortedListSet(SortedListSet):
+    """
+    Variant of `SortedListSet` that can be shared between threads.
+    
+    Guards every operation on the set with a `locks.ReadWriteLock`,
+    so that any number of threads can look up elements at the same
+    time, while changes are made by one thread at a time and never
+    observed half-done. The lock is held only while an operation runs,
+    so readers proceed between the steps of a writer rather than
+    waiting for it to finish a series of changes. Set operations
+    with another concurrent set read a snapshot of the other set's
+    contents to avoid holding both sets' locks at once, and so do
+    set operations of other `SortedListSet` instances with this set.
+    The snapshot is a copy of the whole set, which takes O(n) time
+    and memory when first needed after a change and is then shared
+    by all readers until the next change, so such operations are best
+    reserved for sets that are read much more often than changed.
+    
+    Parameters
+    --------------------
+    iterable : Iterable, optional
+        A collection to take initial elements of this set from.
+    key : object, optional
+        A callable object that extracts comparison keys from
+        elements, see `SortedListSet`.
+    cacheKeys : bool, optional
+        Store the comparison key of each element, see `SortedListSet`.
+    snapshotIterators : bool, optional
+        The default for iterators returned by `iter` and the ``for``
+        statement: whether they should read a snapshot of this set's
+        contents taken when they are created, rather than fail when
+        the set changes during iteration. The default is ``False``.
+
+    Methods
+    ---------------
+    iter(from, to, reverse, snapshot)
+        Return an iterator over a subset limited by argument values.
+    snapshot()
+        Return a copy of this set's current contents.
+
+    Examples
+    ----------------
+    >>> s = ConcurrentSortedListSet('ABrACadEbra', key=str.lower)
+    >>> i = s.iter(snapshot = True)
+    >>> s.add('q'); s.discard('C')
+    >>> ''.join(i), ''.join(s.iter('b', 'r'))
+    ('abCdEr', 'bdEq')
+    >>> s |= ConcurrentSortedListSet('xyz', str.lower)
+    >>> s
+    ConcurrentSortedListSet({'a', 'b', 'd', 'E', 'q', 'r', 'x', 'y', 'z'})
+    >>> SortedListSet('Xa', str.lower) | s, SortedListSet('bq', str.lower) <= s
+    (SortedListSet({'a', 'b', 'd', 'E', 'q', 'r', 'x', 'y', 'z'}), True)
+    >>> i = iter(s)
+    >>> s.discard('x')
+    >>> next(i)
+    Traceback (most recent call last):
+    ...
+    RuntimeError: set {'a', 'b', 'd', 'E', 'q', 'r', 'y', 'z'} has been modified during the iteration
+    >>> import threading
+    >>> s = ConcurrentSortedListSet(snapshotIterators=True)
+    >>> writers = [ threading.Thread(target=s.update, args=(range(n, 1000, 4),))
+    ...     for n in range(4) ]
+    >>> for t in writers: t.start()
+    >>> for t in writers: t.join()
+    >>> len(s), list(s) == list(range(1000))
+    (1000, True)
+    """
+
+    def __init__(self, iterable = None, key = None, cacheKeys = False,
+            snapshotIterators = False):
+        self._lock = locks.ReadWriteLock()
+        self._snapshotIterators = snapshotIterators
+        self._frozenCopy = None
+        super(ConcurrentSortedListSet, self).__init__(iterable, key, cacheKeys)
+
+    def _new(self, iterable = None):
+        return type(self)(iterable, self._key, self._keys is not None,
+            self._snapshotIterators)
+
+    def _invalidate(self):
+        self._frozenCopy = None
+
+    def _frozen(self):
+        """
+        Return a `SortedListSet` with a copy of this set's contents
+        that is never changed, creating it on demand after each
+        change of this set.
+        """
+        with self._lock.readLock:
+            frozen = self._frozenCopy
+            if frozen is None:
+                frozen = SortedListSet(key = self._key)
+                frozen._assign(list(self._list),
+                    None if self._keys is None else list(self._keys))
+                self._frozenCopy = frozen
+            return frozen
+
+    @staticmethod
+    def _readable(other):
+        return other._frozen() if isinstance(other, ConcurrentSortedListSet) else other
+
+    # Other sets read this set's contents with these methods, which
+    # return those of a snapshot unless this thread holds the lock
+
+    def _values(self):
+        if self._lock.held:
+            return super(ConcurrentSortedListSet, self)._values()
+        return self._frozen()._values()
+
+    def _sortedLists(self):
+        if self._lock.held:
+            return super(ConcurrentSortedListSet, self)._sortedLists()
+        return self._frozen()._sortedLists()
+
+    def _keyed(self):
+        if self._lock.held:
+            return super(ConcurrentSortedListSet, self)._keyed()
+        return self._frozen()._keyed()
+
+    def snapshot(self):
+        """
+        Return a copy of this set's current contents.
+        
+        Returns
+        -------
+        SortedListSet
+            A new set with this set's key function and elements that
+            the caller can use and change without locking.
+        """
+    
+        frozen = self._frozen()
+        copy = SortedListSet(key = frozen._key)
+        copy._assign(list(frozen._list),
+            None if frozen._keys is None else list(frozen._keys))
+        return copy
+
+    def iter(self, from_ = None, to_ = None, reverse = False, snapshot = None):
+        """
+        Return an iterator over a subset limited by argument values.
+        
+        Works as `SortedListSet.iter` does, except that the iterator
+        reads a snapshot of this set taken by this method, and never
+        fails, if `snapshot` is set or defaults to ``True`` for this set.
+        """
+    
+        if snapshot is None:
+            snapshot = self._snapshotIterators
+        if snapshot:
+            return self._frozen().iter(from_, to_, reverse)
+        with self._lock.readLock:
+            return super(ConcurrentSortedListSet, self).iter(from_, to_, reverse)
+
+    def __str__(self):
+        return SortedListSet.__str__(self._frozen())
+
+    __contains__ = locks.readLocked(SortedListSet.__contains__)
+    __len__ = locks.readLocked(SortedListSet.__len__)
+    __getitem__ = locks.readLocked(SortedListSet.__getitem__)
+    index = locks.readLocked(SortedListSet.index)
+    bisectLeft = locks.readLocked(SortedListSet.bisectLeft)
+    bisectRight = locks.readLocked(SortedListSet.bisectRight)
+    countRange = locks.readLocked(SortedListSet.countRange)
+    containsMany = locks.readLocked(SortedListSet.containsMany)
+    add = locks.writeLocked(SortedListSet.add)
+    discard = locks.writeLocked(SortedListSet.discard)
+    remove = locks.writeLocked(SortedListSet.remove)
+    pop = locks.writeLocked(SortedListSet.pop)
+    clear = locks.writeLocked(SortedListSet.clear)
+
+    def _readingOther(method):
+        def wrapper(self, other):
+            other = self._readable(other)
+            with self._lock.readLock:
+                return method(self, other)
+        wrapper.__name__ = method.__name__
+        return wrapper
+
+    def _writingOther(method):
+        def wrapper(self, other):
+            other = self._readable(other)
+            with self._lock.writeLock:
+                try:
+                    return method(self, other)
+                finally:
+                    self._invalidate()
+        wrapper.__name__ = method.__name__
+        return wrapper
+
+    __le__ = _readingOther(SortedListSet.__le__)
+    __eq__ = _readingOther(SortedListSet.__eq__)
+    __or__ = _readingOther(SortedListSet.__or__)
+    __and__ = _readingOther(SortedListSet.__and__)
+    __sub__ = _readingOther(SortedListSet.__sub__)
+    __xor__ = _readingOther(SortedListSet.__xor__)
+    isdisjoint = _readingOther(SortedListSet.isdisjoint)
+    update = _writingOther(SortedListSet.update)
+    __ior__ = _writingOther(SortedListSet.__ior__)
+    __iand__ = _writingOther(SortedListSet.__iand__)
+    __isub__ = _writingOther(SortedListSet.__isub__)
+    __ixor__ = _writingOther(SortedListSet.__ixor__)
+
+    del _readingOther, _writingOther
+
+    class Iterator(SortedListSet.Iterator):
+        """
+        Iterator over a range of positions in a concurrent set that
+        reads elements under the set's lock.
+        """
+    
+        def __next__(self):
+            with self._set._lock.readLock:
+                return super(ConcurrentSortedListSet.Iterator, self).__next__()
+
+class SortedArraySet(collections.MutableSet):
+    """
+    Implementation of `collections.Set` for numbers backed by a sorted
+    array.
+    
+    A `collections.Set` of numbers of the same type that returns its
+    elements in the ascending order when iterated. This class stores
+    elements in a contiguous `numpy` array, if `numpy` is installed,
+    or an `array.array` otherwise, using a fraction of memory taken
+    by a `SortedListSet` of the same numbers. In addition to the
+    `collections.MutableSet` protocol and the range and position queries
+    of `SortedListSet`, instances of this class offer methods that test,
+    add or delete batches of elements. With `numpy`, those methods and
+    set operations between instances of this class are vectorized.
+    Adding or deleting an individual element shifts the elements that
+    follow it within an array that keeps spare room for new elements,
+    so changes should still be made in batches where possible.
+    
+    Parameters
+    --------------------
+    iterable : Iterable, optional
+        A collection to take initial elements of this set from.
+    typecode : str, optional
+        The `array` module's type code of elements of this set, which
+        also serves as a `numpy` data type. Defaults to ``'q'``,
+        i.e. 64-bit signed integers.
+
+    Attributes
+    -----------------
+    modCount : int
+        The number of times this set has been changed since creation,
+        see `SortedListSet`.
+    typecode : str
+        The type code of elements of this set, read-only.
+
+    Methods
+    ---------------
+    iter(from, to, reverse)
+        Return an iterator over a subset limited by argument values.
+    containsMany(items)
+        Test a batch of values for membership in this set.
+    addMany(items)
+        Add a batch of elements to this set.
+    discardMany(items)
+        Delete a batch of elements from this set.
+    update(iterable)
+        Add all elements of an iterable to this set at once.
+
+    Notes
+    -----
+    Positions of elements can be queried with `index`, `bisectLeft`,
+    `bisectRight` and `countRange` methods, which work as those of
+    `SortedListSet`. Retrieving a slice with the ``[]`` operator returns
+    an array of elements, which is a read-only view with `numpy`. Such
+    views, and other sets created from this set's array, keep their
+    contents, as this set copies its array on the next change instead
+    of changing it in place.
+
+    Raises
+    ----------
+    ValueError
+        If the typecode argument is not a numeric type code.
+    TypeError
+        If an element cannot be stored in an array of this set's type,
+        or a value looked up in this set is not a number.
+
+    See Also
+    --------------
+    SortedListSet : A sorted set of arbitrary comparable elements.
+
+    Examples
+    ----------------
+    >>> s=SortedArraySet((5, 1, 3, 1))
+    >>> s
+    SortedArraySet({1, 3, 5})
+    >>> s.add(4); s.discard(1); 3 in s, 1 in s, len(s)
+    (True, False, 3)
+    >>> s.addMany(range(0, 20, 4))
+    >>> s
+    SortedArraySet({0, 3, 4, 5, 8, 12, 16})
+    >>> [ bool(b) for b in s.containsMany((16, 2, 3, 2.5)) ]
+    [True, False, True, False]
+    >>> s.containsMany((3, 'a'))
+    Traceback (most recent call last):
+    ...
+    TypeError: expected numbers to look up, got 'a'
+    >>> s.discardMany((0, 4, 7))
+    >>> print(s)
+    {3, 5, 8, 12, 16}
+    >>> [ i for i in s.iter(4, 12) ], s[-1], s.countRange(4, 13)
+    ([5, 8], 16, 3)
+    >>> s & SortedArraySet(range(10)), s - SortedArraySet(range(10))
+    (SortedArraySet({3, 5, 8}), SortedArraySet({12, 16}))
+    >>> s ^ SortedArraySet(range(4, 10)) == { 3, 4, 6, 7, 9, 12, 16 }
+    True
+    >>> s.add(2.5)
+    Traceback (most recent call last):
+    ...
+    TypeError: 2.5 cannot be stored in an array of type 'q'
+    >>> s.addMany([1, 2 ** 70])
+    Traceback (most recent call last):
+    ...
+    TypeError: 1180591620717411303424 cannot be stored in an array of type 'q'
+    >>> SortedArraySet(None, 'B').add(-1)
+    Traceback (most recent call last):
+    ...
+    TypeError: -1 cannot be stored in an array of type 'B'
+    >>> s.typecode = 'd'
+    Traceback (most recent call last):
+    ...
+    AttributeError: typecode is a read-only attribute
+    """
+
+    def _readOnlyAttr(self, name, *value):
+        if name in {'typecode'}:
+            raise AttributeError(name + " is a read-only attribute")
+        elif 0 < len(value):
+            super(SortedArraySet, self).__setattr__(name, *value)
+        else:
+            super(SortedArraySet, self).__delattr__(name)
+
+    __setattr__ = _readOnlyAttr
+    __delattr__ = _readOnlyAttr
+
+    def __init__(self, iterable = None, typecode = 'q'):
+        if typecode not in array.typecodes or typecode in ('u', 'w'):
+            raise ValueError('%r is not a numeric type code' % (typecode,))
+        self.__dict__['typecode'] = typecode
+        self._numpy = numpy
+        self._buffer = None
+        self._array = self._coerce(() if iterable is None else iterable)
+        if isinstance(iterable, SortedArraySet) and self._array is iterable._array:
+            iterable._shared()
+        self.modCount = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_numpy'] = self._numpy is not None
+        state['_buffer'] = None
+        if self._numpy is None:
+            state['_array'] = array.array(self.typecode, self._array)
+        else:
+            # copies share the array, see _shared
+            self._shared()
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state, _numpy = numpy if state['_numpy'] else None)
+        self.__dict__.update(state)
+
+    def _shared(self):
+        """
+        Return this set's array for another holder to keep, so that this
+        set copies the array on its next change rather than shift
+        the elements of the array in place.
+        """
+        self._buffer = None
+        return self._array
+
+    def _spare(self):
+        """
+        Return the writeable array that holds this set's elements
+        followed by spare room, if this set can change it in place,
+        or ``None``. Only used with `numpy`.
+        """
+        buffer = self._buffer
+        return buffer if buffer is not None and buffer is self._array.base else None
+
+    def _freeze(self, array_):
+        """
+        Make a `numpy` array read-only before storing it in this set.
+        """
+        array_.flags.writeable = False
+        return array_
+
+    def _probe(self, iterable):
+        """
+        Return sorted unique values from an iterable as a `numpy` array
+        of their own type, or a list without `numpy`.
+        """
+        if self._numpy is None:
+            return sorted(set(iterable))
+        elif isinstance(iterable, SortedArraySet) and iterable._numpy is not None:
+            return iterable._array
+        elif isinstance(iterable, (self._numpy.ndarray, collections.Sequence)):
+            values = self._numpy.asarray(iterable)
+        else:
+            values = self._numpy.array(list(iterable))
+        if 1 < values.ndim:
+            raise TypeError('expected a flat collection of numbers, got a %d-dimensional array' % values.ndim)
+        return self._numpy.unique(values)
+
+    def _coerce(self, iterable):
+        """
+        Return sorted unique values from an iterable as an array of this
+        set's type.
+        """
+        values = self._probe(iterable)
+        if self._numpy is None:
+            try:
+                return array.array(self.typecode, values)
+            except (OverflowError, TypeError):
+                for value in values:
+                    self._scalar(value)
+                raise
+        if values.dtype != self._numpy.dtype(self.typecode):
+            try:
+                cast = values.astype(self.typecode)
+            except (OverflowError, TypeError, ValueError):
+                for value in values.tolist():
+                    self._scalar(value)
+                raise
+            if len(values) and not (cast == values).all():
+                raise TypeError(
+                    '%r cannot be stored in an array of type %r'
+                    % (values[cast != values][0].item(), self.typecode)
+                )
+            values = cast
+        return self._freeze(values) if values.flags.writeable else values
+
+    def _mask(self, values, other):
+        """
+        Tell which of sorted unique values are present in another
+        sorted array. Returns a `numpy` array of booleans, or a list
+        without `numpy`.
+        """
+        size = len(other)
+        if self._numpy is not None:
+            if 0 == size:
+                return self._numpy.zeros(len(values), bool)
+            at = other.searchsorted(values)
+            return other[self._numpy.minimum(at, size - 1)] == values
+        result = []
+        at = 0
+        for value in values:
+            at = bisect.bisect_left(other, value, at)
+            result.append(size > at and other[at] == value)
+        return result
+
+    def _select(self, values, mask, flag = True):
+        """
+        Return an array of values whose flags in a mask are set, or
+        cleared, as an array of this set's type.
+        """
+        if self._numpy is not None:
+            return self._freeze(values[mask if flag else ~mask])
+        return array.array(
+            self.typecode,
+            itertools.compress(values, mask if flag else map(operator.not_, mask))
+        )
+
+    def _union(self, values, other):
+        """
+        Return sorted unique values from two sorted unique arrays as
+        an array of this set's type.
+        """
+        if self._numpy is None:
+            return array.array(
+                self.typecode,
+                ( value for value, dups in itertools.groupby(sorted(itertools.chain(values, other))) )
+            )
+        missing = other[~self._mask(other, values)]
+        if not len(missing):
+            return values
+        return self._freeze(self._numpy.insert(values, values.searchsorted(missing), missing))
+
+    def _new(self, array_):
+        """
+        Create a set of this set's type with elements from a sorted
+        unique array of this set's type.
+        """
+        if array_ is self._array:
+            self._shared()
+        result = type(self)(None, self.typecode)
+        result._numpy = self._numpy
+        result._array = array_
+        return result
+
+    def _from_iterable(self, iterable):
+        return type(self)(iterable, self.typecode)
+
+    def _scalar(self, value):
+        """
+        Convert a value to this set's element type.
+        """
+        try:
+            if self._numpy is None:
+                return array.array(self.typecode, (value,))[0]
+            result = self._numpy.dtype(self.typecode).type(value)
+        except (OverflowError, TypeError, ValueError):
+            result = None
+        if result is None or result != value:
+            raise TypeError('%r cannot be stored in an array of type %r' % (value, self.typecode))
+        return result
+
+    def __str__(self):
+        return '{' + ', '.join([ repr(e) for e in self ]) + '}' if self else '()'
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, self)
+
+    def __len__(self):
+        return len(self._array)
+
+    def __getitem__(self, index):
+        if self._numpy is None:
+            return self._array[index]
+        elif isinstance(index, slice):
+            return self._shared()[index]
+        return self._array.item(index)
+
+    def _pos(self, x):
+        """
+        Return the position of specified element in the underlying array,
+        or the position it should be inserted at to maintain the array's order.
+        """
+        if self._numpy is None:
+            return bisect.bisect_left(self._array, x)
+        return int(self._array.searchsorted(x))
+
+    def __contains__(self, x):
+        at = self._pos(x)
+        return len(self._array) > at and self._array[at] == x
+
+    def add(self, value):
+        at = self._pos(value)
+        if len(self._array) > at and self._array[at] == value:
+            return # set is not modified
+        value = self._scalar(value)
+        self.modCount += 1
+        if self._numpy is None:
+            self._array.insert(at, value)
+            return
+        size = len(self._array)
+        buffer = self._spare()
+        if buffer is None or len(buffer) == size:
+            # grow in proportion to the size for amortized O(1) copying
+            buffer = self._numpy.empty(size + (size >> 3) + 8, self._array.dtype)
+            buffer[:at] = self._array[:at]
+            buffer[at + 1: size + 1] = self._array[at:]
+            self._buffer = buffer
+        else:
+            buffer[at + 1: size + 1] = buffer[at: size]
+        buffer[at] = value
+        self._array = self._freeze(buffer[:size + 1])
+
+    def discard(self, value):
+        at = self._pos(value)
+        if len(self._array) > at and self._array[at] == value:
+            self.modCount += 1
+            if self._numpy is None:
+                del self._array[at]
+                return
+            size = len(self._array)
+            buffer = self._spare()
+            if buffer is None:
+                buffer = self._buffer = self._numpy.delete(self._array, at)
+            else:
+                buffer[at: size - 1] = buffer[at + 1: size]
+            self._array = self._freeze(buffer[:size - 1])
+
+    @staticmethod
+    def _numbers(items):
+        """
+        Make sure that values to look up in a set are numbers.
+        """
+        for item in items:
+            if not isinstance(item, numbers.Number):
+                raise TypeError('expected numbers to look up, got %r' % (item,))
+
+    def containsMany(self, items):
+        """
+        Test a batch of values for membership in this set.
+        
+        Sorts the batch and locates values in this set in a single pass
+        over both, or runs a vectorized search with `numpy`.
+    
+        Parameters
+        ----------
+        items : Iterable
+            The values to look for.
+    
+        Returns
+        -------
+        collections.Sequence
+            Booleans that tell which of the values are present in this
+            set, in the order of `items`. This is an array with `numpy`,
+            or a list otherwise.
+    
+        Raises
+        ------
+        TypeError
+            If any of the values is not a number.
+        """
+    
+        if self._numpy is not None:
+            if not isinstance(items, (self._numpy.ndarray, collections.Sequence)):
+                items = list(items)
+            probes = self._numpy.asarray(items)
+            if probes.dtype.kind not in 'biufcO':
+                self._numbers(items)
+            if 0 == len(self._array) or 0 == len(probes):
+                return self._numpy.zeros(len(probes), bool)
+            at = self._array.searchsorted(probes)
+            return self._array[self._numpy.minimum(at, len(self._array) - 1)] == probes
+        if not isinstance(items, collections.Sequence):
+            items = list(items)
+        result = [ False ] * len(items)
+        size = len(self._array)
+        at = 0
+        self._numbers(items)
+        for i in sorted(range(len(items)), key = items.__getitem__):
+            at = bisect.bisect_left(self._array, items[i], at)
+            result[i] = size > at and self._array[at] == items[i]
+        return result
+
+    def addMany(self, items):
+        """
+        Add a batch of elements to this set.
+        
+        Sorts the batch, removes duplicates, and merges the new
+        elements into this set in a single pass.
+    
+        Parameters
+        ----------
+        items : Iterable
+            The elements to add.
+    
+        Raises
+        ------
+        TypeError
+            If an element cannot be stored in an array of this set's type.
+            This set is left unchanged in that case.
+        """
+    
+        merged = self._union(self._array, self._coerce(items))
+        if len(merged) != len(self._array):
+            self.modCount += 1
+            self._array = merged
+
+    update = addMany
+
+    def discardMany(self, items):
+        """
+        Delete a batch of elements from this set.
+        
+        Values that are not elements of this set are ignored.
+    
+        Parameters
+        ----------
+        items : Iterable
+            The elements to delete.
+        """
+    
+        remaining = self._select(self._array, self._mask(self._array, self._probe(items)), False)
+        if len(remaining) != len(self._array):
+            self.modCount += 1
+            self._array = remaining
+
+    def _all(self, mask):
+        """
+        Tell whether all flags in a mask are set.
+        """
+        return all(mask) if self._numpy is None else bool(mask.all())
+
+    def __le__(self, other):
+        if not isinstance(other, SortedArraySet):
+            return collections.MutableSet.__le__(self, other)
+        return len(self) <= len(other) and self._all(self._mask(self._array, other._array))
+
+    def __eq__(self, other):
+        if not isinstance(other, SortedArraySet):
+            return collections.MutableSet.__eq__(self, other)
+        return len(self) == len(other) and self._all(self._mask(self._array, other._array))
+
+    def isdisjoint(self, other):
+        mask = self._mask(self._array, self._probe(other))
+        return not (any(mask) if self._numpy is None else mask.any())
+
+    def __or__(self, other):
+        if not isinstance(other, collections.Set):
+            return NotImplemented
+        return self._new(self._union(self._array, self._coerce(other)))
+
+    def __and__(self, other):
+        if not isinstance(other, collections.Set):
+            return NotImplemented
+        return self._new(self._select(self._array, self._mask(self._array, self._probe(other))))
+
+    def __sub__(self, other):
+        if not isinstance(other, collections.Set):
+            return NotImplemented
+        return self._new(self._select(self._array, self._mask(self._array, self._probe(other)), False))
+
+    def _symmetric(self, other):
+        """
+        Return elements of this set or a sorted unique array of this set's
+        type, but not both, as an array of this set's type.
+        """
+        return self._union(
+            self._select(self._array, self._mask(self._array, other), False),
+            self._select(other, self._mask(other, self._array), False)
+        )
+
+    def __xor__(self, other):
+        if not isinstance(other, collections.Set):
+            return NotImplemented
+        return self._new(self._symmetric(self._coerce(other)))
+
+    def __ior__(self, other):
+        self.addMany(other)
+        return self
+
+    def __iand__(self, other):
+        remaining = self._select(self._array, self._mask(self._array, self._probe(other)))
+        if len(remaining) != len(self._array):
+            self.modCount += 1
+            self._array = remaining
+        return self
+
+    def __isub__(self, other):
+        self.discardMany(other)
+        return self
+
+    def __ixor__(self, other):
+        other = self._coerce(other)
+        if len(other):
+            self.modCount += 1
+            self._array = self._symmetric(other)
+        return self
+
+    def __iter__(self):
+        return self.iter()
+
+    def __reversed__(self):
+        return self.iter(reverse = True)
+
+    def index(self, x):
+        """
+        Return the position of an element in this set's sort order,
+        see `SortedListSet.index`.
+        """
+    
+        at = self._pos(x)
+        if len(self._array) > at and self._array[at] == x:
+            return at
+        raise ValueError('%r is not in the set' % (x,))
+
+    def bisectLeft(self, x, isKey = False):
+        """
+        Return the position of a value in this set's sort order, or the
+        position of the first element that follows it, see
+        `SortedListSet.bisectLeft`. Elements of this set are their own keys.
+        """
+    
+        return self._pos(x)
+
+    def bisectRight(self, x, isKey = False):
+        """
+        Return the position past a value in this set's sort order, see
+        `SortedListSet.bisectRight`. Elements of this set are their own keys.
+        """
+    
+        if self._numpy is None:
+            return bisect.bisect_right(self._array, x)
+        return int(self._array.searchsorted(x, 'right'))
+
+    def countRange(self, from_ = None, to_ = None):
+        """
+        Return the number of elements within the range limited by
+        argument values, see `SortedListSet.countRange`.
+        """
+    
+        fromIndex = 0 if from_ is None else self._pos(from_)
+        toIndex = len(self) if to_ is None else self._pos(to_)
+        return toIndex - fromIndex if toIndex > fromIndex else 0
+
+    def iter(self, from_ = None, to_ = None, reverse = False):
+        """
+        Return an iterator over a subset limited by argument values,
+        see `SortedListSet.iter`.
+        """
+    
+        fromIndex = 0 if from_ is None else self._pos(from_)
+        toIndex = len(self) if to_ is None else self._pos(to_)
+        return self.Iterator(self, fromIndex, toIndex, reverse)
+
+    class Iterator(SortedListSet.Iterator):
+    
+        def __next__(self):
+            if self._modCount != self._set.modCount:
+                raise RuntimeError('set %s has been modified during the iteration' % self._set)
+            if self._from >= self._to:
+                raise StopIteration
+            if self._reverse:
+                self._to -= 1
+                return self._set[self._to]
+            else:
+                self._from += 1
+                return self._set[self._from - 1]
+
+class PersistentSortedSet(collections.Set, collections.Hashable):
+    """
+    Immutable sorted set that makes modified versions of itself
+    cheaply.
+    
+    A `collections.Set` that returns elements in the ascending
+    sort order when iterated, like `SortedListSet`, but never changes
+    once created. Methods that "modify" the set return a new version
+    of it instead, which shares all but O(log n) storage with the
+    original. Elements are stored in the leaves of a B+ tree that
+    also tracks the number of elements under each node, so that
+    looking up an element or its position in the sort order, adding
+    and discarding elements all take logarithmic time. A snapshot
+    of a persistent set is simply a reference to its current version,
+    which can be passed to readers without copying or locking.
+    
+    Parameters
+    --------------------
+    iterable : Iterable, optional
+        A collection to take elements of this set from. If it is
+        a `SortedListSet` and `key` is omitted, the new set takes its
+        key function and skips sorting.
+    key : object, optional
+        A callable object, such as a function, that takes one argument
+        used to extract a comparison key from each set element, with
+        the same semantics as the key function of `SortedListSet`.
+        The default value is None (compare the elements directly).
+
+    Methods
+    ---------------
+    add(value)
+        Return a version of this set with an element added.
+    discard(value)
+        Return a version of this set without an element.
+    update(iterable)
+        Return a version of this set with elements of an iterable added.
+    iter(from, to, reverse)
+        Return an iterator over a subset limited by argument values.
+    index(x)
+        Return the position of an element in this set's sort order.
+    bisectLeft(x, isKey)
+        Return the position of an element or key in this set's sort order,
+        or the position of the first element that follows it.
+    bisectRight(x, isKey)
+        Return the position past an element or key in this set's
+        sort order.
+    countRange(from, to)
+        Return the number of elements within the range limited by
+        argument values.
+
+    Notes
+    -----
+    Elements of this set can be retrieved by their positions in the
+    sort order using the ``[]`` operator with an integer index or
+    a slice. Retrieving a slice returns a list of elements.
+
+    Raises
+    ----------
+    TypeError
+        If the key argument is not callable.
+
+    See Also
+    --------------
+    SortedListSet : Mutable sorted set with the same key function
+    and range iteration semantics.
+
+    Examples
+    ----------------
+    >>> live = SortedListSet('ABrACadEbra', key=str.lower)
+    >>> first = PersistentSortedSet(live)
+    >>> second = first.add('q').discard('C')
+    >>> first, second
+    (PersistentSortedSet({'a', 'b', 'C', 'd', 'E', 'r'}), PersistentSortedSet({'a', 'b', 'd', 'E', 'q', 'r'}))
+    >>> first.discard('c') is first, 'e' in second, 'E' in second
+    (True, False, True)
+    >>> list(second.iter('b', 'q')), list(second.iter('e', reverse = True))
+    (['b', 'd', 'E'], ['r', 'q', 'E'])
+    >>> second.index('q'), second[-1], second[1::2]
+    (4, 'r', ['b', 'E', 'r'])
+    >>> second.update('xyz').countRange('f')
+    5
+    >>> {first: 'first'}[PersistentSortedSet('abCdEr', str.lower)]
+    'first'
+    >>> big = PersistentSortedSet(range(100000))
+    >>> bigger = big.add(-1)
+    >>> len(big), len(bigger), bigger[:3], big[:3]
+    (100000, 100001, [-1, 0, 1], [0, 1, 2])
+    """
+
+    _LOAD = 32
+    _MAX = 2 * _LOAD
+    _MIN = _LOAD // 2
+
+    def _readOnlyAttr(self, name, *value):
+        if name in {'_key', '_ownKeys', '_root', '_hashValue'}:
+            raise AttributeError(name + " is a read-only attribute")
+        elif 0 < len(value):
+            super(PersistentSortedSet, self).__setattr__(name, *value)
+        else:
+            super(PersistentSortedSet, self).__delattr__(name)
+
+    __setattr__ = _readOnlyAttr
+    __delattr__ = _readOnlyAttr
+
+    def __init__(self, iterable = None, key = None):
+        if key is None and isinstance(iterable, SortedListSet):
+            key = iterable._key
+            list_, keys = iterable._sortedLists()
+            if keys is None:
+                keys = list(map(key, list_))
+        else:
+            list_ = keys = ()
+        if key is not None and '__call__' not in dir(key):
+            raise TypeError(
+                'key argument is of a non-callable %s'
+                % type(key)
+            )
+        self.__dict__['_key'] = key if key is not None else (lambda x: x)
+        self.__dict__['_ownKeys'] = key is not None
+        self.__dict__['_hashValue'] = None
+        if iterable is not None and not list_:
+            source = SortedListSet(iterable, key, self._ownKeys)
+            list_, keys = source._sortedLists()
+        self.__dict__['_root'] = self._build(list_, keys)
+
+    def _leaf(self, items, keys):
+        return _TreeLeaf(items, keys if self._ownKeys else items)
+
+    def _build(self, list_, keys):
+        """
+        Return the root of a tree that holds a sorted list of unique
+        elements and a list of their keys, which is ignored unless
+        this set has a key function. Nodes at each level get
+        equal shares of elements or children, so that no node other
+        than the root is less than half full.
+        """
+        level = [ self._leaf(tuple(list_[i:j]),
+                tuple(keys[i:j]) if self._ownKeys else None)
+            for i, j in self._shares(len(list_)) ]
+        while 1 < len(level):
+            level = [ _TreeBranch(tuple(level[i:j]))
+                for i, j in self._shares(len(level)) ]
+        return level[0] if level else self._leaf((), ())
+
+    def _shares(self, size):
+        """
+        Split a range of positions into about `_LOAD` long pieces of
+        equal length, returning their boundaries.
+        """
+        count = -(-size // self._LOAD)
+        return [ (size * i // count, size * (i + 1) // count) for i in range(count) ]
+
+    def _derive(self, root):
+        if root is self._root:
+            return self
+        version = object.__new__(type(self))
+        version.__dict__.update(self.__dict__)
+        version.__dict__['_root'] = root
+        version.__dict__['_hashValue'] = None
+        return version
+
+    def _new(self, iterable = None):
+        """
+        Create a set of this set's type and key function with elements
+        from an iterable.
+        """
+        return type(self)(iterable, self._key if self._ownKeys else None)
+
+    def _from_iterable(self, iterable):
+        return self._new(iterable)
+
+    def _search(self, key):
+        """
+        Return a tuple of the number of elements with keys less than
+        a key, and the leaf and index within that leaf of the element
+        that follows them, or ``None`` in place of both if there is
+        no such element.
+        """
+        node, pos = self._root, 0
+        while type(node) is _TreeBranch:
+            i = bisect.bisect_left(node.maxes, key)
+            if len(node.maxes) <= i:
+                return pos + node.counts[-1], None, None
+            elif 0 < i:
+                pos += node.counts[i - 1]
+            node = node.children[i]
+        at = bisect.bisect_left(node.keys, key)
+        if len(node.keys) <= at:
+            return pos + at, None, None
+        return pos + at, node, at
+
+    def _pos(self, x):
+        return self._search(self._key(x))[0]
+
+    def _inserted(self, node, key, value):
+        """
+        Return a tuple of one or two nodes that replace a node after
+        adding a value, or ``None`` if the node already contains it.
+        """
+        if type(node) is _TreeLeaf:
+            at = bisect.bisect_left(node.keys, key)
+            if len(node.keys) > at and node.keys[at] == key:
+                if node.items[at] == value:
+                    return None
+                items = node.items[:at] + (value,) + node.items[at + 1:]
+                return (self._leaf(items, node.keys),)
+            items = node.items[:at] + (value,) + node.items[at:]
+            keys = node.keys[:at] + (key,) + node.keys[at:]
+            if self._MAX < len(items):
+                half = len(items) >> 1
+                return (self._leaf(items[:half], keys[:half]),
+                    self._leaf(items[half:], keys[half:]))
+            return (self._leaf(items, keys),)
+        i = bisect.bisect_left(node.maxes, key)
+        if len(node.maxes) <= i:
+            i -= 1
+        replacement = self._inserted(node.children[i], key, value)
+        if replacement is None:
+            return None
+        children = node.children[:i] + replacement + node.children[i + 1:]
+        if self._MAX < len(children):
+            half = len(children) >> 1
+            return _TreeBranch(children[:half]), _TreeBranch(children[half:])
+        return (_TreeBranch(children),)
+
+    def _removed(self, node, key, value):
+        """
+        Return a node that replaces a node after removing a value,
+        or ``None`` if the node does not contain it.
+        """
+        if type(node) is _TreeLeaf:
+            at = bisect.bisect_left(node.keys, key)
+            if len(node.keys) <= at or node.keys[at] != key or node.items[at] != value:
+                return None
+            return self._leaf(node.items[:at] + node.items[at + 1:],
+                node.keys[:at] + node.keys[at + 1:])
+        i = bisect.bisect_left(node.maxes, key)
+        if len(node.maxes) <= i:
+            return None
+        child = self._removed(node.children[i], key, value)
+        if child is None:
+            return None
+        children = node.children
+        if self._MIN > child.width() and 1 < len(children):
+            # merge an underflowing child with its sibling
+            if 0 < i:
+                i -= 1
+                pair = self._joined(children[i], child)
+            else:
+                pair = self._joined(child, children[1])
+            return _TreeBranch(children[:i] + pair + children[i + 2:])
+        return _TreeBranch(children[:i] + (child,) + children[i + 1:])
+
+    def _joined(self, left, right):
+        """
+        Return a tuple of one or two nodes with the contents of
+        adjacent nodes at the same depth.
+        """
+        if type(left) is _TreeLeaf:
+            items = left.items + right.items
+            keys = left.keys + right.keys
+            if self._MAX < len(items):
+                half = len(items) >> 1
+                return (self._leaf(items[:half], keys[:half]),
+                    self._leaf(items[half:], keys[half:]))
+            return (self._leaf(items, keys),)
+        children = left.children + right.children
+        if self._MAX < len(children):
+            half = len(children) >> 1
+            return _TreeBranch(children[:half]), _TreeBranch(children[half:])
+        return (_TreeBranch(children),)
+
+    def _walk(self, node, from_, to_, reverse):
+        """
+        Yield elements at a range of positions under a node.
+        """
+        if type(node) is _TreeLeaf:
+            items = node.items[from_:to_]
+            yield from reversed(items) if reverse else items
+            return
+        counts = node.counts
+        first = bisect.bisect_right(counts, from_)
+        last = bisect.bisect_left(counts, to_)
+        children = range(first, last + 1)
+        for i in reversed(children) if reverse else children:
+            offset = counts[i - 1] if 0 < i else 0
+            yield from self._walk(node.children[i],
+                max(from_ - offset, 0), min(to_, counts[i]) - offset, reverse)
+
+    def add(self, value):
+        """
+        Return a version of this set with an element added.
+        
+        An element with a key equal to that of `value` is replaced
+        in the returned version. If this set already contains `value`,
+        returns this set.
+        """
+    
+        replacement = self._inserted(self._root, self._key(value), value)
+        if replacement is None:
+            return self
+        return self._derive(replacement[0] if 1 == len(replacement)
+            else _TreeBranch(replacement))
+
+    def discard(self, value):
+        """
+        Return a version of this set without an element.
+        
+        If this set does not contain `value`, returns this set.
+        """
+    
+        root = self._removed(self._root, self._key(value), value)
+        if root is None:
+            return self
+        while type(root) is _TreeBranch and 1 == len(root.children):
+            root = root.children[0]
+        return self._derive(root)
+
+    def update(self, iterable):
+        """
+        Return a version of this set with elements of an iterable added.
+        
+        Adds the elements one by one when there are few of them
+        compared to the size of this set, or merges their sorted list
+        with this set's elements and builds the new version anew
+        otherwise.
+        """
+    
+        if not isinstance(iterable, collections.Sized):
+            iterable = list(iterable)
+        if len(iterable) * math.log2(len(self) + 2) < len(self):
+            version = self
+            for item in iterable:
+                version = version.add(item)
+            return version
+        merged = SortedListSet(self, self._key if self._ownKeys else None, True)
+        merged.update(iterable)
+        return self._derive(self._build(*merged._sortedLists()))
+
+    def __hash__(self):
+        if self._hashValue is None:
+            self.__dict__['_hashValue'] = self._hash()
+        return self._hashValue
+
+    def __eq__(self, other):
+        if isinstance(other, PersistentSortedSet) and self._root is other._root:
+            return True
+        return super(PersistentSortedSet, self).__eq__(other)
+
+    def __str__(self):
+        return '{' + ', '.join(map(repr, self)) + '}' if self else '()'
+
+    def __repr__(self):
+        return type(self).__name__ + '(' + str(self) + ')'
+
+    def __len__(self):
+        return self._root.count()
+
+    def __contains__(self, x):
+        pos, leaf, at = self._search(self._key(x))
+        return leaf is not None and leaf.items[at] == x
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            positions = range(len(self))[index]
+            if not positions:
+                return []
+            elif 0 < positions.step:
+                return list(self._walk(self._root,
+                    positions[0], positions[-1] + 1, False))[::positions.step]
+            return list(self._walk(self._root,
+                positions[-1], positions[0] + 1, True))[::-positions.step]
+        size = len(self)
+        if 0 > index:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError('set index out of range')
+        node = self._root
+        while type(node) is _TreeBranch:
+            i = bisect.bisect_right(node.counts, index)
+            if 0 < i:
+                index -= node.counts[i - 1]
+            node = node.children[i]
+        return node.items[index]
+
+    def __iter__(self):
+        return self.iter()
+
+    def __reversed__(self):
+        return self.iter(reverse = True)
+
+    def index(self, x):
+        """
+        Return the position of an element in this set's sort order.
+        
+        Raises
+        ------
+        ValueError
+            If `x` is not an element of this set.
+        """
+    
+        pos, leaf, at = self._search(self._key(x))
+        if leaf is not None and leaf.items[at] == x:
+            return pos
+        raise ValueError('%r is not in the set' % (x,))
+
+    def bisectLeft(self, x, isKey = False):
+        """
+        Return the position of an element or key in this set's sort order,
+        or the position of the first element that follows it.
+        
+        See `SortedListSet.bisectLeft`.
+        """
+    
+        return self._search(x if isKey else self._key(x))[0]
+
+    def bisectRight(self, x, isKey = False):
+        """
+        Return the position past an element or key in this set's
+        sort order.
+        
+        See `SortedListSet.bisectRight`.
+        """
+    
+        key = x if isKey else self._key(x)
+        pos, leaf, at = self._search(key)
+        if leaf is not None and leaf.keys[at] == key:
+            pos += 1
+        return pos
+
+    def countRange(self, from_ = None, to_ = None):
+        """
+        Return the number of elements within the range limited by
+        argument values.
+        
+        See `SortedListSet.countRange`.
+        """
+    
+        fromIndex = 0 if from_ is None else self._pos(from_)
+        toIndex = len(self) if to_ is None else self._pos(to_)
+        return toIndex - fromIndex if toIndex > fromIndex else 0
+
+    def iter(self, from_ = None, to_ = None, reverse = False):
+        """
+        Return an iterator over a subset limited by argument values.
+        
+        Works as `SortedListSet.iter` does, except that returned
+        iterator remains valid indefinitely, since this set never
+        changes.
+
+        Returns
+        -------
+        PersistentSortedSet.Iterator
+            Iterator over a subset limited by argument values.
+        """
+    
+        fromIndex = 0 if from_ is None else self._pos(from_)
+        toIndex = len(self) if to_ is None else self._pos(to_)
+        return self.Iterator(self, fromIndex, toIndex, reverse)
+
+    class Iterator(collections.Iterator):
+        """
+        Iterator over a range of positions in a persistent set that
+        walks the leaves of its tree.
+        """
+    
+        def __init__(self, set_, from_, to_, reverse = False):
+            self._set = set_
+            self._from = from_
+            self._to = to_
+            self._reverse = reverse
+            self._elements = set_._walk(set_._root, from_, to_, reverse) \
+                if from_ < to_ else iter(())
+    
+        def __next__(self):
+            item = next(self._elements)
+            if self._reverse:
+                self._to -= 1
+            else:
+                self._from += 1
+            return item
+
+        def __len__(self):
+            return self._to - self._from if self._to > self._from else 0
+
+        def __reversed__(self):
+            return type(self)(self._set, self._from, self._to, not self._reverse)
+
+class MappedSortedSet(collections.Set):
+    """
+    Read-only sorted set stored in a file that is mapped to memory.
+    
+    A `collections.Set` that reads its elements directly from a file
+    written by `dump`, without loading the file's contents. The file
+    is mapped to memory with `mmap`, so that opening it takes constant
+    time regardless of the set's size, looking up an element reads
+    only the pages visited by the binary search, and processes that
+    open the same file share its pages in the operating system's cache.
+    Elements are stored as fixed-width records packed with a `struct`
+    format, such as ``'q'`` for 64-bit integers, or as variable-width
+    strings or bytes located through an index of offsets.
+    
+    Parameters
+    --------------------
+    path : str
+        Name of a file written by `dump`.
+    key : object, optional
+        A callable object that extracts comparison keys from elements,
+        see `SortedListSet`. It must order the elements in the same way
+        as the key function of the set that was written to the file.
+        The default value is None (compare the elements directly).
+
+    Methods
+    ---------------
+    dump(iterable, path, format, key)
+        Write a sorted set to a file that this class can read.
+    close()
+        Release the memory mapping of the file.
+    iter(from, to, reverse)
+        Return an iterator over a subset limited by argument values.
+    index(x)
+        Return the position of an element in this set's sort order.
+    bisectLeft(x, isKey)
+        Return the position of an element or key in this set's sort order,
+        or the position of the first element that follows it.
+    bisectRight(x, isKey)
+        Return the position past an element or key in this set's
+        sort order.
+    countRange(from, to)
+        Return the number of elements within the range limited by
+        argument values.
+
+    Notes
+    -----
+    Elements of this set can be retrieved by their positions in the
+    sort order using the ``[]`` operator with an integer index or
+    a slice. Set operations on this set return `SortedListSet`
+    objects with the results.
+
+    Raises
+    ----------
+    ValueError
+        If the file has not been written by `dump`.
+    TypeError
+        If the key argument is not callable.
+
+    Examples
+    ----------------
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'words.set')
+    >>> MappedSortedSet.dump(SortedListSet('ABrACadEbra', key=str.lower), path)
+    >>> with MappedSortedSet(path, str.lower) as s:
+    ...     len(s), 'C' in s, 'c' in s, s.index('d'), ''.join(s.iter('b', 'r'))
+    (6, True, False, 3, 'bCdE')
+    >>> MappedSortedSet.dump(range(0, 1000, 3), path)
+    >>> with MappedSortedSet(path) as s:
+    ...     s.countRange(10, 20), s[-1], list(s.iter(990, reverse = True)), s & {3, 4}
+    (3, 999, [999, 996, 993, 990], SortedListSet({3}))
+    >>> os.remove(path)
+    """
+
+    _HEADER = struct.Struct('<8s16sQQ')
+    _MAGIC = b'EPyCSet1'
+    _VARIABLE = {'str', 'bytes'}
+
+    Iterator = SortedListSet.Iterator
+
+    def __init__(self, path, key = None):
+        if key is not None and '__call__' not in dir(key):
+            raise TypeError(
+                'key argument is of a non-callable %s'
+                % type(key)
+            )
+        self._path = path
+        self._key = key if key is not None else (lambda x: x)
+        self._ownKey = key is not None
+        with open(path, 'rb') as file:
+            map_ = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+        if len(map_) < self._HEADER.size \
+                or self._MAGIC != map_[:len(self._MAGIC)]:
+            map_.close()
+            raise ValueError('%r is not a sorted set file' % (path,))
+        magic, format, count, data = self._HEADER.unpack_from(map_, 0)
+        self._list = MappedSortedSet.Records(
+            map_, format.rstrip(b'\0').decode('ascii'), count, data)
+        self.modCount = 0
+
+    @staticmethod
+    def dump(iterable, path, format = None, key = None):
+        """
+        Write a sorted set to a file that this class can read.
+        
+        Writes elements one by one as the set returns them, without
+        building a copy of the file's contents in memory.
+        
+        Parameters
+        ----------
+        iterable : Iterable
+            A `SortedListSet`, `PersistentSortedSet` or `MappedSortedSet`
+            to write, or a collection of elements to put in a new
+            `SortedListSet` with the `key` function before writing.
+        path : str
+            Name of the file to write.
+        format : str, optional
+            ``'str'`` or ``'bytes'`` to write elements of these types
+            as variable-width records, or a `struct` format of a
+            fixed-width record, which is little-endian unless the format
+            specifies otherwise. Records that pack several values
+            are read back as tuples. By default, the format is chosen
+            by the type of the first element: ``'q'`` for integers,
+            ``'d'`` for floats, ``'str'`` or ``'bytes'``.
+        key : object, optional
+            The key function for a new set of elements from `iterable`.
+    
+        Raises
+        ------
+        TypeError
+            If the format is omitted and cannot be chosen by the type
+            of elements, or an element of a variable-width format is not
+            a string or bytes as the format requires.
+        ValueError
+            If the format is too long to be stored in the file.
+
+        Examples
+        --------
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'numbers.set')
+        >>> MappedSortedSet.dump([5, 3], path, 'bytes')
+        Traceback (most recent call last):
+        ...
+        TypeError: 3 cannot be written as a 'bytes' record
+        >>> os.remove(path)
+        """
+    
+        if not isinstance(iterable, (SortedListSet, PersistentSortedSet, MappedSortedSet)):
+            iterable = SortedListSet(iterable, key)
+        if format is None:
+            format = MappedSortedSet._formatOf(next(iter(iterable), 0))
+        record = None
+        if format not in MappedSortedSet._VARIABLE:
+            if format[:1] not in '@=<>!':
+                format = '<' + format
+            record = struct.Struct(format)
+        if len(format) > 16:
+            raise ValueError('record format %r is too long' % format)
+        count = len(iterable)
+        with open(path, 'wb') as file:
+            if record is None:
+                data = MappedSortedSet._HEADER.size + 8 * (count + 1)
+                file.seek(data)
+                offsets = array.array('Q', (0,))
+                at = 0
+                for item in iterable:
+                    if 'str' == format and isinstance(item, str):
+                        raw = item.encode('utf-8')
+                    elif 'bytes' == format and isinstance(item, (bytes, bytearray, memoryview)):
+                        raw = bytes(item)
+                    else:
+                        raise TypeError('%r cannot be written as a %r record' % (item, format))
+                    file.write(raw)
+                    at += len(raw)
+                    offsets.append(at)
+                if 'big' == sys.byteorder:
+                    offsets.byteswap()
+                file.seek(MappedSortedSet._HEADER.size)
+                offsets.tofile(file)
+            else:
+                data = MappedSortedSet._HEADER.size
+                file.seek(data)
+                for item in iterable:
+                    file.write(record.pack(*item) if isinstance(item, tuple)
+                        else record.pack(item))
+            file.seek(0)
+            file.write(MappedSortedSet._HEADER.pack(
+                MappedSortedSet._MAGIC, format.encode('ascii'), count, data))
+
+    @staticmethod
+    def _formatOf(item):
+        for type_, format in ((int, 'q'), (float, 'd'), (str, 'str'), (bytes, 'bytes')):
+            if isinstance(item, type_):
+                return format
+        raise TypeError('please specify the record format for elements of %s' % type(item))
+
+    def close(self):
+        """
+        Release the memory mapping of the file.
+        
+        This set cannot be used after it has been closed.
+        """
+    
+        self._list._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self._path)
+
+    def _from_iterable(self, iterable):
+        return SortedListSet(iterable, self._key if self._ownKey else None)
+
+    def _find(self, key):
+        """
+        Return the position of an element with specified key in this
+        set, or the position it would be inserted at.
+        """
+        records = self._list
+        if not self._ownKey:
+            return bisect.bisect_left(records, key)
+        from_, to_ = 0, len(records)
+        while from_ < to_:
+            at = (from_ + to_) >> 1
+            if self._key(records[at]) < key:
+                from_ = at + 1
+            else:
+                to_ = at
+        return from_
+
+    def _pos(self, x):
+        return self._find(self._key(x))
+
+    def __len__(self):
+        return len(self._list)
+
+    def __contains__(self, x):
+        at = self._pos(x)
+        return len(self._list) > at and self._list[at] == x
+
+    def __getitem__(self, index):
+        return self._list[index]
+
+    def __iter__(self):
+        return self.iter()
+
+    def __reversed__(self):
+        return self.iter(reverse = True)
+
+    def index(self, x):
+        """
+        Return the position of an element in this set's sort order.
+        
+        See `SortedListSet.index`.
+        """
+    
+        at = self._pos(x)
+        if len(self._list) > at and self._list[at] == x:
+            return at
+        raise ValueError('%r is not in the set' % (x,))
+
+    def bisectLeft(self, x, isKey = False):
+        """
+        Return the position of an element or key in this set's sort order,
+        or the position of the first element that follows it.
+        
+        See `SortedListSet.bisectLeft`.
+        """
+    
+        return self._find(x if isKey else self._key(x))
+
+    def bisectRight(self, x, isKey = False):
+        """
+        Return the position past an element or key in this set's
+        sort order.
+        
+        See `SortedListSet.bisectRight`.
+        """
+    
+        key = x if isKey else self._key(x)
+        at = self._find(key)
+        if len(self._list) > at and self._key(self._list[at]) == key:
+            at += 1
+        return at
+
+    def countRange(self, from_ = None, to_ = None):
+        """
+        Return the number of elements within the range limited by
+        argument values.
+        
+        See `SortedListSet.countRange`.
+        """
+    
+        fromIndex = 0 if from_ is None else self._pos(from_)
+        toIndex = len(self) if to_ is None else self._pos(to_)
+        return toIndex - fromIndex if toIndex > fromIndex else 0
+
+    def iter(self, from_ = None, to_ = None, reverse = False):
+        """
+        Return an iterator over a subset limited by argument values.
+        
+        See `SortedListSet.iter`. Returned iterator reads elements
+        from the file as it goes.
+        """
+    
+        fromIndex = 0 if from_ is None else self._pos(from_)
+        toIndex = len(self) if to_ is None else self._pos(to_)
+        return self.Iterator(self, fromIndex, toIndex, reverse)
+
+    class Records(collections.Sequence):
+        """
+        Read-only sequence of elements stored in the records of
+        a mapped sorted set file.
+        """
+    
+        _OFFSETS = struct.Struct('<QQ')
+
+        def __init__(self, map_, format, count, data):
+            self._map = map_
+            self._count = count
+            self._data = data
+            self._text = 'str' == format
+            self._struct = None if format in MappedSortedSet._VARIABLE \
+                else struct.Struct(format)
+
+        def __len__(self):
+            return self._count
+
+        def __getitem__(self, at):
+            if isinstance(at, slice):
+                return [ self[i] for i in range(*at.indices(self._count)) ]
+            elif 0 > at:
+                at += self._count
+            if not 0 <= at < self._count:
+                raise IndexError('record index out of range')
+            if self._struct is not None:
+                values = self._struct.unpack_from(self._map,
+                    self._data + at * self._struct.size)
+                return values[0] if 1 == len(values) else values
+            start, end = self._OFFSETS.unpack_from(self._map,
+                MappedSortedSet._HEADER.size + 8 * at)
+            raw = self._map[self._data + start : self._data + end]
+            return raw.decode('utf-8') if self._text else raw
+
+class IndexedCollection(collections.MutableSet):
+    """
+    Set of elements that maintains several sort orders and hash tables
+    over them at once.
+
+    A `collections.MutableSet` that stores each element once and keeps
+    any number of named indexes over its elements up to date. A sorted
+    index returns elements in the order of keys extracted from them by
+    its key function, answers range queries and finds elements by their
+    positions in that order. A hash index finds elements by keys in
+    constant time. Indexes may require their keys to be unique. Keys
+    of different elements may otherwise be equal, and elements with
+    equal keys come out of a sorted index in the order they were added.
+    Each change to this collection is applied to all indexes or, if
+    it cannot be applied to one of them, to none. Elements must be
+    hashable, and their keys must not change while they are in
+    the collection.
+
+    Parameters
+    --------------------
+    iterable : Iterable, optional
+        A collection to take initial elements from.
+    sortedIndexes : collections.Mapping, optional
+        Names and key functions of sorted indexes to create.
+    hashIndexes : collections.Mapping, optional
+        Names and key functions of hash indexes to create.
+
+    Attributes
+    -----------------
+    indexes : collections.Mapping
+        A read-only mapping of names of indexes to `SortedIndex`
+        and `HashIndex` objects.
+
+    Methods
+    ---------------
+    addSortedIndex(name, key, unique)
+        Create a sorted index over elements of this collection.
+    addHashIndex(name, key, unique)
+        Create a hash index over elements of this collection.
+    dropIndex(name)
+        Delete an index of this collection.
+    update(iterable)
+        Add all elements of an iterable to this collection at once.
+    replace(old, new)
+        Replace an element of this collection with another element.
+
+    Raises
+    ----------
+    ValueError
+        If a change would store equal keys in a unique index.
+
+    Examples
+    ----------------
+    >>> Task = collections.namedtuple('Task', 'name due priority')
+    >>> tasks = IndexedCollection([ Task('build', 5, 2), Task('test', 7, 1),
+    ...     Task('deploy', 9, 1), Task('plan', 1, 3) ],
+    ...     sortedIndexes = { 'due': operator.attrgetter('due'),
+    ...         'priority': operator.attrgetter('priority') })
+    >>> tasks.addHashIndex('name', operator.attrgetter('name'), unique = True)
+    >>> due, priority, name = (tasks.indexes[index] for index in ('due', 'priority', 'name'))
+    >>> [ t.name for t in due.iter(2, 9) ]
+    ['build', 'test']
+    >>> [ t.name for t in priority.iter(1, 2) ], priority.countRange(2)
+    (['test', 'deploy'], 2)
+    >>> due.rank(name.find('test')[0]), due[0].name, due[-2:][0].name
+    (2, 'plan', 'test')
+    >>> tasks.add(Task('test', 3, 3))
+    Traceback (most recent call last):
+    ...
+    ValueError: key 'test' is already in the unique index 'name'
+    >>> tasks.replace(Task('test', 7, 1), Task('test', 3, 3))
+    >>> [ t.name for t in due ], [ t.name for t in priority.iter(3) ]
+    (['plan', 'test', 'build', 'deploy'], ['test', 'plan'])
+    >>> tasks.discard(Task('plan', 1, 3))
+    >>> len(tasks), len(due), name.find('plan'), priority.bisectRight(1)
+    (3, 3, [], 1)
+    """
+
+    def __init__(self, iterable = None, sortedIndexes = None, hashIndexes = None):
+        self._elements = {}
+        self._serials = {}
+        self._nextSerial = itertools.count()
+        self._indexes = {}
+        self.indexes = types.MappingProxyType(self._indexes)
+        for name, key in (sortedIndexes or {}).items():
+            self.addSortedIndex(name, key)
+        for name, key in (hashIndexes or {}).items():
+            self.addHashIndex(name, key)
+        if iterable is not None:
+            self.update(iterable)
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, list(self))
+
+    def __len__(self):
+        return len(self._elements)
+
+    def __iter__(self):
+        return iter(self._elements.values())
+
+    def __contains__(self, x):
+        return x in self._serials
+
+    def _new(self):
+        """
+        Create an empty collection with the same indexes as this one.
+        """
+        result = type(self)()
+        for name, index in self._indexes.items():
+            result._addIndex(name, type(index)(result, index.key, index.unique))
+        return result
+
+    def _from_iterable(self, iterable):
+        result = self._new()
+        result.update(iterable)
+        return result
+
+    def addSortedIndex(self, name, key, unique = False):
+        """
+        Create a sorted index over elements of this collection.
+
+        Parameters
+        ----------
+        name : str
+            The name to register the index under in `indexes`.
+        key : callable
+            A function that extracts the keys to sort elements by.
+        unique : bool, optional
+            Whether the keys of elements must be unique. The default
+            is ``False``.
+
+        Raises
+        ------
+        ValueError
+            If an index with the same name exists, or the index is
+            unique, but some elements have equal keys.
+        """
+        self._addIndex(name, IndexedCollection.SortedIndex(self, key, unique))
+
+    def addHashIndex(self, name, key, unique = False):
+        """
+        Create a hash index over elements of this collection.
+
+        Same as `addSortedIndex`, but the keys must be hashable
+        rather than comparable.
+        """
+        self._addIndex(name, IndexedCollection.HashIndex(self, key, unique))
+
+    def _addIndex(self, name, index):
+        if name in self._indexes:
+            raise ValueError('index %r already exists' % (name,))
+        pairs = [ (index.key(x), serial) for serial, x in self._elements.items() ]
+        index._check(name, pairs)
+        index._insert(pairs)
+        self._indexes[name] = index
+
+    def dropIndex(self, name):
+        """
+        Delete an index of this collection.
+
+        Raises
+        ------
+        KeyError
+            If there is no index with that name.
+        """
+        del self._indexes[name]
+
+    def _keyed(self, elements, serials):
+        """
+        Return a list of names and indexes of this collection, each
+        with the keys of elements for that index paired with their
+        serial numbers.
+        """
+        return [ (name, index, [ (index.key(x), serial) for x, serial in zip(elements, serials) ])
+            for name, index in self._indexes.items() ]
+
+    def _apply(self, keyed, removed = None):
+        """
+        Replace entries of indexes with new ones, restoring all indexes
+        if any of them fails.
+        """
+        done = []
+        try:
+            for name, index, pairs in keyed:
+                old = () if removed is None else removed[name]
+                index._remove(old)
+                done.append((index, old, ()))
+                index._insert(pairs)
+                done[-1] = (index, old, pairs)
+        except BaseException:
+            for index, old, pairs in reversed(done):
+                index._remove(pairs)
+                index._insert(old)
+            raise
+
+    def add(self, x):
+        if x not in self._serials:
+            self.update((x,))
+
+    def update(self, iterable):
+        """
+        Add all elements of an iterable to this collection at once.
+
+        Computes keys of new elements and checks unique indexes for
+        collisions before changing this collection, then adds the
+        elements to each sorted index in a single pass.
+
+        Raises
+        ------
+        ValueError
+            If the new elements would store equal keys in a unique
+            index. The collection is left unchanged in that case.
+        """
+        new = []
+        seen = set()
+        for x in iterable:
+            if x not in self._serials and x not in seen:
+                seen.add(x)
+                new.append(x)
+        if not new:
+            return
+        serials = list(itertools.islice(self._nextSerial, len(new)))
+        keyed = self._keyed(new, serials)
+        for name, index, pairs in keyed:
+            index._check(name, pairs)
+        self._apply(keyed)
+        self._elements.update(zip(serials, new))
+        self._serials.update(zip(new, serials))
+
+    def discard(self, x):
+        serial = self._serials.pop(x, None)
+        if serial is not None:
+            x = self._elements.pop(serial)
+            for name, index, pairs in self._keyed((x,), (serial,)):
+                index._remove(pairs)
+
+    def replace(self, old, new):
+        """
+        Replace an element of this collection with another element.
+
+        Moves the new element to the positions of its keys in all
+        indexes at once. Of the elements with equal keys in a sorted
+        index, the new element keeps the place of the old one.
+
+        Raises
+        ------
+        KeyError
+            If `old` is not an element of this collection.
+        ValueError
+            If the new element would store a key in a unique index
+            that another element has.
+        """
+        serial = self._serials[old]
+        if new in self._serials and new != old:
+            self.discard(old)
+            return
+        old = self._elements[serial]
+        removed = { name: pairs for name, index, pairs in self._keyed((old,), (serial,)) }
+        keyed = self._keyed((new,), (serial,))
+        for name, index, pairs in keyed:
+            index._check(name, pairs, removed[name])
+        self._apply(keyed, removed)
+        del self._serials[old]
+        self._elements[serial] = new
+        self._serials[new] = serial
+
+    def clear(self):
+        self._elements.clear()
+        self._serials.clear()
+        for index in self._indexes.values():
+            index._clear()
+
+    class SortedIndex:
+        """
+        Index that keeps elements of an `IndexedCollection` in the
+        order of their keys.
+
+        Attributes
+        -----------------
+        key : callable
+            The function that extracts keys from elements.
+        unique : bool
+            Whether the keys of elements must be unique.
+
+        Methods
+        ---------------
+        iter(from, to, reverse)
+            Return an iterator over elements with keys within a range.
+        find(key)
+            Return a list of elements with a key.
+        rank(x)
+            Return the position of an element in this index's order.
+        bisectLeft(key)
+            Return the number of elements with keys less than a key.
+        bisectRight(key)
+            Return the number of elements with keys less than or equal
+            to a key.
+        countRange(from, to)
+            Return the number of elements with keys within a range.
+        """
+
+        def __init__(self, owner, key, unique):
+            self._owner = owner
+            self.key = key
+            self.unique = unique
+            self._entries = SortedChunkedSet(None, None, True)
+
+        def __len__(self):
+            return len(self._entries)
+
+        def __iter__(self):
+            return self.iter()
+
+        def __getitem__(self, index):
+            entries = self._entries[index]
+            elements = self._owner._elements
+            if isinstance(index, slice):
+                return [ elements[entry[1]] for entry in entries ]
+            return elements[entries[1]]
+
+        def iter(self, from_ = None, to_ = None, reverse = False):
+            """
+            Return an iterator over elements with keys within a range.
+
+            Returns the elements with keys greater than or equal to
+            `from_` and less than `to_`, as `SortedListSet.iter` does,
+            until the collection changes.
+            """
+            entries = self._entries.iter(
+                None if from_ is None else (from_,),
+                None if to_ is None else (to_,),
+                reverse
+            )
+            return map(self._owner._elements.__getitem__, map(operator.itemgetter(1), entries))
+
+        def find(self, key):
+            """
+            Return a list of elements with a key in the order they were
+            added.
+            """
+            return self[self.bisectLeft(key): self.bisectRight(key)]
+
+        def rank(self, x):
+            """
+            Return the position of an element in this index's order.
+
+            Raises
+            ------
+            ValueError
+                If `x` is not an element of the collection.
+            """
+            serial = self._owner._serials.get(x)
+            if serial is None:
+                raise ValueError('%r is not in the collection' % (x,))
+            return self._entries.index((self.key(self._owner._elements[serial]), serial))
+
+        def bisectLeft(self, key):
+            """
+            Return the number of elements with keys less than a key.
+            """
+            return self._entries.bisectLeft((key,))
+
+        def bisectRight(self, key):
+            """
+            Return the number of elements with keys less than or equal
+            to a key.
+            """
+            return self._entries.bisectLeft((key, math.inf))
+
+        def countRange(self, from_ = None, to_ = None):
+            """
+            Return the number of elements with keys within a range,
+            as `iter` would return.
+            """
+            return self._entries.countRange(
+                None if from_ is None else (from_,),
+                None if to_ is None else (to_,)
+            )
+
+        def _check(self, name, pairs, removed = ()):
+            """
+            Raise an error if keys of new elements collide with each
+            other or with keys in this index, except those being removed.
+            """
+            if not self.unique:
+                return
+            keys = sorted(key for key, serial in pairs)
+            for key, following in zip(keys, keys[1:]):
+                if key == following:
+                    raise ValueError('key %r appears twice in the unique index %r' % (key, name))
+            released = [ key for key, serial in removed ]
+            for key in keys:
+                if key not in released and self.bisectLeft(key) < self.bisectRight(key):
+                    raise ValueError('key %r is already in the unique index %r' % (key, name))
+
+        def _insert(self, pairs):
+            if 1 == len(pairs):
+                self._entries.add(pairs[0])
+            elif pairs:
+                self._entries.update(pairs)
+
+        def _remove(self, pairs):
+            for pair in pairs:
+                self._entries.discard(pair)
+
+        def _clear(self):
+            self._entries.clear()
+
+    class HashIndex:
+        """
+        Index that finds elements of an `IndexedCollection` by their
+        keys in constant time.
+
+        Attributes
+        -----------------
+        key : callable
+            The function that extracts keys from elements.
+        unique : bool
+            Whether the keys of elements must be unique.
+
+        Methods
+        ---------------
+        find(key)
+            Return a list of elements with a key.
+        """
+
+        def __init__(self, owner, key, unique):
+            self._owner = owner
+            self.key = key
+            self.unique = unique
+            self._table = {}
+
+        def __len__(self):
+            """
+            Return the number of distinct keys in this index.
+            """
+            return len(self._table)
+
+        def __contains__(self, key):
+            return key in self._table
+
+        def find(self, key):
+            """
+            Return a list of elements with a key in the order they were
+            added.
+            """
+            elements = self._owner._elements
+            return [ elements[serial] for serial in sorted(self._table.get(key, ())) ]
+
+        def _check(self, name, pairs, removed = ()):
+            if not self.unique:
+                return
+            released = { key for key, serial in removed }
+            seen = set()
+            for key, serial in pairs:
+                if key in seen:
+                    raise ValueError('key %r appears twice in the unique index %r' % (key, name))
+                elif key in self._table and key not in released:
+                    raise ValueError('key %r is already in the unique index %r' % (key, name))
+                seen.add(key)
+
+        def _insert(self, pairs):
+            table = self._table
+            done = 0
+            try:
+                for key, serial in pairs:
+                    if key in table:
+                        table[key].add(serial)
+                    else:
+                        table[key] = { serial }
+                    done += 1
+            except BaseException:
+                self._remove(pairs[:done])
+                raise
+
+        def _remove(self, pairs):
+            table = self._table
+            for key, serial in pairs:
+                serials = table[key]
+                serials.discard(serial)
+                if not serials:
+                    del table[key]
+
+        def _clear(self):
+            self._table.clear()
+
+class IntervalSet(collections.Sized, collections.Iterable, collections.Container):
+    """
+    Set of points stored as disjoint half-open ranges.
+
+    Keeps a set of values, such as identifiers or times, as a sorted
+    sequence of disjoint ranges, each of which includes its lower bound
+    and excludes its upper bound, as the range from `from_` to `to_`
+    in `SortedListSet.iter` does. Ranges added to the set are merged
+    with the ranges they overlap or adjoin, so the same set of points
+    is always stored as the same ranges. Points may be of any type
+    that can be compared, and ranges may be empty, in which case they
+    are ignored. This class stores the bounds of ranges in a sorted
+    list, so testing points and ranges for membership has logarithmic
+    complexity, adding or removing ranges has linear complexity,
+    and so do set operations on two range sets.
+
+    Parameters
+    --------------------
+    ranges : Iterable, optional
+        Tuples of the lower and upper bounds of ranges to add
+        to this set in any order, or another `IntervalSet`.
+
+    Methods
+    ---------------
+    fromPoints(points, step)
+        Create a set of ranges that cover a collection of discrete points.
+    add(from, to)
+        Add the points within a range to this set.
+    discard(from, to)
+        Remove the points within a range from this set.
+    containsRange(from, to)
+        Tell whether all points within a range belong to this set.
+    overlaps(from, to)
+        Tell whether any point within a range belongs to this set.
+    iter(from, to)
+        Return an iterator over the ranges of this set clipped to
+        a range.
+    gaps(from, to)
+        Return an iterator over the ranges missing from this set.
+    measure()
+        Return the total length of ranges in this set.
+
+    Notes
+    -----
+    Iterating over this set, and indexing it with ``[]``, returns
+    tuples of the lower and upper bounds of its ranges in their sort
+    order, while `len` returns the number of such ranges. Operators
+    ``|``, ``&``, ``-``, ``^``, their in-place variants, and
+    comparisons between range sets apply to the points in ranges,
+    as they would to sets of points. Results are computed in a single
+    pass over the ranges of both operands.
+
+    Examples
+    ----------------
+    >>> ids = IntervalSet([(10, 20), (30, 40)])
+    >>> ids.add(20, 25); ids.add(38, 50); ids.add(60, 60)
+    >>> ids
+    IntervalSet([(10, 25), (30, 50)])
+    >>> 25 in ids, 30 in ids, ids.containsRange(12, 25), ids.overlaps(25, 31)
+    (False, True, True, True)
+    >>> ids.discard(15, 35)
+    >>> list(ids), list(ids.gaps()), list(ids.gaps(0, 60))
+    ([(10, 15), (35, 50)], [(15, 35)], [(0, 10), (15, 35), (50, 60)])
+    >>> list(ids.iter(12, 40)), ids.measure()
+    ([(12, 15), (35, 40)], 20)
+    >>> other = IntervalSet.fromPoints([1, 2, 3, 13, 14, 36])
+    >>> other
+    IntervalSet([(1, 4), (13, 15), (36, 37)])
+    >>> ids | other, ids & other
+    (IntervalSet([(1, 4), (10, 15), (35, 50)]), IntervalSet([(13, 15), (36, 37)]))
+    >>> ids - other, ids ^ other
+    (IntervalSet([(10, 13), (35, 36), (37, 50)]), IntervalSet([(1, 4), (10, 13), (35, 36), (37, 50)]))
+    >>> ids & other <= ids, ids <= other
+    (True, False)
+    """
+
+    def __init__(self, ranges = None):
+        if isinstance(ranges, IntervalSet):
+            self._bounds = list(ranges._bounds)
+            return
+        bounds = []
+        for from_, to_ in sorted(range_ for range_ in ranges or () if range_[0] < range_[1]):
+            if bounds and from_ <= bounds[-1]:
+                if to_ > bounds[-1]:
+                    bounds[-1] = to_
+            else:
+                bounds += (from_, to_)
+        self._bounds = bounds
+
+    @classmethod
+    def fromPoints(cls, points, step = 1):
+        """
+        Create a set of ranges that cover a collection of discrete points.
+
+        Parameters
+        ----------
+        points : Iterable
+            Points in any order, such as an integer `SortedListSet`.
+        step : object, optional
+            The distance between adjacent points, which is added to
+            each point to obtain the upper bound of its range. The
+            default is 1.
+
+        Returns
+        -------
+        IntervalSet
+            A set with ranges of adjacent points.
+        """
+        result = cls()
+        bounds = result._bounds
+        for point in sorted(points):
+            to_ = point + step
+            if bounds and point <= bounds[-1]:
+                if to_ > bounds[-1]:
+                    bounds[-1] = to_
+            else:
+                bounds += (point, to_)
+        return result
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, list(self))
+
+    def __len__(self):
+        return len(self._bounds) >> 1
+
+    def __iter__(self):
+        bounds = self._bounds
+        return zip(itertools.islice(bounds, 0, None, 2), itertools.islice(bounds, 1, None, 2))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        size = len(self)
+        if 0 > index:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError('range index out of range')
+        return self._bounds[2 * index], self._bounds[2 * index + 1]
+
+    def __contains__(self, point):
+        return bool(bisect.bisect_right(self._bounds, point) & 1)
+
+    def containsRange(self, from_, to_):
+        """
+        Tell whether all points within a range belong to this set.
+
+        Returns ``True`` for an empty range.
+        """
+        if not from_ < to_:
+            return True
+        at = bisect.bisect_right(self._bounds, from_)
+        return bool(at & 1) and to_ <= self._bounds[at]
+
+    def overlaps(self, from_, to_):
+        """
+        Tell whether any point within a range belongs to this set.
+        """
+        bounds = self._bounds
+        at = bisect.bisect_right(bounds, from_)
+        if at & 1:
+            return from_ < to_
+        return len(bounds) > at and bounds[at] < to_
+
+    def _splice(self, from_, to_, removing):
+        """
+        Replace the bounds between the positions of the bounds of
+        a range with the bounds of that range that are needed to add
+        the range to this set or remove it.
+        """
+        bounds = self._bounds
+        start = bisect.bisect_left(bounds, from_)
+        end = bisect.bisect_right(bounds, to_)
+        inside = 1 if removing else 0
+        bounds[start: end] = ( [ from_ ] if inside == start & 1 else [] ) \
+            + ( [ to_ ] if inside == end & 1 else [] )
+
+    def add(self, from_, to_):
+        """
+        Add the points within a range to this set, merging the range
+        with ranges it overlaps or adjoins.
+        """
+        if from_ < to_:
+            self._splice(from_, to_, False)
+
+    def discard(self, from_, to_):
+        """
+        Remove the points within a range from this set, trimming
+        or splitting the ranges it overlaps.
+        """
+        if from_ < to_:
+            self._splice(from_, to_, True)
+
+    def update(self, ranges):
+        """
+        Add the points within a collection of ranges to this set.
+        """
+        self._bounds = self._sweep(self._bounds, IntervalSet(ranges)._bounds, operator.or_)
+
+    def clear(self):
+        self._bounds = []
+
+    def iter(self, from_ = None, to_ = None):
+        """
+        Return an iterator over the ranges of this set clipped to a range.
+
+        Parameters
+        ----------
+        from_ : object, optional
+            The lower bound of the range to look at, which is included
+            in the range. Default is None, which means no lower bound.
+        to_ : object, optional
+            The upper bound of the range to look at, which is excluded
+            from the range. Default is None, which means no upper bound.
+
+        Returns
+        -------
+        Iterator
+            Tuples of the lower and upper bounds of the parts of this
+            set's ranges that fall within the range.
+        """
+        bounds = self._bounds
+        if from_ is not None and to_ is not None and not from_ < to_:
+            return
+        start = 0 if from_ is None else bisect.bisect_right(bounds, from_) & ~1
+        end = len(bounds) if to_ is None else bisect.bisect_left(bounds, to_)
+        for at in range(start, end, 2):
+            lower, upper = bounds[at], bounds[at + 1]
+            if from_ is not None and lower < from_:
+                lower = from_
+            if to_ is not None and upper > to_:
+                upper = to_
+            yield lower, upper
+
+    def gaps(self, from_ = None, to_ = None):
+        """
+        Return an iterator over the ranges missing from this set.
+
+        Parameters
+        ----------
+        from_ : object, optional
+            The lower bound of the range to look for gaps in. Default
+            is None, which means the lower bound of the first range
+            of this set.
+        to_ : object, optional
+            The upper bound of the range to look for gaps in. Default
+            is None, which means the upper bound of the last range
+            of this set.
+
+        Returns
+        -------
+        Iterator
+            Tuples of the lower and upper bounds of the maximal ranges
+            within the range that have no points from this set,
+            in their sort order.
+        """
+        bounds = self._bounds
+        if not bounds and (from_ is None or to_ is None):
+            return
+        lower = bounds[0] if from_ is None else from_
+        stop = bounds[-1] if to_ is None else to_
+        at = bisect.bisect_right(bounds, lower)
+        if at & 1:
+            lower = bounds[at]
+            at += 1
+        while lower < stop:
+            upper = bounds[at] if len(bounds) > at and bounds[at] < stop else stop
+            yield lower, upper
+            if len(bounds) <= at + 1:
+                break
+            lower = bounds[at + 1]
+            at += 2
+
+    def measure(self):
+        """
+        Return the total length of ranges in this set, for points
+        that can be subtracted from each other, such as numbers.
+        """
+        bounds = self._bounds
+        return sum(map(operator.sub,
+            itertools.islice(bounds, 1, None, 2), itertools.islice(bounds, 0, None, 2)))
+
+    @staticmethod
+    def _sweep(mine, others, keep):
+        """
+        Return the bounds of the ranges of points for which a function
+        of two booleans, which tell whether the point is within ranges
+        with bounds `mine` and `others`, returns a true value.
+        """
+        result = []
+        inMine = inOthers = inside = False
+        i = j = 0
+        sizeMine, sizeOthers = len(mine), len(others)
+        while i < sizeMine or j < sizeOthers:
+            if j >= sizeOthers or (i < sizeMine and mine[i] <= others[j]):
+                point = mine[i]
+            else:
+                point = others[j]
+            if i < sizeMine and mine[i] == point:
+                inMine = not inMine
+                i += 1
+            if j < sizeOthers and others[j] == point:
+                inOthers = not inOthers
+                j += 1
+            if bool(keep(inMine, inOthers)) != inside:
+                inside = not inside
+                result.append(point)
+        return result
+
+    def _combine(self, other, keep):
+        if not isinstance(other, IntervalSet):
+            return NotImplemented
+        result = type(self)()
+        result._bounds = self._sweep(self._bounds, other._bounds, keep)
+        return result
+
+    def _assign(self, result):
+        if result is NotImplemented:
+            return result
+        self._bounds = result._bounds
+        return self
+
+    def __or__(self, other):
+        return self._combine(other, operator.or_)
+
+    def __and__(self, other):
+        return self._combine(other, operator.and_)
+
+    def __sub__(self, other):
+        return self._combine(other, lambda mine, others: mine and not others)
+
+    def __xor__(self, other):
+        return self._combine(other, operator.xor)
+
+    def __ior__(self, other):
+        return self._assign(self | other)
+
+    def __iand__(self, other):
+        return self._assign(self & other)
+
+    def __isub__(self, other):
+        return self._assign(self - other)
+
+    def __ixor__(self, other):
+        return self._assign(self ^ other)
+
+    def __eq__(self, other):
+        if not isinstance(other, IntervalSet):
+            return NotImplemented
+        return self._bounds == other._bounds
+
+    def __le__(self, other):
+        difference = self - other
+        return difference if difference is NotImplemented else not difference
+
+    def __ge__(self, other):
+        if not isinstance(other, IntervalSet):
+            return NotImplemented
+        return other <= self
+
+class _TreeLeaf:
+    """
+    Leaf of a `PersistentSortedSet` tree that holds a tuple of
+    elements and a tuple of their keys.
+    """
+
+    __slots__ = ('items', 'keys')
+
+    def __init__(self, items, keys):
+        self.items = items
+        self.keys = keys
+
+    def width(self):
+        return len(self.items)
+
+    def count(self):
+        return len(self.items)
+
+    def maxKey(self):
+        return self.keys[-1]
+
+class _ChunkedList(collections.Sequence):
+    """
+    Read-only sequence of the elements, or keys, of a `SortedChunkedSet`
+    that reads them from its chunks, so that searches over the set
+    do not need to copy its contents. Valid until the set is changed.
+    """
+
+    __slots__ = ('chunks', 'ends')
+
+    def __init__(self, chunks, ends = None):
+        self.chunks = chunks
+        self.ends = list(itertools.accumulate(map(len, chunks))) if ends is None else ends
+
+    def __len__(self):
+        return self.ends[-1] if self.ends else 0
+
+    def __getitem__(self, index):
+        size = len(self)
+        if isinstance(index, slice):
+            start, stop, step = index.indices(size)
+            if 1 != step:
+                return [ self[i] for i in range(start, stop, step) ]
+            result = []
+            chunk = bisect.bisect_right(self.ends, start)
+            while start < stop:
+                offset = self.ends[chunk - 1] if chunk else 0
+                part = self.chunks[chunk][start - offset: stop - offset]
+                result.extend(part)
+                start += len(part)
+                chunk += 1
+            return result
+        if 0 > index:
+            index += size
+        if 0 > index or size <= index:
+            raise IndexError('set index out of range')
+        chunk = bisect.bisect_right(self.ends, index)
+        return self.chunks[chunk][index - self.ends[chunk - 1] if chunk else index]
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.chunks)
+
+class _TreeBranch:
+    """
+    Inner node of a `PersistentSortedSet` tree that holds a tuple of
+    its children, the greatest key under each child, and cumulative
+    counts of elements under the children.
+    """
+
+    __slots__ = ('children', 'maxes', 'counts')
+
+    def __init__(self, children):
+        self.children = children
+        self.maxes = tuple(child.maxKey() for child in children)
+        self.counts = tuple(itertools.accumulate(child.count() for child in children))
+
+    def width(self):
+        return len(self.children)
+
+    def count(self):
+        return self.counts[-1]
+
+    def maxKey(self):
+        return self.maxes[-1]
+
+def _sortUnique(list_, keys):
+    """
+    Sort a list of elements by a parallel list of their keys, retaining
+    the last of the elements with equal keys, and return both lists.
+    Sorting is skipped if the elements come in their sort order.
+    """
+    if not all(map(operator.le, keys, itertools.islice(keys, 1, None))):
+        order = sorted(range(len(keys)), key = keys.__getitem__)
+        list_ = [ list_[i] for i in order ]
+        keys = [ keys[i] for i in order ]
+    unique = list(map(operator.ne, keys, itertools.islice(keys, 1, None)))
+    if not all(unique):
+        unique.append(True)
+        list_ = list(itertools.compress(list_, unique))
+        keys = list(itertools.compress(keys, unique))
+    return list_, keys
+
+def _sortPartition(list_, key):
+    """
+    Sort a partition of elements for `SortedListSet.buildParallel`.
+    Returns the sorted unique elements and their keys, or ``None``
+    in place of the keys if there is no key function.
+    """
+    if key is None:
+        return _sortUnique(list_, list_)[0], None
+    return _sortUnique(list_, list(map(key, list_)))
+
+def _mergePartitions(results, key):
+    """
+    Merge partitions sorted by `_sortPartition` in their original order.
+    Sorting the concatenated partitions merges them, as `list.sort`
+    finds and merges their sorted runs, and keeps elements with equal
+    keys in the order of partitions. Without a key function, elements
+    are sorted in place rather than by a list of keys, and ``None``
+    is returned in place of the keys.
+    """
+    list_ = []
+    keys = []
+    for items, itemKeys in results:
+        list_ += items
+        if itemKeys is not None:
+            keys += itemKeys
+    if key is not None:
+        return _sortUnique(list_, keys)
+    list_.sort()
+    unique = list(map(operator.ne, list_, itertools.islice(list_, 1, None)))
+    if not all(unique):
+        unique.append(True)
+        list_ = list(itertools.compress(list_, unique))
+    return list_, None
+
+def mergeSorted(*iterables, key = None):
+    """
+    Merge sorted iterables into a single sorted stream of elements
+    with unique keys.
+
+    A generator that runs a k-way merge of any number of sorted sets,
+    such as `SortedListSet` objects, or other iterables that return
+    elements in their sort order. Elements are taken from the iterables
+    lazily, one at a time, and only one pending element of each iterable
+    is kept in memory. Of the elements with equal keys, only one is
+    returned: the element that comes last from the rightmost iterable
+    that contains such elements, as with the ``|`` operator. Use
+    `SortedListSet.fromSorted` to collect the results into a set.
+
+    Parameters
+    ----------
+    iterables : Iterable
+        Iterables that return elements in the ascending order of their
+        keys.
+    key : object, optional
+        A callable that extracts comparison keys from elements. Pass
+        the key function of the merged sets, if any. The default value
+        is None (compare the elements directly).
+
+    Returns
+    -------
+    generator
+        Elements from all iterables in the ascending order of their keys.
+
+    Raises
+    ------
+    ValueError
+        If an element's key is less than the key of the preceding
+        element from the same iterable.
+
+    Examples
+    --------
+    >>> evens = SortedListSet(range(0, 10, 2))
+    >>> list(mergeSorted(evens, range(3, 7), [9, 1000]))
+    [0, 2, 3, 4, 5, 6, 8, 9, 1000]
+    >>> words = SortedListSet(['a', 'B', 'c'], str.lower)
+    >>> merged = mergeSorted(words, ['b', 'C', 'd'], key = str.lower)
+    >>> SortedListSet.fromSorted(merged, str.lower, verify = False)
+    SortedListSet({'a', 'b', 'C', 'd'})
+    """
+
+    if key is None:
+        key = lambda x: x
+    heap = []
+    serial = itertools.count()
+    for index, iterable in enumerate(iterables):
+        iterator = iter(iterable)
+        for item in iterator:
+            heap.append((key(item), index, next(serial), item, iterator))
+            break
+    heapq.heapify(heap)
+    while heap:
+        top, index, order, item, iterator = heap[0]
+        while True:
+            for following in iterator:
+                followingKey = key(following)
+                if followingKey < top:
+                    raise ValueError('element %r is out of order after %r' % (following, item))
+                heapq.heapreplace(heap,
+                    (followingKey, index, next(serial), following, iterator))
+                break
+            else:
+                heapq.heappop(heap)
+            if not heap or heap[0][0] != top:
+                break
+            top, index, order, item, iterator = heap[0]
+        yield item
 
 if __name__ == "__main__":
     import doctest